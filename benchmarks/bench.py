@@ -0,0 +1,238 @@
+"""
+Benchmarks of the code that runs on every refresh, on synthetic graphs of 10 to 10k ports.
+
+    python -m benchmarks.bench run [--sizes 10 100] [--only parse_pwlink_return] [--output results.json]
+    python -m benchmarks.bench compare BASELINE.json RESULTS.json [--threshold 0.2]
+
+`compare` exits with 1 when a benchmark got slower than the threshold
+"""
+
+import os
+import sys
+import json
+import time
+import timeit
+import argparse
+import platform
+import statistics
+import subprocess
+from typing import Callable
+
+from .fixtures import Fixture, FIXTURE_SIZES, ROOT
+from src.pipewire.pipewire import Pipewire
+from src.pipewire.graph import PwGraph
+from src.pipewire.snapshot import PwGraphSnapshot
+from src.pipewire.device_links import group_device_links
+from src.pipewire import dump_reader
+from src.pipewire.top import PwTopMonitor, PwTopHistory, PwNodeStats, parse_top_line
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+DEFAULT_THRESHOLD = 0.2
+
+
+def bench_parse_pwlink_return(fx: Fixture) -> Callable:
+    def run():
+        Pipewire._parse_pwlink_return(fx.inputs_text)
+        Pipewire._parse_pwlink_return(fx.outputs_text)
+
+    return run
+
+
+def bench_parse_pwlink_list_return(fx: Fixture) -> Callable:
+    return lambda: Pipewire._parse_pwlink_list_return(fx.links_text)
+
+
+def bench_read_dump(fx: Fixture) -> Callable:
+    return lambda: dump_reader.read_dump(fx.dump_lines)
+
+
+def bench_graph_listings(fx: Fixture) -> Callable:
+    # what a refresh computes from a pw-dump: the graph, inputs, outputs and links
+    objects = dump_reader.read_dump(fx.dump_lines)
+
+    def run():
+        graph = PwGraph.from_dump(objects)
+        Pipewire._ports_from_graph(graph, 'input')
+        Pipewire._ports_from_graph(graph, 'output')
+        Pipewire._links_from_graph(graph)
+
+    return run
+
+
+def bench_get_node_description(fx: Fixture) -> Callable:
+    graph = PwGraph.from_dump(fx.dump)
+    names = list(graph.nodes_by_name)
+
+    def run():
+        for name in names:
+            Pipewire._get_node_description(graph, name)
+
+    return run
+
+
+def bench_group_device_links(fx: Fixture) -> Callable:
+    graph = PwGraph.from_dump(fx.dump)
+    links = Pipewire._links_from_graph(graph)
+    outputs = PwGraphSnapshot.index_by_port(Pipewire._ports_from_graph(graph, 'output'))
+    inputs = PwGraphSnapshot.index_by_port(Pipewire._ports_from_graph(graph, 'input'))
+
+    return lambda: group_device_links(links, outputs.get, inputs.get)
+
+
+def bench_plan_device_links(fx: Fixture) -> Callable:
+    # the planning step of Pipewire.link_devices(), for every mic/speaker pair of the graph
+    graph = PwGraph.from_dump(fx.dump)
+    outputs = Pipewire._ports_from_graph(graph, 'output')
+    inputs = Pipewire._ports_from_graph(graph, 'input')
+    pairs = [(outputs[name], inputs[name.replace('alsa_input', 'alsa_output')]) for name in outputs if name.startswith('alsa_input')]
+
+    def run():
+        for output, input in pairs:
+            Pipewire.plan_device_links(output, input)
+
+    return run
+
+
+def bench_parse_pwtop(fx: Fixture) -> Callable:
+    # a pw-top refresh, keeping the history of every node (without starting pw-top)
+    monitor = PwTopMonitor(stream_factory=lambda: iter(()))
+    history = PwTopHistory(monitor)
+    monitor.subscribers.append(history.on_frame)
+
+    for row in filter(None, map(parse_top_line, fx.top_lines)):
+        history.stats[row.id] = PwNodeStats(row.id)
+        history.watchers[row.id] = [lambda stats: None]
+
+    def run():
+        for line in fx.top_lines:
+            monitor.feed_line(line)
+
+        # the next header completes the frame
+        monitor.feed_line(fx.top_lines[0])
+
+    return run
+
+
+BENCHMARKS: dict[str, Callable[[Fixture], Callable]] = {
+    'parse_pwlink_return': bench_parse_pwlink_return,
+    'parse_pwlink_list_return': bench_parse_pwlink_list_return,
+    'read_dump': bench_read_dump,
+    'graph_listings': bench_graph_listings,
+    'get_node_description': bench_get_node_description,
+    'group_device_links': bench_group_device_links,
+    'plan_device_links': bench_plan_device_links,
+    'parse_pwtop': bench_parse_pwtop,
+}
+
+
+def measure(func: Callable, repeat: int) -> dict:
+    # seconds per call: the loop count is calibrated to run for at least 0.2s
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    samples = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+
+    return {'min': min(samples), 'median': statistics.median(samples), 'loops': number, 'repeat': repeat}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, encoding='utf-8', check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run(sizes: list[int], only: list[str], repeat: int) -> dict:
+    results = {
+        'revision': git_revision(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'benchmarks': [],
+    }
+
+    for size in sizes:
+        fx = Fixture(size)
+
+        for name, bench in BENCHMARKS.items():
+            if only and name not in only:
+                continue
+
+            timing = measure(bench(fx), repeat)
+            results['benchmarks'].append({'name': name, 'size': size, 'ports': fx.ports, **timing})
+            print(f'{name:<28} {fx.ports:>6} ports  {format_time(timing["median"]):>10}', flush=True)
+
+    return results
+
+
+def format_time(seconds: float) -> str:
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f'{seconds / scale:.2f} {unit}'
+
+    return f'{seconds / 1e-9:.0f} ns'
+
+
+def compare(baseline: dict, results: dict, threshold: float) -> bool:
+    # prints the changes, returns False if something got slower than the threshold
+    base = {(b['name'], b['size']): b for b in baseline['benchmarks']}
+    ok = True
+
+    print(f'{baseline.get("revision")} -> {results.get("revision")}, threshold {threshold:.0%}')
+    for b in results['benchmarks']:
+        old = base.get((b['name'], b['size']))
+        if old is None:
+            continue
+
+        ratio = b['median'] / old['median']
+        flag = ''
+
+        if ratio > 1 + threshold:
+            flag = 'SLOWER'
+            ok = False
+        elif ratio < 1 / (1 + threshold):
+            flag = 'faster'
+
+        print(f'{b["name"]:<28} {b["ports"]:>6} ports  {format_time(old["median"]):>10} -> {format_time(b["median"]):>10}  x{ratio:.2f} {flag}')
+
+    return ok
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run the benchmarks and save the results as JSON')
+    run_parser.add_argument('--sizes', type=int, nargs='+', default=FIXTURE_SIZES)
+    run_parser.add_argument('--only', nargs='+', default=[], choices=list(BENCHMARKS))
+    run_parser.add_argument('--repeat', type=int, default=5)
+    run_parser.add_argument('--output', help=f'defaults to {RESULTS_DIR}/<git revision>.json')
+
+    compare_parser = commands.add_parser('compare', help='compare two result files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('results')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='allowed slowdown, 0.2 = 20%%')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        results = run(args.sizes, args.only, args.repeat)
+        output = args.output or os.path.join(RESULTS_DIR, f'{results["revision"]}.json')
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+        print(f'Results saved to {output}')
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    with open(args.results) as f:
+        results = json.load(f)
+
+    return 0 if compare(baseline, results, args.threshold) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,57 @@
+import os
+import sys
+import json
+
+# the benchmarks import the app from the source tree: no install, Pipewire or display needed
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.pipewire.simulated_backend import PwSimulatedBackend  # noqa: E402
+
+FIXTURE_SIZES = [10, 100, 1_000, 10_000]
+TOP_HEADER = 'S   ID  QUANT   RATE    WAIT    BUSY   W/Q   B/Q  ERR FORMAT           NAME\n'
+
+
+def build_backend(ports: int) -> PwSimulatedBackend:
+    """
+    A graph with at least `ports` ports: pairs of a mic and a speaker, each mic linked to its speaker.
+    One mic out of ten is mono
+    """
+    backend = PwSimulatedBackend()
+    count = 0
+    i = 0
+
+    while count < ports:
+        channels = ['MONO'] if (i % 10 == 9) else ['FL', 'FR']
+        mic_id = backend.add_device(f'alsa_input.bench-{i}.analog-stereo', f'Bench Microphone {i}', 'Audio/Source', channels)
+        speaker_id = backend.add_device(f'alsa_output.bench-{i}.analog-stereo', f'Bench Speaker {i}', 'Audio/Sink', ['FL', 'FR'])
+
+        # ports get the ids that follow the one of their node
+        mic_ports = [mic_id + 1 + c for c in range(len(channels))]
+        speaker_ports = [speaker_id + 1, speaker_id + 2]
+
+        for out_port in mic_ports:
+            for in_port in speaker_ports:
+                backend.link(str(out_port), str(in_port))
+
+        count += len(mic_ports) + 4
+        i += 1
+
+    return backend
+
+
+class Fixture():
+    # the outputs of pw-link and pw-dump for a graph of a given size
+    def __init__(self, ports: int):
+        backend = build_backend(ports)
+
+        self.size = ports
+        self.ports = sum(1 for o in backend.objects.values() if o['type'] == 'PipeWire:Interface:Port')
+        self.inputs_text = backend.list_ports('input')
+        self.outputs_text = backend.list_ports('output')
+        self.links_text = backend.list_links()
+        self.dump = backend.dump()
+        self.dump_lines = json.dumps(self.dump, indent=2).splitlines(keepends=True)
+        # a refresh of `pw-top --batch-mode`
+        self.top_lines = [TOP_HEADER, *[l + '\n' for l in backend.top_lines()]]
@@ -17,6 +17,7 @@ class WhisperPreferencesWindow(Adw.PreferencesWindow):
         self.general_page = Adw.PreferencesPage()
         self.general_page_general = Adw.PreferencesGroup(title=_('General'))
         self.autostart_page = Adw.PreferencesGroup(title=_('Autostart'))
+        self.low_latency_page = Adw.PreferencesGroup(title=_('Low-latency mode'))
 
         self.show_ids = self.create_toggle_row(_('Show connection IDs'), _('For the geeks out there'), 'show-connection-ids')
 
@@ -30,8 +31,15 @@ class WhisperPreferencesWindow(Adw.PreferencesWindow):
         self.general_page_general.add(self.show_ids)
         self.general_page_general.add(self.release_conn_on_exit)
 
+        self.pool_size = Adw.SpinRow.new_with_range(0, 4, 1)
+        self.pool_size.set_title(_('Nodes kept ready'))
+        self.pool_size.set_subtitle(_('Makes enabling low-latency mode faster, idle nodes are released after a few minutes'))
+        self.settings.bind('low-latency-pool-size', self.pool_size, 'value', Gio.SettingsBindFlags.DEFAULT)
+        self.low_latency_page.add(self.pool_size)
+
         self.general_page.add(self.general_page_general)
         self.general_page.add(self.autostart_page)
+        self.general_page.add(self.low_latency_page)
         self.settings.connect('changed', self.on_settings_changes)
 
         self.add(self.general_page)
@@ -0,0 +1,121 @@
+from typing import Callable
+from gi.repository import Adw
+from gi.repository import Gtk, Gdk, GLib
+from ..pipewire.top import pw_top_history, PwNodeStats, TOP_HISTORY_SIZE
+
+SPARKLINE_ERROR_COLOR = Gdk.RGBA(red=0.88, green=0.11, blue=0.14, alpha=1)
+
+
+class Sparkline(Gtk.DrawingArea):
+    """Draws the DSP load of the last frames (0 to 100%), frames with new errors get a red mark"""
+
+    def __init__(self, **kwargs):
+        super().__init__(content_width=TOP_HISTORY_SIZE * 2, content_height=24, valign=Gtk.Align.CENTER, **kwargs)
+        self.values: list[float] = []
+        self.error_marks: list[int] = []
+        self.set_draw_func(self.on_draw)
+
+    def set_values(self, values: list[float], error_marks: list[int]):
+        self.values = values
+        self.error_marks = error_marks
+        self.queue_draw()
+
+    def on_draw(self, area, cr, width: int, height: int):
+        if len(self.values) < 2:
+            return
+
+        step = width / (TOP_HISTORY_SIZE - 1)
+        # the newest value is always on the right
+        x0 = width - step * (len(self.values) - 1)
+
+        def y(value: float) -> float:
+            return height - 1 - min(max(value, 0), 1) * (height - 2)
+
+        color = self.get_color()
+        Gdk.cairo_set_source_rgba(cr, color)
+        cr.set_line_width(1.5)
+        cr.move_to(x0, y(self.values[0]))
+
+        for i, value in enumerate(self.values[1:], start=1):
+            cr.line_to(x0 + i * step, y(value))
+
+        cr.stroke()
+
+        Gdk.cairo_set_source_rgba(cr, SPARKLINE_ERROR_COLOR)
+        for i in self.error_marks:
+            cr.arc(x0 + i * step, y(self.values[i]), 2, 0, 6.3)
+            cr.fill()
+
+
+class DspStatsRow(Adw.ExpanderRow):
+    """
+    Live pw-top statistics of the nodes behind a connection.
+    pw-top only runs while the row is expanded; `get_nodes` returns the (label, node id) to show
+    """
+
+    def __init__(self, get_nodes: Callable[[], list[tuple[str, int]]], **kwargs):
+        super().__init__(title=_('DSP statistics'), **kwargs)
+        self.get_nodes = get_nodes
+        self.node_rows: list[Adw.ActionRow] = []
+        self.watched: dict[int, Callable[[PwNodeStats], None]] = {}
+
+        self.add_prefix(Gtk.Image.new_from_icon_name('utilities-system-monitor-symbolic'))
+        self.connect('notify::expanded', self.on_expanded)
+        self.connect('unrealize', lambda w: self.unwatch_all())
+
+    def on_expanded(self, row, _):
+        if self.get_expanded():
+            self.watch_all()
+        else:
+            self.unwatch_all()
+
+    def watch_all(self):
+        self.unwatch_all()
+
+        for r in self.node_rows:
+            self.remove(r)
+
+        self.node_rows = []
+
+        for label, node_id in self.get_nodes():
+            sparkline = Sparkline()
+            node_row = Adw.ActionRow(title=label, subtitle=_('Waiting for pw-top...'))
+            node_row.add_suffix(sparkline)
+
+            self.add_row(node_row)
+            self.node_rows.append(node_row)
+
+            callback = self._create_callback(node_row, sparkline)
+            self.watched[node_id] = callback
+            pw_top_history.watch(node_id, callback)
+
+    def unwatch_all(self):
+        for node_id, callback in self.watched.items():
+            pw_top_history.unwatch(node_id, callback)
+
+        self.watched = {}
+
+    def _create_callback(self, node_row: Adw.ActionRow, sparkline: Sparkline) -> Callable[[PwNodeStats], None]:
+        def on_stats(stats: PwNodeStats):
+            # called from the pw-top thread: copy the values before going to the main loop
+            row = stats.last
+            errors = stats.errors.to_list()
+            error_marks = [i for i in range(1, len(errors)) if errors[i] > errors[i - 1]]
+            latency = stats.latency()
+
+            text = _('Quantum {quantum}/{rate} ({latency} ms) · DSP load {load}% · Errors {errors}').format(
+                quantum=row.quantum,
+                rate=row.rate,
+                latency=f'{latency * 1000:.1f}' if latency else '-',
+                load=f'{row.load() * 100:.0f}',
+                errors=row.errors
+            )
+
+            GLib.idle_add(self._update_node_row, node_row, sparkline, text, stats.load.to_list(), error_marks)
+
+        return on_stats
+
+    def _update_node_row(self, node_row: Adw.ActionRow, sparkline: Sparkline, text: str, values: list[float], error_marks: list[int]):
+        node_row.set_subtitle(text)
+        sparkline.set_values(values, error_marks)
+        return False
@@ -18,13 +18,19 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from typing import Optional
-from pulsectl import Pulse
 import time
+import logging
 from gi.repository import Adw
 from gi.repository import Gtk, GObject, Gio
 from pprint import pprint
-from ..utils import async_utils
-from ..utils.utils import link_low_latency
+from ..utils import async_utils, tracing
+from ..pipewire.latency_tuner import latency_tuner
+from ..pipewire.shared_nodes import shared_low_latency_nodes
+from ..pipewire.latency import estimate_latency
+from ..pipewire.device_links import ActiveConnection
+from ..pipewire.graph import PwGraph
+from ..pulseaudio.client import pulse_client, PulseDevice, PulseDevices
+from .DspStatsRow import DspStatsRow
 from ..pipewire.pipewire import Pipewire, PwLink, PwLowLatencyNode
 
 
@@ -36,7 +42,7 @@ class PwActiveConnectionBox(Adw.PreferencesGroup):
     }
 
     def __init__(self, input_link: PwLink, output_link: PwLink, connection_name: str, 
-        link_ids: list[str], show_link_ids: bool, has_manual_link_indicator=True, initial_lln:Optional[PwLowLatencyNode]=None, **kwargs):
+        link_ids: list[int], show_link_ids: bool, graph: PwGraph, has_manual_link_indicator=True, initial_lln:Optional[PwLowLatencyNode]=None, **kwargs):
 
         super().__init__(css_classes=['boxed-list'])
 
@@ -44,9 +50,12 @@ class PwActiveConnectionBox(Adw.PreferencesGroup):
         self.output_link = output_link
         self.input_name = input_link.name
         self.output_name = output_link.name
-        self.link_ids: list[str] = link_ids
+        self.link_ids: list[int] = link_ids
         self.has_manual_link_indicator = has_manual_link_indicator
+        # the node of the mic, shared with its other connections, if this one enabled low-latency mode
         self.low_latency_node: Optional[PwLowLatencyNode] = initial_lln
+        # the graph of the last refresh, read by the refresh worker: the box never queries Pipewire itself
+        self.graph = graph
 
         self.settings: Gio.Settings = Gio.Settings.new('it.mijorus.whisper')
         self.settings.connect('changed::release-links-on-quit', self.on_change_manual_link_indicator)
@@ -54,10 +63,7 @@ class PwActiveConnectionBox(Adw.PreferencesGroup):
         self.set_title(connection_name)
 
         if show_link_ids:
-            self.set_description('Link IDs: ' + ', '.join(link_ids))
-
-        # if not self.is_low_latency:
-        #     clock_data = Pipewire.get_default_clock_info()
+            self.set_description('Link IDs: ' + ', '.join(str(l) for l in link_ids))
 
         self.output_exp = Adw.ExpanderRow(title=self.output_name)
         self.input_exp = Adw.ExpanderRow(title=self.input_name)
@@ -77,20 +83,22 @@ class PwActiveConnectionBox(Adw.PreferencesGroup):
         outp_r = Gtk.ListBoxRow()
         outp_r.set_child(self.output_range)
 
-        low_latency_row = Adw.SwitchRow(
+        self.low_latency_row = Adw.SwitchRow(
             title=_('Enable low-latency mode'),
             active=(initial_lln != None)
         )
 
-        low_latency_row.set_tooltip_text(_('This setting attemps to reduce the micrphone latency, but may increase CPU usage and cause distortions'))
-        low_latency_row.connect('notify::active', self.on_latency_row_toggled)
+        self.low_latency_row.set_tooltip_text(_('This setting attemps to reduce the micrphone latency, but may increase CPU usage and cause distortions'))
+        self.low_latency_handler = self.low_latency_row.connect('notify::active', self.on_latency_row_toggled)
+        self.refresh_latency_estimate()
 
         self.input_exp.add_row(inp_r)
         self.output_exp.add_row(outp_r)
 
-        self.add(low_latency_row)
+        self.add(self.low_latency_row)
         self.add(self.output_exp)
         self.add(self.input_exp)
+        self.add(DspStatsRow(self.get_stats_nodes))
 
         disconnect_btn = Gtk.Button(label=_('Disconnect'), css_classes=['destructive-action'])
         disconnect_btn.connect('clicked', self.on_disconnect_btn_clicked)
@@ -109,43 +117,129 @@ class PwActiveConnectionBox(Adw.PreferencesGroup):
 
         self.set_header_suffix(self.header_suffix)
 
-        self.pa_sink = None
-        self.pa_source = None
-        self.refresh_volume_levels()
+        # set by refresh_volume_levels(), the window reads the volumes of every box at once
+        self.pa_sink: Optional[PulseDevice] = None
+        self.pa_source: Optional[PulseDevice] = None
 
-    def refresh_volume_levels(self):
-        try:
-            with Pulse() as pulse_client:
-                self.pa_sink = pulse_client.get_sink_by_name(self.input_link.resource_name)
-                self.pa_source = pulse_client.get_source_by_name(self.output_link.resource_name)
+    def update(self, connection: ActiveConnection, connection_name: str, show_link_ids: bool, graph: Optional[PwGraph]=None):
+        # patches the box with a newer state of the same connection, expanders and sliders are left as they are
+        self.output_link = connection.output_device
+        self.input_link = connection.input_device
+        self.link_ids = connection.link_ids
+        self.has_manual_link_indicator = connection.manually_created
+
+        self.set_title(connection_name)
+        self.set_description(('Link IDs: ' + ', '.join(str(l) for l in self.link_ids)) if show_link_ids else None)
+        self.manual_link_indicator.set_visible(self.has_manual_link_indicator and self.settings.get_boolean('release-links-on-quit'))
+
+        # while low-latency mode is being toggled the graph may not show the node yet
+        if self.low_latency_row.get_sensitive() and (connection.low_latency_node != self.low_latency_node):
+            self.low_latency_node = connection.low_latency_node
+            self.set_low_latency_row(self.low_latency_node is not None)
+
+        self.refresh_latency_estimate(graph)
 
-            self.input_range.set_value(self.pa_sink.volume.value_flat * 100)
-            self.output_range.set_value(self.pa_source.volume.value_flat * 100)
-        except Exception as e:
-            print(e)
+    def set_low_latency_row(self, active: bool):
+        # shows the state without toggling low-latency mode
+        self.low_latency_row.handler_block(self.low_latency_handler)
+        self.low_latency_row.set_active(active)
+        self.low_latency_row.handler_unblock(self.low_latency_handler)
+
+    def refresh_volume_levels(self, devices: PulseDevices):
+        self.pa_sink = devices.sink(self.input_link.resource_name)
+        self.pa_source = devices.source(self.output_link.resource_name)
+
+        # a slider that is being dragged would jump back to a value read before our last write
+        if self.pa_sink and not pulse_client.is_echo('sink', self.pa_sink.index):
+            self.input_range.set_value(self.pa_sink.volume * 100)
+
+        if self.pa_source and not pulse_client.is_echo('source', self.pa_source.index):
+            self.output_range.set_value(self.pa_source.volume * 100)
 
     def on_change_manual_link_indicator(self, settings, key):
         self.manual_link_indicator.set_visible(self.settings.get_boolean(key) and self.has_manual_link_indicator)
 
+    def refresh_latency_estimate(self, graph: Optional[PwGraph]=None):
+        if graph:
+            self.graph = graph
+
+        graph = self.graph
+        mic = self.output_link.resource_name
+        speaker = self.input_link.resource_name
+        current = estimate_latency(graph, mic, speaker)
+
+        if current is None:
+            self.low_latency_row.set_subtitle('')
+            return
+
+        if self.low_latency_node:
+            other = estimate_latency(graph, mic, speaker, include_low_latency_nodes=False)
+            text = _('Estimated latency: {current} ms, {other} ms without low-latency mode')
+        else:
+            quantum = latency_tuner.quantum_for(mic) or Pipewire.low_latency_min_quantum(Pipewire.get_default_clock_info(graph))
+            other = estimate_latency(graph, mic, speaker, low_latency_quantum=quantum)
+            text = _('Estimated latency: {current} ms, {other} ms with low-latency mode')
+
+        self.low_latency_row.set_subtitle(text.format(current=f'{current.total() * 1000:.1f}', other=f'{other.total() * 1000:.1f}'))
+
+    def get_stats_nodes(self) -> list[tuple[str, int]]:
+        graph = self.graph
+        nodes = []
+
+        for label, name in ((self.output_name, self.output_link.resource_name), (self.input_name, self.input_link.resource_name)):
+            node = graph.node_by_name(name)
+            if node:
+                nodes.append((label, node.id))
+
+        lln = shared_low_latency_nodes.node_for(self.output_link.resource_name) or self.low_latency_node
+        if lln:
+            nodes.insert(1, (_('Low-latency node'), lln.node_id))
+
+        return nodes
+
     def on_disconnect_btn_clicked(self, event):
         self.emit('disconnect', self.link_ids, self.output_link, self.input_link, self.low_latency_node)
 
     def on_latency_row_toggled(self, w, _):
-        active = w.get_active()
+        async_utils.run_task(self.set_low_latency(w, w.get_active()))
 
-        if active:
-            self.low_latency_node = link_low_latency(self.output_link.resource_name, self.input_link.resource_name)
-        elif not active and self.low_latency_node:
-            Pipewire.destroy_node(self.low_latency_node)
-            self.low_latency_node = None
+    @tracing.traced('toggle low latency')
+    async def set_low_latency(self, row: Adw.SwitchRow, active: bool):
+        row.set_sensitive(False)
+        started_at = time.perf_counter()
 
+        try:
+            if active:
+                try:
+                    self.low_latency_node = await shared_low_latency_nodes.acquire(self.output_link.resource_name, self.input_link.resource_name)
+                except Exception as e:
+                    logging.error(f'Could not enable low-latency mode: {e}')
+                    self.low_latency_node = None
+
+                if not self.low_latency_node:
+                    # the node could not be created, or the connection was released in the meantime
+                    self.set_low_latency_row(False)
+                    active = False
+            elif not active and self.low_latency_node:
+                # the node is destroyed with its last connection
+                await shared_low_latency_nodes.release(self.output_link.resource_name, self.input_link.resource_name)
+                self.low_latency_node = None
+        finally:
+            # the window refreshes the latency estimates after 'low-latency-change'
+            row.set_sensitive(True)
+
+        logging.info(f'Low-latency mode {"enabled" if active else "disabled"} in {(time.perf_counter() - started_at) * 1000:.0f}ms')
         self.emit('low-latency-change', active)
-    @async_utils.debounce(0.5)
+
+    # every move of a slider is sent, pulse_client limits how often it's written
     def on_change_input_range(self, widget, _, value: float):
         if self.pa_sink:
-            self.emit('change-volume', self.pa_sink, value)
+            self.emit('change-volume', self.pa_sink, min(max(value, 0), 100))
+
+        return False
 
-    @async_utils.debounce(0.5)
     def on_change_output_range(self, widget, _, value: float):
         if self.pa_source:
-            self.emit('change-volume', self.pa_source, value)
+            self.emit('change-volume', self.pa_source, min(max(value, 0), 100))
+
+        return False
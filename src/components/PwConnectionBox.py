@@ -1,9 +1,14 @@
+import asyncio
+import logging
 import pulsectl
 from gi.repository import Adw, Gtk, Gio, GObject
 from pprint import pprint
 from .ExpanderRowRadio import ExpanderRowRadio
-from ..pipewire.pipewire import Pipewire
-from ..utils.utils import link_output_input
+from typing import Callable
+from ..pipewire.pipewire import Pipewire, PwLink
+from ..pipewire.snapshot import pw_snapshot
+from ..pipewire.async_pipewire import AsyncPipewire
+from ..utils import async_utils
 
 
 class PwConnectionBox(Adw.PreferencesGroup):
@@ -18,8 +23,31 @@ class PwConnectionBox(Adw.PreferencesGroup):
         self.output_select = ExpanderRowRadio(title=_(' -- Select a microphone --'))
         self.output_select.connect('change', self.on_output_select_change)
 
+        self.input_select = ExpanderRowRadio(title=_(' -- Select a speaker --'))
+        self.input_select.connect('change', self.on_input_select_change)
+
+        self.add(self.output_select)
+        self.add(self.input_select)
+
+        self.connect_btn = Gtk.Button(label=_('Connect'), css_classes=['suggested-action'], sensitive=False)
+        self.connect_btn.connect('clicked', self.connect_source)
+        self.set_header_suffix(self.connect_btn)
+
+        # the devices are listed once the graph is read, outside of the main loop
+        async_utils.run_task(self.load_devices())
+
+    @staticmethod
+    async def read_snapshot(*readers: Callable) -> tuple:
+        # the snapshot may have to run pw-dump
+        return await asyncio.get_running_loop().run_in_executor(None, lambda: tuple(r(quiet=True) for r in readers))
+
+    async def load_devices(self):
+        outputs, inputs = await PwConnectionBox.read_snapshot(pw_snapshot.outputs, pw_snapshot.inputs)
+        self.add_devices(outputs, inputs)
+
+    def add_devices(self, outputs: dict[str, PwLink], inputs: dict[str, PwLink]):
         output_names = []
-        for k, v in Pipewire.list_outputs().items():
+        for k, v in outputs.items():
             # Hardcoded, there as some issues with bluetooth mics for now
             is_bluetooth = False 
             if (v.alsa.startswith('alsa:') or is_bluetooth):
@@ -35,10 +63,7 @@ class PwConnectionBox(Adw.PreferencesGroup):
                     else:
                         self.output_select.add(name, k)
 
-        self.input_select = ExpanderRowRadio(title=_(' -- Select a speaker --'))
-        self.input_select.connect('change', self.on_input_select_change)
-
-        for k, v in Pipewire.list_inputs().items():
+        for k, v in inputs.items():
             is_bluetooth = v.resource_name.startswith('bluez_output')
             if (v.alsa.startswith('alsa:') or is_bluetooth):
                 if is_bluetooth or ('midi' not in k.lower()):
@@ -53,28 +78,23 @@ class PwConnectionBox(Adw.PreferencesGroup):
                     else:
                         self.input_select.add(name, k)
 
-        self.add(self.output_select)
-        self.add(self.input_select)
-
-        self.connect_btn = Gtk.Button(label=_('Connect'), css_classes=['suggested-action'], sensitive=False)
-        self.connect_btn.connect('clicked', self.connect_source)
-        self.set_header_suffix(self.connect_btn)
-
     def connect_source(self, widget):
         if self.settings.get_boolean('stand-by'):
             return
 
+        if not self.output_select.get_active_id() or not self.input_select.get_active_id():
+            return
+
         self.settings.set_boolean('stand-by', True)
+        self.connect_btn.set_sensitive(False)
+        async_utils.run_task(self.link_selected(self.output_select.get_active_id(), self.input_select.get_active_id()))
 
+    async def link_selected(self, output_id: str, input_id: str):
         try:
-            if not self.output_select.get_active_id() or not self.input_select.get_active_id():
-                return
-
-            link_output_input(self.output_select.get_active_id(), self.input_select.get_active_id())
-
-            self.emit('new_connection', self.output_select.get_active_id(), self.input_select.get_active_id())
+            await AsyncPipewire.link_devices(output_id, input_id)
+            self.emit('new_connection', output_id, input_id)
         except Exception as e:
-            print(e)
+            logging.error(f'Could not connect {output_id} to {input_id}: {e}')
         finally:
             self.settings.set_boolean('stand-by', False)
             self.input_select.set_active_id('')
@@ -88,13 +108,26 @@ class PwConnectionBox(Adw.PreferencesGroup):
                 radio.get_parent().get_parent().set_opacity(1)
 
     def on_output_select_change(self, _, _id: str):
-        links = Pipewire.list_links()
-        pw_output = Pipewire.list_outputs()[_id]
-
         for radio in self.input_select.radio_buttons:
             radio.set_sensitive(True)
             radio.get_parent().get_parent().set_opacity(1)
 
+        self.on_any_select_change()
+        async_utils.run_task(self.disable_connected_inputs(_id))
+
+    async def disable_connected_inputs(self, _id: str):
+        # the speakers the mic is already connected to can't be selected
+        links, outputs = await PwConnectionBox.read_snapshot(pw_snapshot.links, pw_snapshot.outputs)
+
+        if self.output_select.get_active_id() != _id:
+            # another mic was selected in the meantime
+            return
+
+        pw_output = outputs.get(_id)
+
+        if pw_output is None:
+            return
+
         for o in pw_output.channels:
             if not o in links:
                 continue
@@ -18,9 +18,11 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from .pipewire.pipewire import Pipewire
+from .pipewire.simulated_backend import PwSimulatedBackend
 from .Preferences import WhisperPreferencesWindow
 from .window import WhisperWindow
-from .utils.utils import make_option, link_output_input
+from .utils.utils import make_option
+from .utils import async_utils, tracing
 from gi.repository import Gtk, Gio, Adw, GLib
 import json
 import sys
@@ -49,13 +51,14 @@ class WhisperApplication(Adw.Application):
 
         self.add_main_option_entries([
             make_option('autostart'),
-            make_option('version')
+            make_option('version'),
+            make_option('trace', description='Record a performance trace (Chrome trace format) in the logs folder')
         ])
 
         self.connect('shutdown', self.on_query_end)
 
     def on_query_end(self, app):
-        pass
+        tracing.write()
 
     def do_activate(self):
         """Called when the application is activated.
@@ -87,6 +90,9 @@ class WhisperApplication(Adw.Application):
             print(self.version)
             return 0
 
+        if options.contains('trace') and not tracing.is_enabled():
+            tracing.enable(GLib.get_user_cache_dir() + '/logs/whisper-trace.json')
+
         self.autostarting = options.contains('autostart')
         if self.autostarting:
             logging.info('Starting whisper with --autostart (usually after reboot)')
@@ -187,4 +193,10 @@ def main(version):
 
     print('Logging to file: ' + LOG_FILE)
 
+    async_utils.setup_event_loop()
+
+    if os.environ.get('WHISPER_PW_BACKEND') == 'simulated':
+        logging.info('Using a simulated Pipewire graph')
+        Pipewire.set_backend(PwSimulatedBackend.with_demo_devices())
+
     return app.run(sys.argv)
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+from typing import Any, Callable, Optional
+from .graph import PwGraph, PW_TYPE_CORE, PW_TYPE_NODE
+from .backend import PwOperation, PwOperationResult, PW_ASYNC_TIMEOUT
+from .pipewire import Pipewire, PwLink, PwActiveConnectionLink, PwLowLatencyNode, LOW_LATENCY_NODE_TIMEOUT
+from . import dump_reader
+from ..utils import tracing
+
+
+class AsyncPipewire():
+    """
+    Awaitable counterpart of the Pipewire class, meant to run on the GLib main loop (see async_utils.setup_event_loop).
+
+    Requests go through the same backend and return the same objects as the blocking API.
+    Cancelling a request kills the process it started, `timeout` is in seconds
+    """
+
+    @staticmethod
+    async def get_info_raw() -> str:
+        return await Pipewire.backend.async_info()
+
+    @staticmethod
+    async def list_objects(quiet=False, types: Optional[set[str]]=None, timeout: float=PW_ASYNC_TIMEOUT) -> list[dict]:
+        # like Pipewire.list_objects(), timeouts and cancellations are raised
+        try:
+            lines = await Pipewire.backend.async_dump_lines(quiet=quiet, timeout=timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            raise
+        except Exception as e:
+            logging.error(f'Could not read the Pipewire graph: {e}')
+            return []
+
+        return dump_reader.read_dump(lines, types)
+
+    @staticmethod
+    @tracing.traced('get_graph')
+    async def get_graph(quiet=False, types: Optional[set[str]]=None, timeout: float=PW_ASYNC_TIMEOUT) -> PwGraph:
+        return PwGraph.from_dump(await AsyncPipewire.list_objects(quiet=quiet, types=types, timeout=timeout))
+
+    @staticmethod
+    async def _wait_for(monitor, func: Callable[[PwGraph], Any], timeout: float) -> Any:
+        # PwGraphMonitor.wait_for() blocks, it waits in a worker thread
+        return await asyncio.get_running_loop().run_in_executor(None, monitor.wait_for, func, timeout)
+
+    @staticmethod
+    async def get_clock_info() -> dict:
+        # see Pipewire.get_clock_info()
+        if Pipewire.clock_info is not None:
+            return Pipewire.clock_info
+
+        monitor = Pipewire._synced_monitor()
+        if monitor:
+            return monitor.read(Pipewire._cache_clock_info)
+
+        return Pipewire._cache_clock_info(await AsyncPipewire.get_graph(types={PW_TYPE_CORE}))
+
+    @staticmethod
+    async def list_inputs(quiet=False, graph: Optional[PwGraph]=None) -> dict[str, PwLink]:
+        graph = await AsyncPipewire.get_graph(quiet=quiet) if graph is None else graph
+        return Pipewire._ports_from_graph(graph, 'input')
+
+    @staticmethod
+    async def list_outputs(quiet=False, graph: Optional[PwGraph]=None) -> dict[str, PwLink]:
+        graph = await AsyncPipewire.get_graph(quiet=quiet) if graph is None else graph
+        return Pipewire._ports_from_graph(graph, 'output')
+
+    @staticmethod
+    async def list_links(quiet=False, graph: Optional[PwGraph]=None) -> dict[int, dict[int, PwActiveConnectionLink]]:
+        graph = await AsyncPipewire.get_graph(quiet=quiet) if graph is None else graph
+        return Pipewire._links_from_graph(graph)
+
+    @staticmethod
+    async def link(output_port: str, input_port: str):
+        await Pipewire.backend.async_link(output_port, input_port)
+        Pipewire._notify_change()
+
+    @staticmethod
+    async def unlink(link_id):
+        await Pipewire.backend.async_unlink(link_id)
+        Pipewire._notify_change()
+
+    @staticmethod
+    async def run_batch(operations: list[PwOperation]) -> list[PwOperationResult]:
+        if not operations:
+            return []
+
+        try:
+            results = await Pipewire.backend.async_run_batch(operations)
+        finally:
+            # a cancelled batch may have been partially applied
+            Pipewire._notify_change()
+
+        for r in results:
+            if not r.ok:
+                logging.error(f'{r.operation} failed: {r.error}')
+
+        return results
+
+    @staticmethod
+    @tracing.traced('link_devices')
+    async def link_devices(output_name: str, input_name: str, graph: Optional[PwGraph]=None) -> list[PwOperationResult]:
+        # links every channel of a mic to a speaker, see Pipewire.plan_device_links()
+        monitor = Pipewire._synced_monitor()
+
+        if (graph is None) and monitor:
+            operations = monitor.read(lambda g: Pipewire._plan_links_by_name(g, output_name, input_name))
+        else:
+            graph = await AsyncPipewire.get_graph() if graph is None else graph
+            operations = Pipewire._plan_links_by_name(graph, output_name, input_name)
+
+        return await AsyncPipewire.run_batch(operations)
+
+    @staticmethod
+    @tracing.traced('create_low_latency_node')
+    async def create_low_latency_node(quantum: Optional[int]=None) -> PwLowLatencyNode:
+        # see Pipewire.create_low_latency_node()
+        monitor = Pipewire._synced_monitor()
+        clock_info = await AsyncPipewire.get_clock_info()
+
+        if monitor:
+            node_names = monitor.read(Pipewire._low_latency_node_names)
+        else:
+            node_names = Pipewire._low_latency_node_names(await AsyncPipewire.get_graph(types={PW_TYPE_NODE}))
+
+        node_name, props = Pipewire._low_latency_node_props(node_names, clock_info, quantum)
+        Pipewire.reserved_node_names.add(node_name)
+
+        try:
+            node_id = await Pipewire.backend.async_create_node('adapter', props)
+            Pipewire._notify_change()
+
+            if monitor:
+                find_node = lambda g: Pipewire._find_created_node(g, node_name, len(props['audio.position']))
+                node = await AsyncPipewire._wait_for(monitor, find_node, LOW_LATENCY_NODE_TIMEOUT)
+                node_id = node.id if node else node_id
+
+            if node_id is None:
+                node_id = Pipewire._created_node_id(await AsyncPipewire.get_graph(types={PW_TYPE_NODE}), node_name)
+        finally:
+            Pipewire.reserved_node_names.discard(node_name)
+
+        return PwLowLatencyNode(node_id=node_id, name=node_name)
+
+    @staticmethod
+    async def destroy_node(node: PwLowLatencyNode):
+        await Pipewire.backend.async_destroy(node.name)
+        Pipewire._notify_change()
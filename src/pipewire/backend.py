@@ -0,0 +1,392 @@
+import json
+import re
+import asyncio
+import logging
+import functools
+import subprocess
+import tempfile
+from typing import Iterator, List, Optional, Union
+from .cli_session import PwCliSession, PwCliSessionUnavailable
+from ..utils import tracing
+
+
+# Operations of a batch are grouped by action and the groups run in this order
+BATCH_PHASES = ['unlink', 'destroy', 'link']
+BATCH_MAX_PROCESSES = 16
+
+# Seconds an async request can take before its process is killed
+PW_ASYNC_TIMEOUT = 5
+
+
+class PwOperation():
+    __slots__ = ('action', 'args')
+
+    def __init__(self, action: str, *args: Union[str, int]):
+        # action: 'link' (output port, input port), 'unlink' (link id) or 'destroy' (node name or id)
+        self.action = action
+        self.args: tuple[str, ...] = tuple(str(a) for a in args)
+
+    def __repr__(self):
+        return f'PwOperation({self.action}, {", ".join(self.args)})'
+
+
+class PwOperationResult():
+    __slots__ = ('operation', 'ok', 'error')
+
+    def __init__(self, operation: PwOperation, ok: bool, error: Optional[str]=None):
+        self.operation = operation
+        self.ok = ok
+        self.error = error
+
+
+class PwBackend():
+    """
+    Transport used by the Pipewire class to talk to the daemon.
+
+    Listings use the same text format as `pw-link --verbose --id` and `pw-link --links --id`,
+    the dump uses the same JSON structure as `pw-dump`
+    """
+
+    def is_available(self) -> bool:
+        raise NotImplementedError()
+
+    def info(self) -> str:
+        raise NotImplementedError()
+
+    def list_ports(self, direction: str, quiet=False) -> str:
+        # direction is either 'input' or 'output'
+        raise NotImplementedError()
+
+    def list_links(self, quiet=False) -> str:
+        raise NotImplementedError()
+
+    def stream_ports(self, direction: str, quiet=False) -> Iterator[str]:
+        # same as list_ports(), line by line
+        return iter(self.list_ports(direction, quiet=quiet).splitlines())
+
+    def stream_links(self, quiet=False) -> Iterator[str]:
+        return iter(self.list_links(quiet=quiet).splitlines())
+
+    def link(self, output_port: str, input_port: str):
+        raise NotImplementedError()
+
+    def unlink(self, link_id: str):
+        raise NotImplementedError()
+
+    def create_node(self, factory: str, props: dict) -> Optional[int]:
+        # returns the id of the new node when the backend knows it
+        raise NotImplementedError()
+
+    def destroy(self, name_or_id: str):
+        raise NotImplementedError()
+
+    def dump(self, quiet=False) -> list:
+        raise NotImplementedError()
+
+    def stream_dump(self, quiet=False) -> Iterator[str]:
+        # same as dump(), as the lines printed by pw-dump
+        return iter(json.dumps(self.dump(quiet=quiet), indent=2).splitlines(keepends=True))
+
+    def monitor(self):
+        # returns a Popen-like object: `stdout` yields `pw-dump --monitor` lines, `terminate()` stops it
+        raise NotImplementedError()
+
+    def top(self):
+        # returns a Popen-like object: `stdout` yields `pw-top --batch-mode` lines, `terminate()` stops it
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def _batch_phases(operations: list[PwOperation]) -> list[list[tuple[int, PwOperation]]]:
+        phases = []
+        for action in BATCH_PHASES:
+            phase = [(i, op) for i, op in enumerate(operations) if op.action == action]
+            if phase:
+                phases.append(phase)
+
+        return phases
+
+    def run_batch(self, operations: list[PwOperation]) -> list[PwOperationResult]:
+        """
+        Runs every operation, unlinks first and links last.
+        A failing operation does not stop the others, the results follow the order of `operations`
+        """
+        results: list[Optional[PwOperationResult]] = [None] * len(operations)
+
+        for phase in PwBackend._batch_phases(operations):
+            for i, op in phase:
+                try:
+                    getattr(self, op.action)(*op.args)
+                    results[i] = PwOperationResult(op, True)
+                except Exception as e:
+                    results[i] = PwOperationResult(op, False, getattr(e, 'stderr', None) or str(e))
+
+        return results
+
+    # Async variants, used by AsyncPipewire.
+    # By default they run the blocking methods in the loop's executor, backends that spawn processes override them
+
+    async def _in_executor(self, method, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(method, *args))
+
+    async def async_info(self) -> str:
+        return await self._in_executor(self.info)
+
+    async def async_dump_lines(self, quiet=False, timeout: float=PW_ASYNC_TIMEOUT) -> list[str]:
+        # the pw-dump output, see stream_dump()
+        return await asyncio.wait_for(self._in_executor(lambda: list(self.stream_dump(quiet=quiet))), timeout)
+
+    async def async_link(self, output_port: str, input_port: str):
+        await self._in_executor(self.link, output_port, input_port)
+
+    async def async_unlink(self, link_id: str):
+        await self._in_executor(self.unlink, link_id)
+
+    async def async_create_node(self, factory: str, props: dict) -> Optional[int]:
+        return await self._in_executor(self.create_node, factory, props)
+
+    async def async_destroy(self, name_or_id: str):
+        await self._in_executor(self.destroy, name_or_id)
+
+    async def _async_operation(self, op: PwOperation, limit: asyncio.Semaphore) -> PwOperationResult:
+        async with limit:
+            try:
+                await getattr(self, f'async_{op.action}')(*op.args)
+                return PwOperationResult(op, True)
+            except Exception as e:
+                return PwOperationResult(op, False, getattr(e, 'stderr', None) or str(e))
+
+    async def async_run_batch(self, operations: list[PwOperation]) -> list[PwOperationResult]:
+        # same as run_batch(), the operations of a phase run concurrently
+        results: list[Optional[PwOperationResult]] = [None] * len(operations)
+        limit = asyncio.Semaphore(BATCH_MAX_PROCESSES)
+
+        for phase in PwBackend._batch_phases(operations):
+            phase_results = await asyncio.gather(*[self._async_operation(op, limit) for i, op in phase])
+
+            for (i, op), result in zip(phase, phase_results):
+                results[i] = result
+
+        return results
+
+
+class PwCliBackend(PwBackend):
+    """
+    Runs pw-link and pw-dump for every request.
+    pw-cli commands go through a persistent session, the one-shot pw-cli is the fallback
+    """
+
+    def __init__(self, use_session=True):
+        self.session: Optional[PwCliSession] = PwCliSession() if use_session else None
+
+    def _run_pw_cli(self, args: List[str]) -> str:
+        if self.session:
+            try:
+                return self.session.request(' '.join(args))
+            except PwCliSessionUnavailable as e:
+                # only when the command was not sent: after a timeout it may have run already,
+                # running create-node or destroy again is not safe
+                logging.warning(f'pw-cli session unavailable ({e}), running pw-cli once')
+
+        return self._run(['pw-cli', *args])
+
+    @staticmethod
+    def _run(command: List[str], quiet=False) -> str:
+        try:
+            if not quiet:
+                logging.info(f'Running {command}')
+
+            with tracing.span(command[0], cat='subprocess', command=' '.join(command)) as s:
+                output = subprocess.run([*command], encoding='utf-8', shell=False, capture_output=True)
+                s.set(exit_code=output.returncode, output_size=len(output.stdout))
+
+            output.check_returncode()
+        except subprocess.CalledProcessError as e:
+            logging.error(f'{command[0]} failed: {e.stderr}')
+            raise e
+
+        return re.sub(r'\n$', '', output.stdout)
+
+    @staticmethod
+    def _stream(command: List[str], quiet=False) -> Iterator[str]:
+        # yields the lines as the process prints them, raises CalledProcessError at the end if it failed
+        if not quiet:
+            logging.info(f'Running {command}')
+
+        # stderr goes to a file: a full stderr pipe would block the process while we are reading stdout
+        with tracing.span(command[0], cat='subprocess', command=' '.join(command)) as s, \
+                tempfile.TemporaryFile('w+', encoding='utf-8') as stderr_file:
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr_file, encoding='utf-8')
+            output_size = 0
+
+            try:
+                for line in process.stdout:
+                    output_size += len(line)
+                    yield line
+            finally:
+                process.stdout.close()
+                returncode = process.wait()
+                stderr_file.seek(0)
+                stderr = stderr_file.read()
+                s.set(exit_code=returncode, output_size=output_size)
+
+        if returncode:
+            logging.error(f'{command[0]} failed: {stderr}')
+            raise subprocess.CalledProcessError(returncode, command, stderr=stderr)
+
+    @staticmethod
+    async def _run_async(command: List[str], quiet=False, timeout: float=PW_ASYNC_TIMEOUT) -> str:
+        # same as _run(), the process is killed if the request times out or is cancelled
+        if not quiet:
+            logging.info(f'Running {command}')
+
+        with tracing.span(command[0], cat='subprocess', is_async=True, command=' '.join(command)) as s:
+            process = await asyncio.create_subprocess_exec(*command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+            except BaseException:
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+
+                raise
+
+            s.set(exit_code=process.returncode, output_size=len(stdout))
+
+        stdout, stderr = stdout.decode('utf-8'), stderr.decode('utf-8')
+        if process.returncode:
+            logging.error(f'{command[0]} failed: {stderr}')
+            raise subprocess.CalledProcessError(process.returncode, command, output=stdout, stderr=stderr)
+
+        return re.sub(r'\n$', '', stdout)
+
+    @staticmethod
+    def format_props(props: dict) -> str:
+        items = []
+        for k, v in props.items():
+            if isinstance(v, bool):
+                v = 'true' if v else 'false'
+            elif isinstance(v, (list, tuple)):
+                v = '[' + ' '.join(v) + ']'
+
+            items.append(f'{k}={v}')
+
+        return '{' + ' '.join(items) + '}'
+
+    @staticmethod
+    def _operation_command(op: PwOperation) -> List[str]:
+        if op.action == 'link':
+            return ['pw-link', '--linger', *op.args]
+        elif op.action == 'unlink':
+            return ['pw-link', '--disconnect', *op.args]
+        elif op.action == 'destroy':
+            return ['pw-cli', 'destroy', *op.args]
+
+        raise ValueError(f'Unknown Pipewire operation: {op.action}')
+
+    def is_available(self) -> bool:
+        try:
+            return bool(self._run(['which', 'pw-cli']).strip() and self._run(['which', 'pw-link']).strip() and self._run(['pw-cli', 'info', '0']).strip())
+        except:
+            return False
+
+    def info(self) -> str:
+        return self._run_pw_cli(['info', '0'])
+
+    def list_ports(self, direction: str, quiet=False) -> str:
+        return self._run(['pw-link', f'--{direction}', '--verbose', '--id'], quiet=quiet)
+
+    def list_links(self, quiet=False) -> str:
+        return self._run(['pw-link', '--links', '--id'], quiet=quiet)
+
+    def stream_ports(self, direction: str, quiet=False) -> Iterator[str]:
+        return self._stream(['pw-link', f'--{direction}', '--verbose', '--id'], quiet=quiet)
+
+    def stream_links(self, quiet=False) -> Iterator[str]:
+        return self._stream(['pw-link', '--links', '--id'], quiet=quiet)
+
+    def link(self, output_port: str, input_port: str):
+        self._run(PwCliBackend._operation_command(PwOperation('link', output_port, input_port)))
+
+    def unlink(self, link_id: str):
+        self._run(PwCliBackend._operation_command(PwOperation('unlink', link_id)))
+
+    def create_node(self, factory: str, props: dict) -> Optional[int]:
+        self._run_pw_cli(['create-node', factory, PwCliBackend.format_props(props)])
+        return None
+
+    def destroy(self, name_or_id: str):
+        self._run_pw_cli(['destroy', str(name_or_id)])
+
+    def dump(self, quiet=False) -> list:
+        return json.loads(self._run(['pw-dump', '--no-colors'], quiet=quiet))
+
+    def stream_dump(self, quiet=False) -> Iterator[str]:
+        return self._stream(['pw-dump', '--no-colors'], quiet=quiet)
+
+    @tracing.traced('run_batch')
+    def run_batch(self, operations: list[PwOperation]) -> list[PwOperationResult]:
+        # operations of the same phase don't depend on each other, so their processes run in parallel
+        results: list[Optional[PwOperationResult]] = [None] * len(operations)
+
+        for phase in PwBackend._batch_phases(operations):
+            if self.session and phase[0][1].action == 'destroy':
+                # no process to spawn, the session runs them one after the other
+                for i, op in phase:
+                    try:
+                        self.destroy(*op.args)
+                        results[i] = PwOperationResult(op, True)
+                    except Exception as e:
+                        results[i] = PwOperationResult(op, False, getattr(e, 'stderr', None) or str(e))
+
+                continue
+
+            for chunk_start in range(0, len(phase), BATCH_MAX_PROCESSES):
+                processes = []
+                for i, op in phase[chunk_start:chunk_start + BATCH_MAX_PROCESSES]:
+                    command = PwCliBackend._operation_command(op)
+                    logging.info(f'Running {command}')
+
+                    # the processes run side by side, so do their spans
+                    s = tracing.span(command[0], cat='subprocess', is_async=True, command=' '.join(command)).__enter__()
+
+                    try:
+                        processes.append((i, op, s, subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding='utf-8')))
+                    except OSError as e:
+                        s.__exit__(type(e), e, None)
+                        results[i] = PwOperationResult(op, False, str(e))
+
+                for i, op, s, process in processes:
+                    stdout, stderr = process.communicate()
+                    s.set(exit_code=process.returncode, output_size=len(stdout))
+                    s.__exit__(None, None, None)
+                    results[i] = PwOperationResult(op, process.returncode == 0, (stderr.strip() or None) if process.returncode else None)
+
+        return results
+
+    # pw-cli commands keep going through the session (see _run_pw_cli), in the executor
+
+    async def async_dump_lines(self, quiet=False, timeout: float=PW_ASYNC_TIMEOUT) -> list[str]:
+        output = await PwCliBackend._run_async(['pw-dump', '--no-colors'], quiet=quiet, timeout=timeout)
+        return output.splitlines(keepends=True)
+
+    async def async_link(self, output_port: str, input_port: str):
+        await PwCliBackend._run_async(PwCliBackend._operation_command(PwOperation('link', output_port, input_port)))
+
+    async def async_unlink(self, link_id: str):
+        await PwCliBackend._run_async(PwCliBackend._operation_command(PwOperation('unlink', link_id)))
+
+    def monitor(self):
+        logging.info('Starting pw-dump monitor')
+        return subprocess.Popen(['pw-dump', '--monitor', '--no-colors'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, encoding='utf-8')
+
+    def top(self):
+        logging.info('Starting pw-top')
+        return subprocess.Popen(['pw-top', '--batch-mode'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, encoding='utf-8')
+
+    def close(self):
+        if self.session:
+            self.session.close()
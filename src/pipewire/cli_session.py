@@ -0,0 +1,128 @@
+import re
+import queue
+import shutil
+import logging
+import threading
+import subprocess
+from time import monotonic
+from typing import Optional
+from ..utils import tracing
+
+PW_CLI_TIMEOUT = 3
+PW_CLI_SYNC_COMMAND = 'whisper-sync'
+
+
+class PwCliSessionUnavailable(Exception):
+    # the command was not sent: pw-cli could not be started or the command could not be written to it
+    pass
+
+
+class PwCliSession():
+    """
+    Long-lived interactive pw-cli process.
+
+    Each request writes the command followed by an unknown command, pw-cli answers
+    the latter with an error that contains its name: everything printed before it is the response.
+    The process is restarted if it dies or does not answer in time
+    """
+
+    prompt_regex = re.compile(r'^(\S*>> ?)+')
+
+    def __init__(self, timeout: float=PW_CLI_TIMEOUT):
+        self.timeout = timeout
+        self.process: Optional[subprocess.Popen] = None
+        self.lines: queue.Queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.request_count = 0
+
+    def is_alive(self) -> bool:
+        return (self.process is not None) and (self.process.poll() is None)
+
+    def start(self):
+        # pw-cli does not flush its output when it's not writing to a terminal
+        command = ['stdbuf', '-oL', 'pw-cli'] if shutil.which('stdbuf') else ['pw-cli']
+        logging.info(f'Starting pw-cli session: {command}')
+
+        self.lines = queue.Queue()
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, encoding='utf-8', bufsize=1)
+        threading.Thread(target=self._read_output, args=(self.process, self.lines), daemon=True).start()
+
+    def _read_output(self, process: subprocess.Popen, lines: queue.Queue):
+        for line in process.stdout:
+            lines.put(line)
+
+        lines.put(None)
+
+    def close(self):
+        with self.lock:
+            self._stop()
+
+    def _stop(self):
+        if self.process:
+            try:
+                self.process.stdin.close()
+                self.process.terminate()
+                self.process.wait(timeout=1)
+            except Exception:
+                self.process.kill()
+
+            self.process = None
+
+    def request(self, command: str) -> str:
+        """
+        Runs a command and returns its output.
+        Raises CalledProcessError if pw-cli reports an error, PwCliSessionUnavailable if the command was not sent,
+        TimeoutError or ConnectionError if the session was lost after sending it: the command may have run
+        """
+        with tracing.span('pw-cli session', cat='subprocess', command=command) as s:
+            output = self._request(command)
+            s.set(output_size=len(output))
+
+        return output
+
+    def _request(self, command: str) -> str:
+        with self.lock:
+            if not self.is_alive():
+                try:
+                    self.start()
+                except OSError as e:
+                    raise PwCliSessionUnavailable(f'could not start pw-cli: {e}') from e
+
+            self.request_count += 1
+            sync_token = f'{PW_CLI_SYNC_COMMAND}-{self.request_count}-end'
+
+            logging.info(f'pw-cli session: {command}')
+            try:
+                self.process.stdin.write(f'{command}\n{sync_token}\n')
+                self.process.stdin.flush()
+            except OSError as e:
+                self._stop()
+                raise PwCliSessionUnavailable(f'could not send "{command}": {e}') from e
+
+            output = []
+            deadline = monotonic() + self.timeout
+
+            while True:
+                try:
+                    line = self.lines.get(timeout=max(0, deadline - monotonic()))
+                except queue.Empty:
+                    logging.error(f'pw-cli did not answer to "{command}", restarting the session')
+                    self._stop()
+                    raise TimeoutError(command)
+
+                if line is None:
+                    self._stop()
+                    raise ConnectionError(f'pw-cli exited while running "{command}"')
+
+                if sync_token in line:
+                    break
+
+                line = PwCliSession.prompt_regex.sub('', line.rstrip('\n'))
+                if line.strip():
+                    output.append(line)
+
+            errors = [l for l in output if l.startswith('Error:')]
+            if errors:
+                raise subprocess.CalledProcessError(1, ['pw-cli', command], output='\n'.join(output), stderr='\n'.join(errors))
+
+            return '\n'.join(output)
@@ -0,0 +1,132 @@
+from typing import Callable, Iterable, Optional
+from .pipewire import PwLink, PwActiveConnectionLink, PwLowLatencyNode, LOW_LATENCY_NODE_NAME
+
+
+class DeviceLink:
+    __slots__ = ('link_id', 'input_device', 'output_device')
+
+    def __init__(self, input_device, output_device, link_id):
+        self.link_id: int = link_id
+        self.input_device: Optional[PwLink] = input_device
+        self.output_device: PwLink = output_device
+
+    def __eq__(self, other):
+        if not isinstance(other, DeviceLink):
+            return NotImplemented
+
+        return (self.link_id, self.input_device, self.output_device) == (other.link_id, other.input_device, other.output_device)
+
+    def __hash__(self):
+        return hash((self.link_id, self.input_device, self.output_device))
+
+
+def is_supported_device(dev: Optional[PwLink]) -> Optional[PwLink]:
+    if dev and (dev.alsa.startswith('alsa:') or \
+        dev.resource_name.startswith('bluez_output') or \
+        LOW_LATENCY_NODE_NAME in dev.resource_name):
+        return dev
+
+    return None
+
+
+def group_device_links(
+        links: dict[int, dict[int, PwActiveConnectionLink]],
+        output_by_port: Callable[[int], Optional[PwLink]],
+        input_by_port: Callable[[int], Optional[PwLink]]
+    ) -> tuple[dict[str, dict[str, dict]], set[int]]:
+    """
+    Groups the active links by mic (output device) and speaker (input device), skipping unsupported devices.
+
+    Returns {output name: {input name: {'device_link', 'low_latency_node', 'link_ids'}}}
+    and the ids of the links that have been grouped
+    """
+    device_links: dict[str, dict[str, dict]] = {}
+    grouped_links: set[int] = set()
+
+    # cycle on every active link
+    for l, link in links.items():
+        # cycle on every pw output, check if it is an alsa device
+
+        output_device = is_supported_device(output_by_port(l))
+        if output_device:
+            for i, link_info in link.items():
+                # cycle on every active link for that output
+                input_device = is_supported_device(input_by_port(link_info._id))
+                if input_device:
+                    if not output_device.resource_name in device_links:
+                        device_links[output_device.resource_name] = {}
+
+                    if not input_device.resource_name in device_links[output_device.resource_name]:
+
+                        if LOW_LATENCY_NODE_NAME in input_device.resource_name:
+                            device_links[output_device.resource_name][input_device.resource_name] = {
+                                'device_link': DeviceLink(None, output_device, -1),
+                                'low_latency_node': True,
+                                'link_ids': []
+                            }
+                        else:
+                            device_links[output_device.resource_name][input_device.resource_name] = {
+                                'device_link': DeviceLink(input_device, output_device, 0),
+                                'low_latency_node': False,
+                                'link_ids': []
+                            }
+
+                    device_links[output_device.resource_name][input_device.resource_name]['link_ids'].append(i)
+                    grouped_links.add(i)
+
+    return device_links, grouped_links
+
+
+class ActiveConnection:
+    """A mic connected to a speaker, as shown by a PwActiveConnectionBox"""
+
+    __slots__ = ('output_device', 'input_device', 'link_ids', 'low_latency_node', 'manually_created')
+
+    def __init__(self, output_device: PwLink, input_device: PwLink, link_ids: list[int],
+            low_latency_node: Optional[PwLowLatencyNode]=None, manually_created=False):
+        self.output_device = output_device
+        self.input_device = input_device
+        self.link_ids = link_ids
+        # the shared node of the mic, if this connection enabled low-latency mode
+        self.low_latency_node = low_latency_node
+        self.manually_created = manually_created
+
+    @property
+    def key(self) -> tuple[str, str]:
+        return (self.output_device.resource_name, self.input_device.resource_name)
+
+    def __repr__(self):
+        return f'ActiveConnection({self.key}, links={self.link_ids}, lln={self.low_latency_node})'
+
+
+def diff_connections(old_keys: Iterable[tuple[str, str]], connections: list[ActiveConnection]
+        ) -> tuple[list[ActiveConnection], list[tuple[str, str]], list[ActiveConnection]]:
+    """
+    Compares the connections on screen (by key) with the new ones.
+    Returns the connections to add, the keys to remove and the connections to update in place, in their order
+    """
+    new_keys = {c.key for c in connections}
+    old_keys = list(old_keys)
+    old_set = set(old_keys)
+
+    added = [c for c in connections if c.key not in old_set]
+    removed = [k for k in old_keys if k not in new_keys]
+    kept = [c for c in connections if c.key in old_set]
+
+    return added, removed, kept
+
+
+class ActiveConnectionsModel:
+    """
+    The connections to show, built by the refresh worker and handed to the main loop.
+    Nothing in it is changed after it's built
+    """
+
+    __slots__ = ('connections', 'link_ids', 'graph', 'force')
+
+    def __init__(self, connections: tuple[ActiveConnection, ...], link_ids: frozenset[int], graph, force=False):
+        self.connections = connections
+        # every link that was grouped, including the ones of low-latency nodes
+        self.link_ids = link_ids
+        self.graph = graph
+        self.force = force
@@ -0,0 +1,178 @@
+import re
+import json
+import logging
+from typing import Iterable, Iterator, Optional
+from .graph import PW_TYPE_CORE, PW_TYPE_NODE, PW_TYPE_PORT, PW_TYPE_LINK
+
+# What Whisper reads from a pw-dump, everything else is dropped while reading
+DUMP_KEEP_INFO = {
+    PW_TYPE_CORE: ('props', ),
+    PW_TYPE_NODE: ('state', 'props'),
+    PW_TYPE_PORT: ('direction', 'props'),
+    PW_TYPE_LINK: ('output-node-id', 'output-port-id', 'input-node-id', 'input-port-id', 'state', 'props'),
+}
+
+DUMP_KEEP_PROPS = {
+    PW_TYPE_NODE: {
+        'node.name', 'node.description', 'node.nick', 'media.class', 'object.path', 'object.serial',
+        'device.api', 'node.latency', 'node.rate', 'node.force-quantum', 'node.force-rate',
+        'api.alsa.period-size', 'api.alsa.period-num', 'api.alsa.headroom', 'api.alsa.disable-tsched',
+        'audio.rate', 'object.linger',
+    },
+    PW_TYPE_PORT: {'node.id', 'port.name', 'port.alias', 'port.direction', 'object.path', 'audio.channel'},
+    PW_TYPE_LINK: {'link.output.node', 'link.output.port', 'link.input.node', 'link.input.port', 'object.linger'},
+}
+
+DUMP_KEEP_PROP_PREFIXES = {
+    PW_TYPE_CORE: ('default.clock.', ),
+}
+
+# pw-dump prints every top level object between a "  {" line and a "  }" line
+OBJECT_START = '\n  {'
+OBJECT_END = '\n  }'
+TYPE_REGEX = re.compile(r'\n    "type":\s*"([^"]+)"')
+TYPE_LOOKAHEAD = 200
+DUMP_READ_SIZE = 64 * 1024
+
+
+def prune_object(obj: dict, types: Optional[set[str]]=None) -> Optional[dict]:
+    """
+    Returns a copy of a pw-dump object with only the keys Whisper reads,
+    or None if its type is not wanted. Removed objects ({"id": .., "info": null}) are kept as they are
+    """
+    obj_type = obj.get('type')
+
+    if 'id' in obj and obj.get('info', False) is None:
+        return obj
+
+    if obj_type not in DUMP_KEEP_INFO or (types is not None and obj_type not in types):
+        return None
+
+    pruned = {'id': obj['id'], 'type': obj_type}
+    info = obj.get('info')
+
+    if info:
+        pruned_info = {k: info[k] for k in DUMP_KEEP_INFO[obj_type] if k in info}
+        props = info.get('props')
+
+        if props is not None:
+            keep = DUMP_KEEP_PROPS.get(obj_type, ())
+            prefixes = DUMP_KEEP_PROP_PREFIXES.get(obj_type, ())
+            pruned_info['props'] = {k: v for k, v in props.items() if (k in keep) or (prefixes and k.startswith(prefixes))}
+
+        pruned['info'] = pruned_info
+
+    return pruned
+
+
+def _is_wanted(obj_type: str, types: Optional[set[str]]) -> bool:
+    return (obj_type in DUMP_KEEP_INFO) and (types is None or obj_type in types)
+
+
+def _regroup(chunks: Iterable[str], size: int=DUMP_READ_SIZE) -> Iterator[str]:
+    # pw-dump output is read line by line, scanning bigger blocks is much faster
+    pending = []
+    pending_size = 0
+
+    for chunk in chunks:
+        pending.append(chunk)
+        pending_size += len(chunk)
+
+        if pending_size >= size:
+            yield ''.join(pending)
+            pending = []
+            pending_size = 0
+
+    if pending:
+        yield ''.join(pending)
+
+
+def iter_dump_objects(chunks: Iterable[str], types: Optional[set[str]]=None) -> Iterator[dict]:
+    """
+    Reads a pw-dump document in chunks of any size (eg. lines) and yields the pruned objects.
+
+    Object boundaries are found with str.find, objects of unwanted types are recognised
+    by their "type" line and dropped without being decoded.
+    If the output is not formatted the way we expect, the whole document is decoded at once
+    """
+    chunks = _regroup(chunks)
+    buffer = ''
+
+    # the document must start with "[\n  {" (or be an empty array)
+    for chunk in chunks:
+        buffer += chunk
+        head = buffer.lstrip()
+
+        if len(head) >= 4:
+            break
+
+    head = buffer.lstrip()
+    if not (head.startswith('[' + OBJECT_START) or head.replace('\n', '').replace(' ', '') == '[]'):
+        logging.debug('Unexpected pw-dump format, decoding it at once')
+        document = json.loads(buffer + ''.join(chunks) or '[]')
+
+        for obj in document:
+            pruned = prune_object(obj, types)
+            if pruned is not None:
+                yield pruned
+
+        return
+
+    buffer = head[1:]
+    # the current object starts at `start` (-1 while looking for one), `pos` is where to search next
+    start = -1
+    pos = 0
+    skipping = False
+
+    while True:
+        if start < 0:
+            start = buffer.find(OBJECT_START, pos)
+            if start >= 0:
+                pos = start + len(OBJECT_START)
+                skipping = False
+
+        while start >= 0:
+            end = buffer.find(OBJECT_END, pos)
+
+            if not skipping:
+                # removed objects have no type, don't look past the end of the object
+                m = TYPE_REGEX.search(buffer, start, min(start + TYPE_LOOKAHEAD, end if end >= 0 else len(buffer)))
+                if m and not _is_wanted(m.group(1), types):
+                    skipping = True
+
+            if end < 0:
+                break
+
+            if not skipping:
+                pruned = prune_object(json.loads(buffer[start + 1:end + len(OBJECT_END)]), types)
+                if pruned is not None:
+                    yield pruned
+
+            pos = end + len(OBJECT_END)
+            start = buffer.find(OBJECT_START, pos)
+            if start >= 0:
+                pos = start + len(OBJECT_START)
+                skipping = False
+
+        chunk = next(chunks, None)
+        if chunk is None:
+            return
+
+        # drop what has been read, keeping enough to spot a marker split across chunks
+        if start < 0:
+            buffer = buffer[max(pos, len(buffer) - len(OBJECT_START)):] + chunk
+            pos = 0
+        elif skipping:
+            # keep only what is needed to spot the end of the object
+            keep_from = max(pos, len(buffer) - len(OBJECT_END))
+            buffer = buffer[start:start + len(OBJECT_START)] + buffer[keep_from:] + chunk
+            start = 0
+            pos = len(OBJECT_START)
+        else:
+            pos = max(pos, len(buffer) - len(OBJECT_END)) - start
+            buffer = buffer[start:] + chunk
+            start = 0
+
+
+def read_dump(lines: Iterable[str], types: Optional[set[str]]=None) -> list[dict]:
+    return list(iter_dump_objects(lines, types))
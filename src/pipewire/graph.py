@@ -0,0 +1,248 @@
+import sys
+from typing import Optional
+
+PW_TYPE_CORE = 'PipeWire:Interface:Core'
+PW_TYPE_NODE = 'PipeWire:Interface:Node'
+PW_TYPE_PORT = 'PipeWire:Interface:Port'
+PW_TYPE_LINK = 'PipeWire:Interface:Link'
+
+
+def _intern(value) -> str:
+    # names are repeated in every snapshot (and between snapshots), keep a single copy of each
+    return sys.intern(value) if isinstance(value, str) else ''
+
+
+class PwNode():
+    __slots__ = ('id', 'name', 'description', 'media_class', 'props')
+
+    def __init__(self, node_id: int, props: dict):
+        self.id: int = node_id
+        self.name: str = _intern(props.get('node.name', ''))
+        self.description: str = props.get('node.description', '')
+        self.media_class: str = _intern(props.get('media.class', ''))
+        self.props: dict = props
+
+    def __eq__(self, other):
+        return (self.id, self.props) == (other.id, other.props) if isinstance(other, PwNode) else NotImplemented
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class PwPort():
+    __slots__ = ('id', 'node_id', 'direction', 'name', 'alias', 'path', 'channel', 'props')
+
+    def __init__(self, port_id: int, node_id: int, direction: str, props: dict):
+        self.id: int = port_id
+        self.node_id: int = node_id
+        self.direction: str = _intern(direction)
+        self.name: str = _intern(props.get('port.name', ''))
+        self.alias: str = props.get('port.alias', '')
+        self.path: str = props.get('object.path', '')
+        self.channel: str = _intern(props.get('audio.channel', ''))
+        self.props: dict = props
+
+    def __eq__(self, other):
+        return (self.id, self.direction, self.props) == (other.id, other.direction, other.props) if isinstance(other, PwPort) else NotImplemented
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class PwGraphLink():
+    __slots__ = ('id', 'output_node_id', 'output_port_id', 'input_node_id', 'input_port_id', 'props')
+
+    def __init__(self, link_id: int, output_node_id: int, output_port_id: int, input_node_id: int, input_port_id: int, props: dict):
+        self.id: int = link_id
+        self.output_node_id: int = output_node_id
+        self.output_port_id: int = output_port_id
+        self.input_node_id: int = input_node_id
+        self.input_port_id: int = input_port_id
+        self.props: dict = props
+
+    def endpoints(self) -> tuple[int, int]:
+        return (self.output_port_id, self.input_port_id)
+
+    def __eq__(self, other):
+        return (self.id, self.endpoints()) == (other.id, other.endpoints()) if isinstance(other, PwGraphLink) else NotImplemented
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class PwGraph():
+    """
+    Indexed view of a pw-dump document.
+    Every lookup by node name, node id, port id or link endpoint is a dict access
+    """
+
+    def __init__(self):
+        self.core_props: dict = {}
+        self.nodes_by_id: dict[int, PwNode] = {}
+        self.nodes_by_name: dict[str, PwNode] = {}
+        self.ports_by_id: dict[int, PwPort] = {}
+        self.ports_by_node: dict[int, dict[int, PwPort]] = {}
+        self.links_by_id: dict[int, PwGraphLink] = {}
+        self.links_by_output_port: dict[int, dict[int, PwGraphLink]] = {}
+        self.links_by_input_port: dict[int, dict[int, PwGraphLink]] = {}
+
+    @staticmethod
+    def from_dump(dump: list) -> 'PwGraph':
+        graph = PwGraph()
+
+        for obj in dump:
+            graph.add_object(obj)
+
+        return graph
+
+    def add_object(self, obj: dict) -> Optional[str]:
+        """
+        Adds or updates an object coming from pw-dump.
+        Returns the kind of the object ('node', 'port', 'link') when the graph changed, None otherwise
+        """
+        info = obj.get('info')
+        obj_id = obj['id']
+
+        if not info:
+            # pw-dump --monitor reports removed objects as {"id": ..., "info": null}
+            return self.remove_object(obj_id) if (info is None and 'info' in obj) else None
+
+        obj_type = obj.get('type')
+        props = info.get('props')
+
+        if obj_type == PW_TYPE_NODE:
+            old = self.nodes_by_id.get(obj_id)
+            props = props if props is not None else (old.props if old else {})
+            if old and old.props == props:
+                return None
+
+            if old:
+                self.remove_node(old)
+
+            self.add_node(PwNode(obj_id, props))
+            return 'node'
+        elif obj_type == PW_TYPE_PORT:
+            old = self.ports_by_id.get(obj_id)
+            props = props if props is not None else (old.props if old else {})
+            direction = info.get('direction', old.direction if old else '')
+            if old and old.props == props and old.direction == direction:
+                return None
+
+            if old:
+                self.remove_port(old)
+
+            self.add_port(PwPort(obj_id, props.get('node.id', -1), direction, props))
+            return 'port'
+        elif obj_type == PW_TYPE_LINK:
+            old = self.links_by_id.get(obj_id)
+            props = props if props is not None else (old.props if old else {})
+            link = PwGraphLink(
+                obj_id,
+                info.get('output-node-id', props.get('link.output.node', old.output_node_id if old else -1)),
+                info.get('output-port-id', props.get('link.output.port', old.output_port_id if old else -1)),
+                info.get('input-node-id', props.get('link.input.node', old.input_node_id if old else -1)),
+                info.get('input-port-id', props.get('link.input.port', old.input_port_id if old else -1)),
+                props
+            )
+
+            if old and (old.output_port_id, old.input_port_id, old.props) == (link.output_port_id, link.input_port_id, link.props):
+                return None
+
+            if old:
+                self.remove_link(old)
+
+            self.add_link(link)
+            return 'link'
+        elif obj_type == PW_TYPE_CORE and obj_id == 0 and props is not None:
+            self.core_props = props
+
+        return None
+
+    def copy(self) -> 'PwGraph':
+        # nodes, ports and links are replaced and never changed in place, only the indexes are copied
+        graph = PwGraph()
+        graph.core_props = self.core_props
+        graph.nodes_by_id = dict(self.nodes_by_id)
+        graph.nodes_by_name = dict(self.nodes_by_name)
+        graph.ports_by_id = dict(self.ports_by_id)
+        graph.ports_by_node = {k: dict(v) for k, v in self.ports_by_node.items()}
+        graph.links_by_id = dict(self.links_by_id)
+        graph.links_by_output_port = {k: dict(v) for k, v in self.links_by_output_port.items()}
+        graph.links_by_input_port = {k: dict(v) for k, v in self.links_by_input_port.items()}
+        return graph
+
+    def remove_object(self, obj_id: int) -> Optional[str]:
+        if obj_id in self.nodes_by_id:
+            self.remove_node(self.nodes_by_id[obj_id])
+            return 'node'
+        elif obj_id in self.ports_by_id:
+            self.remove_port(self.ports_by_id[obj_id])
+            return 'port'
+        elif obj_id in self.links_by_id:
+            self.remove_link(self.links_by_id[obj_id])
+            return 'link'
+
+        return None
+
+    def has_object(self, obj_id: int) -> bool:
+        return (obj_id in self.nodes_by_id) or (obj_id in self.ports_by_id) or (obj_id in self.links_by_id)
+
+    def add_node(self, node: PwNode):
+        self.nodes_by_id[node.id] = node
+        self.nodes_by_name[node.name] = node
+
+    def add_port(self, port: PwPort):
+        self.ports_by_id[port.id] = port
+        self.ports_by_node.setdefault(port.node_id, {})[port.id] = port
+
+    def add_link(self, link: PwGraphLink):
+        self.links_by_id[link.id] = link
+        self.links_by_output_port.setdefault(link.output_port_id, {})[link.id] = link
+        self.links_by_input_port.setdefault(link.input_port_id, {})[link.id] = link
+
+    def remove_node(self, node: PwNode):
+        self.nodes_by_id.pop(node.id, None)
+        if self.nodes_by_name.get(node.name) is node:
+            del self.nodes_by_name[node.name]
+
+    def remove_port(self, port: PwPort):
+        self.ports_by_id.pop(port.id, None)
+        node_ports = self.ports_by_node.get(port.node_id)
+        if node_ports is not None:
+            node_ports.pop(port.id, None)
+            if not node_ports:
+                del self.ports_by_node[port.node_id]
+
+    def remove_link(self, link: PwGraphLink):
+        self.links_by_id.pop(link.id, None)
+        for index, port_id in ((self.links_by_output_port, link.output_port_id), (self.links_by_input_port, link.input_port_id)):
+            port_links = index.get(port_id)
+            if port_links is not None:
+                port_links.pop(link.id, None)
+                if not port_links:
+                    del index[port_id]
+
+    def node_by_name(self, name: str) -> Optional[PwNode]:
+        return self.nodes_by_name.get(name)
+
+    def node_by_id(self, node_id: int) -> Optional[PwNode]:
+        return self.nodes_by_id.get(node_id)
+
+    def port_by_id(self, port_id: int) -> Optional[PwPort]:
+        return self.ports_by_id.get(port_id)
+
+    def node_of_port(self, port_id: int) -> Optional[PwNode]:
+        port = self.ports_by_id.get(port_id)
+        return self.nodes_by_id.get(port.node_id) if port else None
+
+    def ports_of_node(self, node_id: int) -> list[PwPort]:
+        return list(self.ports_by_node.get(node_id, {}).values())
+
+    def links_from_port(self, port_id: int) -> list[PwGraphLink]:
+        return list(self.links_by_output_port.get(port_id, {}).values())
+
+    def links_to_port(self, port_id: int) -> list[PwGraphLink]:
+        return list(self.links_by_input_port.get(port_id, {}).values())
+
+    def nodes_with_prefix(self, prefix: str) -> list[PwNode]:
+        return [n for name, n in self.nodes_by_name.items() if name.startswith(prefix)]
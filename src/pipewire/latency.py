@@ -0,0 +1,144 @@
+from typing import Optional
+from .graph import PwGraph, PwNode
+from .pipewire import LOW_LATENCY_NODE_NAME
+
+# Used when the core doesn't report its clock settings
+DEFAULT_CLOCK_RATE = 48000
+DEFAULT_CLOCK_QUANTUM = 1024
+# Delay of a resampling stage in samples, about half the filter of the default resampler quality
+RESAMPLE_DELAY_SAMPLES = 32
+
+
+class PwLatencyEstimate():
+    """The estimated mic-to-speaker latency of a connection, split by hop, in seconds"""
+
+    __slots__ = ('quantum', 'rate', 'hops')
+
+    def __init__(self, quantum: int, rate: int, hops: list[tuple[str, float]]):
+        self.quantum = quantum
+        self.rate = rate
+        self.hops = hops
+
+    def total(self) -> float:
+        return sum(seconds for _, seconds in self.hops)
+
+    def __repr__(self):
+        return f'PwLatencyEstimate({self.total() * 1000:.1f}ms, quantum={self.quantum}/{self.rate}, hops={self.hops})'
+
+
+def _int_prop(props: dict, key: str) -> int:
+    try:
+        return int(str(props.get(key, 0)).strip() or 0)
+    except ValueError:
+        return 0
+
+
+def _latency_request(node: PwNode, rate: int) -> Optional[int]:
+    # node.latency is "quantum/rate", returns the quantum at the graph rate
+    num, _, denom = str(node.props.get('node.latency', '')).partition('/')
+
+    if not num.isdigit() or int(num) == 0:
+        return None
+
+    node_rate = int(denom) if denom.isdigit() and int(denom) else rate
+    return round(int(num) * rate / node_rate)
+
+
+def _low_latency_nodes_of(graph: PwGraph, output: PwNode) -> list[PwNode]:
+    nodes = []
+
+    for port in graph.ports_of_node(output.id):
+        for link in graph.links_from_port(port.id):
+            node = graph.node_by_id(link.input_node_id)
+            if node and node.name.startswith(LOW_LATENCY_NODE_NAME) and node not in nodes:
+                nodes.append(node)
+
+    return nodes
+
+
+def _device_hop(node: PwNode, quantum: int, rate: int) -> float:
+    # a device buffers a cycle plus its headroom, without timer scheduling it works with whole periods
+    buffered = quantum
+    if str(node.props.get('api.alsa.disable-tsched', '')).lower() in ('true', '1'):
+        buffered = max(quantum, _int_prop(node.props, 'api.alsa.period-size'))
+
+    return (buffered + _int_prop(node.props, 'api.alsa.headroom')) / rate
+
+
+def _rate_prop(props: dict, key: str) -> int:
+    # node.rate is the length of a sample, eg. "1/48000"; audio.rate is a plain number
+    num, _, denom = str(props.get(key, '')).strip().partition('/')
+
+    if not denom:
+        return int(num) if num.isdigit() else 0
+
+    if not (num.isdigit() and denom.isdigit()) or int(num) == 0:
+        return 0
+
+    return round(int(denom) / int(num))
+
+
+def _needs_resampling(node: PwNode, rate: int) -> bool:
+    device_rate = _rate_prop(node.props, 'audio.rate') or _rate_prop(node.props, 'node.rate')
+    return bool(device_rate) and device_rate != rate
+
+
+def estimate_latency(graph: PwGraph, output_name: str, input_name: str,
+        low_latency_quantum: Optional[int]=None, include_low_latency_nodes=True) -> Optional[PwLatencyEstimate]:
+    """
+    Estimates how long the audio takes from a mic (`output_name`) to a speaker (`input_name`).
+
+    The graph quantum is the smallest `node.latency` requested by the mic, the speaker and the low-latency
+    nodes linked to the mic, within the min and max quantum of the core; `node.force-quantum` and
+    `node.force-rate` win over it. Each device buffers a quantum (or its ALSA period without timer scheduling) plus its headroom,
+    and a device that runs at a different rate adds a resampling stage.
+
+    `low_latency_quantum` estimates the connection with a low-latency node of that quantum,
+    `include_low_latency_nodes=False` estimates it without the nodes it has now.
+    Returns None when a device is not in the graph
+    """
+    output = graph.node_by_name(output_name)
+    input = graph.node_by_name(input_name)
+
+    if output is None or input is None:
+        return None
+
+    core = graph.core_props
+    nodes = [output, input]
+
+    if include_low_latency_nodes:
+        nodes.extend(_low_latency_nodes_of(graph, output))
+
+    forced_rate = max(_int_prop(n.props, 'node.force-rate') for n in nodes)
+    rate = forced_rate or _int_prop(core, 'default.clock.rate') or DEFAULT_CLOCK_RATE
+
+    forced_quantum = max(_int_prop(n.props, 'node.force-quantum') for n in nodes)
+    requests = [q for q in (_latency_request(n, rate) for n in nodes) if q]
+
+    if low_latency_quantum:
+        requests.append(low_latency_quantum)
+
+    if forced_quantum:
+        quantum = forced_quantum
+    elif requests:
+        quantum = min(requests)
+        min_quantum = _int_prop(core, 'default.clock.min-quantum')
+        max_quantum = _int_prop(core, 'default.clock.max-quantum')
+
+        quantum = max(quantum, min_quantum) if min_quantum > 0 else quantum
+        quantum = min(quantum, max_quantum) if max_quantum > 0 else quantum
+    else:
+        quantum = _int_prop(core, 'default.clock.quantum') or DEFAULT_CLOCK_QUANTUM
+
+    hops = [('capture', _device_hop(output, quantum, rate))]
+
+    if _needs_resampling(output, rate):
+        hops.append(('capture resampling', RESAMPLE_DELAY_SAMPLES / rate))
+
+    if _needs_resampling(input, rate):
+        hops.append(('playback resampling', RESAMPLE_DELAY_SAMPLES / rate))
+
+    hops.append(('playback', _device_hop(input, quantum, rate)))
+
+    return PwLatencyEstimate(quantum, rate, hops)
+
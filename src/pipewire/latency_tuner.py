@@ -0,0 +1,253 @@
+import os
+import json
+import logging
+import threading
+from time import monotonic
+from typing import Optional
+from .pipewire import Pipewire, PwLowLatencyNode
+from .top import PwTopMonitor, PwTopFrame, PwTopRow, pw_top
+from ..utils import tracing
+
+# A graph that uses more than this part of its cycle is about to drop samples
+QUANTUM_HIGH_LOAD = 0.8
+# ...and it can try a smaller buffer only while it uses less than this
+QUANTUM_LOW_LOAD = 0.5
+# seconds without errors before trying a smaller buffer
+QUANTUM_STABLE_PERIOD = 30
+# every step up doubles the stable period, up to this many times QUANTUM_STABLE_PERIOD
+QUANTUM_MAX_BACKOFF = 16
+
+
+class PwQuantumController():
+    """
+    Picks the buffer size (quantum) of a low-latency node from the errors and the load of its graph.
+
+    The quantum doubles as soon as there are new errors or the load goes over QUANTUM_HIGH_LOAD.
+    It halves once the graph has run without errors and under QUANTUM_LOW_LOAD for the stable period;
+    every step up doubles that period, so a buffer size that caused pops is retried less and less often
+    """
+
+    def __init__(self, quantum: int, min_quantum: int, max_quantum: int, stable_period: float=QUANTUM_STABLE_PERIOD):
+        self.quantum = quantum
+        self.min_quantum = min_quantum
+        self.max_quantum = max(max_quantum, min_quantum)
+        self.stable_period = stable_period
+        self.hold = stable_period
+        self.stable_since: Optional[float] = None
+
+    def reset(self, quantum: int, now: float):
+        # the node was replaced
+        self.quantum = quantum
+        self.stable_since = now
+
+    def update(self, new_errors: int, load: float, now: float) -> Optional[int]:
+        """
+        `new_errors` is how many errors the graph had since the last update, `load` the part of the cycle it used.
+        Returns the new quantum when it has to change
+        """
+        if new_errors or load > QUANTUM_HIGH_LOAD:
+            self.stable_since = now
+
+            if self.quantum >= self.max_quantum:
+                return None
+
+            self.hold = min(self.hold * 2, self.stable_period * QUANTUM_MAX_BACKOFF)
+            self.quantum = min(self.quantum * 2, self.max_quantum)
+            return self.quantum
+
+        if self.stable_since is None or load > QUANTUM_LOW_LOAD:
+            self.stable_since = now
+            return None
+
+        if (now - self.stable_since >= self.hold) and (self.quantum > self.min_quantum):
+            self.stable_since = now
+            self.quantum = max(self.quantum // 2, self.min_quantum)
+            return self.quantum
+
+        return None
+
+
+class PwTunedNode():
+    __slots__ = ('output_name', 'node', 'controller', 'error_counts', 'retuning')
+
+    def __init__(self, output_name: str, node: PwLowLatencyNode):
+        self.output_name = output_name
+        self.node = node
+        self.controller: Optional[PwQuantumController] = None
+        # {node id: last error counter} of the nodes of the group, to count only the errors they get from now on
+        self.error_counts: dict[int, int] = {}
+        self.retuning = False
+
+    def new_errors(self, rows: list[PwTopRow]) -> int:
+        # a node that just joined the group brings its old errors along, they are not counted
+        new_errors = 0
+        counts = {}
+
+        for row in rows:
+            last = self.error_counts.get(row.id)
+            # a counter that went back belongs to a node that was replaced
+            if (last is not None) and row.errors > last:
+                new_errors += row.errors - last
+
+            counts[row.id] = row.errors
+
+        self.error_counts = counts
+        return new_errors
+
+
+class PwLatencyTuner():
+    """
+    Runs a PwQuantumController for every low-latency node, fed by pw-top.
+
+    A node gets a new buffer size by being replaced: the new node is created and linked
+    before the old one is destroyed. The quantum that worked for a mic is saved
+    to `state_path` and used the next time low-latency mode is enabled for it
+    """
+
+    def __init__(self, top: PwTopMonitor, state_path: Optional[str]=None):
+        self.top = top
+        self.state_path = state_path
+        self.lock = threading.RLock()
+        self.nodes: dict[str, PwTunedNode] = {}
+        self.quantums: dict[str, int] = {}
+
+    def load(self, state_path: str):
+        self.state_path = state_path
+
+        try:
+            with open(state_path) as f:
+                self.quantums = {k: int(v) for k, v in json.load(f).items()}
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f'Could not read the low-latency settings: {e}')
+
+    def _save(self):
+        if not self.state_path:
+            return
+
+        try:
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+            with open(self.state_path, 'w') as f:
+                json.dump(self.quantums, f)
+        except OSError as e:
+            logging.warning(f'Could not save the low-latency settings: {e}')
+
+    def quantum_for(self, output_name: str) -> Optional[int]:
+        # the last buffer size that worked for this mic
+        return self.quantums.get(output_name)
+
+    def node_for(self, output_name: str) -> Optional[PwLowLatencyNode]:
+        tuned = self.nodes.get(output_name)
+        return tuned.node if tuned else None
+
+    def track(self, output_name: str, node: PwLowLatencyNode):
+        with self.lock:
+            tuned = self.nodes.get(output_name)
+
+            if tuned:
+                tuned.node = node
+            else:
+                self.nodes[output_name] = PwTunedNode(output_name, node)
+
+            first = len(self.nodes) == 1
+
+        if first:
+            self.top.subscribe(self.on_frame)
+
+    def untrack(self, output_name: str) -> Optional[PwLowLatencyNode]:
+        # returns the node that is linked to the mic now: it may have been replaced since it was tracked
+        with self.lock:
+            tuned = self.nodes.pop(output_name, None)
+            last = not self.nodes
+
+        if last:
+            self.top.unsubscribe(self.on_frame)
+
+        return tuned.node if tuned else None
+
+    def stop(self):
+        with self.lock:
+            self.nodes = {}
+
+        self.top.unsubscribe(self.on_frame)
+
+    def on_frame(self, frame: PwTopFrame):
+        # called from the pw-top thread
+        now = monotonic()
+
+        with self.lock:
+            nodes = list(self.nodes.values())
+
+        for tuned in nodes:
+            row = frame.row(tuned.node.node_id)
+            if row is None or tuned.retuning:
+                continue
+
+            if tuned.controller is None:
+                clock_info = Pipewire.get_clock_info()
+                tuned.controller = PwQuantumController(
+                    quantum=row.quantum,
+                    min_quantum=Pipewire.low_latency_min_quantum(clock_info),
+                    max_quantum=clock_info['default.clock.quantum']
+                )
+
+            group = frame.group_of(row.id)
+            load = max(r.load() for r in group)
+            quantum = tuned.controller.update(tuned.new_errors(group), load, now)
+
+            if quantum is not None:
+                # creating and linking the node takes a while, pw-top keeps being read meanwhile
+                tuned.retuning = True
+                threading.Thread(target=self._retune, args=(tuned, quantum), daemon=True).start()
+
+    def _retune(self, tuned: PwTunedNode, quantum: int):
+        try:
+            self.retune(tuned, quantum, monotonic())
+        finally:
+            tuned.retuning = False
+
+    @tracing.traced('retune low latency node')
+    def retune(self, tuned: PwTunedNode, quantum: int, now: float):
+        logging.info(f'Setting the buffer size of {tuned.output_name} to {quantum}')
+        old_node = tuned.node
+        node = None
+
+        try:
+            node = Pipewire.create_low_latency_node(quantum=quantum)
+            Pipewire.link_devices(tuned.output_name, node.name)
+        except Exception as e:
+            logging.error(f'Could not change the buffer size of {tuned.output_name}: {e}')
+            # start over from the buffer size pw-top reports
+            tuned.controller = None
+            if node:
+                self._destroy(node)
+
+            return
+
+        with self.lock:
+            # the old node is ours to destroy only if it is still tracked: otherwise whoever untracked
+            # or replaced it in the meantime destroys it
+            owned = (self.nodes.get(tuned.output_name) is tuned) and (tuned.node == old_node)
+
+            if owned:
+                tuned.node = node
+                tuned.controller.reset(quantum, now)
+                self.quantums[tuned.output_name] = quantum
+                self._save()
+
+        if owned:
+            self._destroy(old_node)
+        else:
+            # low-latency mode was disabled in the meantime
+            self._destroy(node)
+
+    def _destroy(self, node: PwLowLatencyNode):
+        try:
+            Pipewire.destroy_node(node)
+        except Exception as e:
+            logging.error(f'Could not destroy {node.name}: {e}')
+
+
+# Shared by the window and the connection boxes
+latency_tuner = PwLatencyTuner(pw_top)
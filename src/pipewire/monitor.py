@@ -0,0 +1,233 @@
+import json
+import logging
+import threading
+from time import sleep, monotonic
+from typing import Any, Callable, Iterable, Optional
+from .graph import PwGraph, PW_TYPE_CORE
+from .pipewire import Pipewire
+from .dump_reader import prune_object
+from ..utils import tracing
+
+MONITOR_RESTART_DELAY = 1
+
+
+class PwGraphChange():
+    def __init__(self, kind: str, action: str, obj_id: int):
+        # kind: 'node', 'port' or 'link'
+        # action: 'added', 'changed' or 'removed'
+        self.kind = kind
+        self.action = action
+        self.obj_id = obj_id
+
+    def __repr__(self):
+        return f'PwGraphChange({self.kind}, {self.action}, {self.obj_id})'
+
+
+class PwDumpStreamParser():
+    """
+    Splits the output of `pw-dump --monitor` into JSON documents.
+
+    pw-dump prints every update as a pretty-printed array whose closing bracket
+    is the only character of its line, so we decode only when we see it
+    """
+
+    def __init__(self):
+        self._lines: list[str] = []
+
+    def feed_line(self, line: str) -> Optional[list]:
+        self._lines.append(line)
+
+        if line.rstrip() not in (']', '[]'):
+            return None
+
+        text = ''.join(self._lines)
+        self._lines = []
+
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError as e:
+            logging.error(f'Invalid pw-dump document: {e}')
+            return None
+
+
+class PwGraphMonitor():
+    """
+    Keeps a PwGraph up to date by consuming a long-lived `pw-dump --monitor` process
+    and publishes the changes to the subscribers.
+
+    `stream_factory` returns the lines to consume; it defaults to the monitor
+    of the current Pipewire backend and can be replaced with a scripted stream
+    """
+
+    def __init__(self, stream_factory: Optional[Callable[[], Iterable[str]]]=None):
+        self.graph = PwGraph()
+        self.lock = threading.RLock()
+        # notified under the lock after every update of the graph
+        self.updated = threading.Condition(self.lock)
+        self.synced = False
+        # bumped on every change of the graph, see copy_graph()
+        self.version = 0
+        self._copy: Optional[PwGraph] = None
+        self._copy_version = -1
+        self.stream_factory = stream_factory or self._spawn_backend_monitor
+        self.subscribers: list[Callable[[list[PwGraphChange]], None]] = []
+        self.process = None
+        self.running = False
+        self.thread: Optional[threading.Thread] = None
+        self._parser = PwDumpStreamParser()
+
+    def subscribe(self, callback: Callable[[list[PwGraphChange]], None]):
+        self.subscribers.append(callback)
+
+    def is_running(self) -> bool:
+        return self.running and (self.thread is not None) and self.thread.is_alive()
+
+    def is_synced(self) -> bool:
+        # True once the graph holds the whole Pipewire graph
+        return self.synced and self.is_running()
+
+    def read(self, func: Callable[[PwGraph], Any]) -> Any:
+        # calls func with the graph while the monitor can't update it
+        with self.lock:
+            return func(self.graph)
+
+    def copy_graph(self) -> PwGraph:
+        # a copy of the graph that the monitor won't change, shared until the next change
+        with self.lock:
+            if self._copy_version != self.version:
+                self._copy = self.graph.copy()
+                self._copy_version = self.version
+
+            return self._copy
+
+    def wait_for(self, func: Callable[[PwGraph], Any], timeout: float) -> Any:
+        """
+        Calls func with the graph now and after every update until it returns something other than None.
+        Returns None after `timeout` seconds or when the monitor stops
+        """
+        deadline = monotonic() + timeout
+
+        with self.updated:
+            while True:
+                result = func(self.graph)
+                remaining = deadline - monotonic()
+
+                if (result is not None) or (remaining <= 0) or not self.running:
+                    return result
+
+                self.updated.wait(remaining)
+
+    def start(self):
+        if self.is_running():
+            return
+
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        Pipewire.graph_monitor = self
+
+    def stop(self):
+        self.running = False
+
+        if Pipewire.graph_monitor is self:
+            Pipewire.graph_monitor = None
+
+        with self.updated:
+            self.updated.notify_all()
+
+        if self.process:
+            self.process.terminate()
+            self.process = None
+
+    def feed_line(self, line: str) -> list[PwGraphChange]:
+        document = self._parser.feed_line(line)
+
+        if document is None:
+            return []
+
+        return self.apply(document)
+
+    def feed(self, text: str) -> list[PwGraphChange]:
+        changes = []
+        for line in text.splitlines(keepends=True):
+            changes.extend(self.feed_line(line))
+
+        return changes
+
+    @tracing.traced('monitor.apply')
+    def apply(self, document: list) -> list[PwGraphChange]:
+        changes = []
+
+        with self.lock:
+            for obj in document:
+                obj = prune_object(obj) if 'id' in obj else None
+                if obj is None:
+                    continue
+
+                if obj.get('type') == PW_TYPE_CORE:
+                    Pipewire.clock_info = None
+
+                core_props = self.graph.core_props
+                existed = self.graph.has_object(obj['id'])
+                kind = self.graph.add_object(obj)
+
+                if self.graph.core_props != core_props:
+                    # the clock settings are not reported as a change, but copies must see them
+                    self.version += 1
+
+                if not kind:
+                    continue
+
+                if not self.graph.has_object(obj['id']):
+                    action = 'removed'
+                else:
+                    action = 'changed' if existed else 'added'
+
+                changes.append(PwGraphChange(kind, action, obj['id']))
+
+            if changes:
+                self.version += 1
+
+            self.synced = True
+            self.updated.notify_all()
+
+        if changes:
+            for callback in self.subscribers:
+                callback(changes)
+
+        return changes
+
+    def _spawn_backend_monitor(self) -> Iterable[str]:
+        tracing.instant('monitor started', cat='subprocess')
+        self.process = Pipewire.backend.monitor()
+        return self.process.stdout
+
+    def _run(self):
+        while self.running:
+            try:
+                for line in self.stream_factory():
+                    if not self.running:
+                        break
+
+                    self.feed_line(line)
+            except FileNotFoundError as e:
+                logging.error(f'pw-dump is not available, graph monitoring disabled: {e}')
+                break
+            except Exception as e:
+                logging.error(f'pw-dump monitor failed: {e}')
+
+            if not self.running:
+                break
+
+            # pw-dump exited (eg. the daemon restarted): start over from a clean graph
+            logging.warning('pw-dump monitor stopped, restarting...')
+            with self.lock:
+                self.graph = PwGraph()
+                self.version += 1
+                self._parser = PwDumpStreamParser()
+                self.synced = False
+                Pipewire.clock_info = None
+
+            sleep(MONITOR_RESTART_DELAY)
+
+        self.running = False
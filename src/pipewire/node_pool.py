@@ -0,0 +1,147 @@
+import logging
+import threading
+from time import monotonic
+from typing import Optional
+from .pipewire import Pipewire, PwLowLatencyNode
+
+# seconds after the last take() of a quantum before its idle nodes are destroyed
+POOL_IDLE_TIMEOUT = 300
+
+
+class PwLowLatencyNodePool():
+    """
+    Keeps up to `size` idle low-latency nodes, so that enabling low-latency mode only has to link one.
+    Nodes that are not linked to anything don't change the quantum of the graph.
+
+    Idle nodes are kept by quantum: a background thread refills the pool after every take(), for every quantum
+    taken in the last `idle_timeout` seconds, and destroys the nodes of the quanta nobody asked for since.
+    close() destroys every idle node
+    """
+
+    def __init__(self, size: int=0, idle_timeout: float=POOL_IDLE_TIMEOUT):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        # {quantum: [idle node]}, None is the smallest allowed quantum
+        self.nodes: dict[Optional[int], list[PwLowLatencyNode]] = {}
+        # {quantum: when it was taken last}
+        self.last_used: dict[Optional[int], float] = {None: monotonic()}
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread: Optional[threading.Thread] = None
+
+    def set_size(self, size: int):
+        with self.condition:
+            self.size = max(size, 0)
+            now = monotonic()
+
+            for quantum in (list(self.last_used) or [None]):
+                self.last_used[quantum] = now
+
+            self.condition.notify()
+
+        if self.size and not self.running:
+            self.running = True
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def take(self, quantum: Optional[int]=None) -> Optional[PwLowLatencyNode]:
+        # returns an idle node created with that quantum, or None if there is none ready
+        with self.condition:
+            self.last_used[quantum] = monotonic()
+            self.condition.notify()
+
+            nodes = self.nodes.get(quantum)
+            if not nodes:
+                return None
+
+            node = nodes.pop(0)
+            if not nodes:
+                del self.nodes[quantum]
+
+        logging.debug(f'Took {node.name} from the pool')
+        return node
+
+    def close(self) -> list[str]:
+        # destroys the idle nodes, returns their names
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=5)
+
+        with self.condition:
+            nodes = [node for quantum_nodes in self.nodes.values() for node in quantum_nodes]
+            self.nodes = {}
+
+        for node in nodes:
+            self._destroy(node)
+
+        return [node.name for node in nodes]
+
+    def _next_change(self) -> tuple[list[PwLowLatencyNode], bool, Optional[int]]:
+        """
+        Waits until there is something to do.
+        Returns the nodes to destroy, if a node has to be created and its quantum
+        """
+        with self.condition:
+            while self.running:
+                now = monotonic()
+                warm = [q for q, used in self.last_used.items() if now - used < self.idle_timeout]
+                to_destroy = []
+
+                for quantum in list(self.nodes):
+                    keep = self.size if quantum in warm else 0
+                    to_destroy.extend(self.nodes[quantum][keep:])
+                    del self.nodes[quantum][keep:]
+
+                    if not self.nodes[quantum]:
+                        del self.nodes[quantum]
+
+                for quantum in list(self.last_used):
+                    if quantum not in warm:
+                        del self.last_used[quantum]
+
+                if to_destroy:
+                    return to_destroy, False, None
+
+                for quantum in warm:
+                    if len(self.nodes.get(quantum, ())) < self.size:
+                        return [], True, quantum
+
+                timeout = min(self.last_used[q] + self.idle_timeout for q in warm) - now if warm else None
+                self.condition.wait(timeout)
+
+        return [], False, None
+
+    def _run(self):
+        while self.running:
+            to_destroy, create, quantum = self._next_change()
+
+            for node in to_destroy:
+                self._destroy(node)
+
+            if create:
+                try:
+                    node = Pipewire.create_low_latency_node(quantum=quantum)
+                except Exception as e:
+                    logging.error(f'Could not create a low-latency node for the pool, disabling it: {e}')
+                    with self.condition:
+                        self.size = 0
+                        self.running = False
+
+                    break
+
+                # if the pool is being closed, close() destroys it after this thread is done
+                with self.condition:
+                    self.nodes.setdefault(quantum, []).append(node)
+
+    def _destroy(self, node: PwLowLatencyNode):
+        try:
+            Pipewire.destroy_node(node)
+        except Exception as e:
+            logging.error(f'Could not destroy {node.name}: {e}')
+
+
+# Shared by the window and the connection boxes
+low_latency_pool = PwLowLatencyNodePool()
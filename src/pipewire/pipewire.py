@@ -1,205 +1,324 @@
-import json
-import re
-import signal
-import subprocess
-import re
-import threading
+import sys
 import logging
-from time import sleep, time_ns, time
-from ..utils.async_utils import debounce
-from typing import Optional, Callable, List, Union
-from pprint import pprint
+from .graph import PwGraph, PwNode, PW_TYPE_CORE, PW_TYPE_NODE
+from . import pwlink_parser, dump_reader
+from ..utils import tracing
+from .backend import PwBackend, PwCliBackend, PwOperation, PwOperationResult  # noqa: F401
+from typing import Optional, Callable, Iterable, List, Union
 
 LOW_LATENCY_NODE_NAME = 'whisper-low-latency-node'
 LOW_LATENCY_STARTING_BUFF_SIZE = 64
+# seconds to wait for the graph monitor to report a node that was just created
+LOW_LATENCY_NODE_TIMEOUT = 2
 
 class PwLink():
+    """
+    A device (node) and the ports Whisper can link.
+    `channels` maps port id -> channel, eg. {70: 'capture_FL', 71: 'capture_FR'}
+    """
+    __slots__ = ('resource_name', 'alsa', 'name', 'channels', 'description')
+
     def __init__(self, resource_name: str):
-        self.resource_name = resource_name
+        self.resource_name: str = sys.intern(resource_name)
         self.alsa: str = ''
         self.name: str = ''
-        self.channels: dict = {}
+        self.channels: dict[int, str] = {}
         self.description: str = ''
 
+    def __eq__(self, other):
+        if not isinstance(other, PwLink):
+            return NotImplemented
+
+        return self.resource_name == other.resource_name and self.channels == other.channels \
+            and (self.alsa, self.name, self.description) == (other.alsa, other.name, other.description)
+
+    def __hash__(self):
+        # node names are unique in the graph, the rest may change while the device is being read
+        return hash(self.resource_name)
+
+    def __repr__(self):
+        return f'PwLink({self.resource_name}, {self.channels})'
+
 
 class PwActiveConnectionLink():
-    def __init__(self, tag, channel, _id):
-        self.connected_tag: str = tag
-        self.channel: str = channel
-        self._id: str = _id
+    # The input port a link goes to
+    __slots__ = ('connected_tag', 'channel', '_id')
+
+    def __init__(self, tag: str, channel: str, _id: int):
+        self.connected_tag: str = sys.intern(tag)
+        self.channel: str = sys.intern(channel)
+        self._id: int = int(_id)
+
+    def _key(self) -> tuple:
+        return (self._id, self.connected_tag, self.channel)
+
+    def __eq__(self, other):
+        return self._key() == other._key() if isinstance(other, PwActiveConnectionLink) else NotImplemented
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return f'PwActiveConnectionLink({self.connected_tag}:{self.channel}, {self._id})'
+
 
 class PwLowLatencyNode():
-    def __init__(self, node_id, name):
-        self.node_id = node_id
-        self.name = name
+    __slots__ = ('node_id', 'name')
 
+    def __init__(self, node_id: int, name: str):
+        self.node_id: int = int(node_id)
+        self.name: str = sys.intern(name)
 
-class Pipewire():
-    top_output: Optional[subprocess.Popen] = None
+    def __eq__(self, other):
+        return (self.node_id, self.name) == (other.node_id, other.name) if isinstance(other, PwLowLatencyNode) else NotImplemented
 
-    @staticmethod
-    def _run(command: List[str], quiet=False) -> str:
-        to_check = command if isinstance(command, str) else ' '.join(command)
+    def __hash__(self):
+        return hash((self.node_id, self.name))
 
-        try:
-            if not quiet:
-                logging.info(f'Running {command}')
+    def __repr__(self):
+        return f'PwLowLatencyNode({self.node_id}, {self.name})'
 
-            output = subprocess.run([*command], encoding='utf-8', shell=False, check=True, capture_output=True)
-            output.check_returncode()
-        except subprocess.CalledProcessError as e:
-            print(e.stderr)
-            raise e
 
-        return re.sub(r'\n$', '', output.stdout)
+class Pipewire():
+    change_listeners: List[Callable[[], None]] = []
+    backend: PwBackend = PwCliBackend()
+    # the running PwGraphMonitor, set by PwGraphMonitor.start()
+    graph_monitor = None
+    clock_info: Optional[dict] = None
+    # names of the nodes created by Whisper that the graph may not show yet
+    reserved_node_names: set[str] = set()
 
     @staticmethod
-    def _parse_pwlink_return(output: str) -> dict[str, PwLink]:
-        elements = {}
-        resource_tag = None
-        line_id = None
-        group_line_at = 0
+    def add_change_listener(callback: Callable[[], None]):
+        Pipewire.change_listeners.append(callback)
 
-        regex = re.compile(r'^(\s+\d+\s+)')
-        for line in output.split('\n'):
-            if not line.strip():
-                break
+    @staticmethod
+    def _notify_change():
+        for callback in Pipewire.change_listeners:
+            callback()
 
-            m = regex.match(line)
-            if m:
-                line_id = m.group().strip()
-                resource_tag = (re.sub(f'^{m.group()}', '', line)).split(':', maxsplit=1)[0]
+    @staticmethod
+    def set_backend(backend: PwBackend):
+        Pipewire.backend = backend
+        Pipewire.clock_info = None
+        Pipewire._notify_change()
 
-                if not resource_tag in elements:
-                    elements[resource_tag] = PwLink(resource_tag)
+    @staticmethod
+    def _parse_pwlink_return(output: Union[str, Iterable[str]]) -> dict[str, PwLink]:
+        lines = output.splitlines() if isinstance(output, str) else output
+        elements: dict[str, PwLink] = {}
 
-                group_line_at = 0
-                continue
+        for port_id, node_name, port_name, path, alias in pwlink_parser.iter_ports(lines):
+            element = elements.get(node_name)
+            if element is None:
+                element = elements[node_name] = PwLink(node_name)
 
-            group_line_at += 1
-            line = line.strip()
+            element.alsa = path
+            name, _, ch = alias.rpartition(':')
 
-            if group_line_at == 1:
-                elements[resource_tag].alsa = line
-            else:
-                line_data = line.split(':', maxsplit=1) 
+            if not name or not ch:
+                # a port without an alias can't be linked, but the rest of the device can
+                logging.debug(f'Skipping port {port_id} of {node_name}: no alias')
+                continue
 
-                if len(line_data) < 2:
-                    del elements[resource_tag]
-                    continue
+            element.name = sys.intern(name)
+            element.channels[int(port_id)] = sys.intern(ch)
 
-                name, ch = line_data
+        # nodes listed without any usable port
+        return {k: v for k, v in elements.items() if v.channels}
 
-                if not ch:
-                    del elements[resource_tag]
-                    continue
+    @staticmethod
+    def _parse_pwlink_list_return(output: Union[str, Iterable[str]]) -> dict[int, dict[int, PwActiveConnectionLink]]:
+        lines = output.splitlines() if isinstance(output, str) else output
+        elements: dict[int, dict[int, PwActiveConnectionLink]] = {}
+
+        for port_id, link_id, connected_port_id, node_name, port_name in pwlink_parser.iter_links(lines):
+            port_links = elements.setdefault(int(port_id), {})
 
-                elements[resource_tag].name = name
-                elements[resource_tag].channels[line_id] = ch
+            if link_id is not None:
+                port_links[int(link_id)] = PwActiveConnectionLink(node_name, port_name, int(connected_port_id))
 
         return elements
 
     @staticmethod
-    def _parse_pwlink_list_return(output: str) -> list[str, dict[str, PwActiveConnectionLink]]:
-        elements = {}
-        output_id = None
+    def _get_node_description(graph: PwGraph, node_name: str):
+        node = graph.node_by_name(node_name)
+        return (node.description or '') if node else ''
 
-        regex = re.compile(r'^(\s+\d+\s+)')
-        conn_regex = re.compile(r'.*(\|\-\>\s*)')
-        for line in output.split('\n'):
-            if not line.strip():
-                break
+    @staticmethod
+    def check_installed(quiet=False) -> bool:
+        return Pipewire.backend.is_available()
 
-            m = regex.match(line)
-            if ('|->' not in line) and ('|<-' not in line):
-                output_id = m.group().strip()
-                resource_tag = (re.sub(f'^{m.group()}', '', line)).split(':', maxsplit=1)[0]
+    @staticmethod
+    def _ports_from_graph(graph: PwGraph, direction: str) -> dict[str, PwLink]:
+        # same result as _parse_pwlink_return() on `pw-link --<direction> --verbose --id`
+        elements: dict[str, PwLink] = {}
 
-                if not output_id in elements:
-                    elements[output_id] = {}
+        for port_id in sorted(graph.ports_by_id):
+            port = graph.ports_by_id[port_id]
+            node = graph.node_by_id(port.node_id)
 
+            if port.direction != direction or node is None:
                 continue
 
-            elif ('|->' in line):
-                connection_id = m.group().strip()
-                connected_resource = conn_regex.sub('', line)
+            element = elements.get(node.name)
+            if element is None:
+                element = elements[node.name] = PwLink(node.name)
+                element.description = node.description or ''
 
-                _id, connected_item = connected_resource.split(' ', maxsplit=1)
-                elements[output_id][connection_id] = PwActiveConnectionLink(connected_item.split(':')[0], connected_item.split(':')[1], _id)
+            element.alsa = port.path
+            name, _, ch = port.alias.rpartition(':')
+
+            if not name or not ch:
+                continue
+
+            element.name = sys.intern(name)
+            element.channels[port_id] = sys.intern(ch)
+
+        return {k: v for k, v in elements.items() if v.channels}
 
-        return elements
-    
     @staticmethod
-    def _get_node_description(obj_list: str, node_name: str):
-        for d in obj_list:
-            if d['type'] == 'PipeWire:Interface:Node' and \
-                'info' in d and \
-                'props' in d['info'] and \
-                d['info']['props']['node.name'] == node_name:
-                return d['info']['props'].get('node.description')
-            
-        return ''
+    def _links_from_graph(graph: PwGraph) -> dict[int, dict[int, PwActiveConnectionLink]]:
+        # same result as _parse_pwlink_list_return() on `pw-link --links --id`
+        elements: dict[int, dict[int, PwActiveConnectionLink]] = {}
+
+        for port_id in sorted(graph.ports_by_id):
+            port = graph.ports_by_id[port_id]
+
+            if port.direction == 'output':
+                port_links = graph.links_from_port(port_id)
+                if not port_links:
+                    continue
+
+                elements[port_id] = {}
+                for link in sorted(port_links, key=lambda pw_link: pw_link.id):
+                    input_port = graph.port_by_id(link.input_port_id)
+                    input_node = graph.node_of_port(link.input_port_id)
+
+                    if input_port and input_node:
+                        elements[port_id][link.id] = PwActiveConnectionLink(input_node.name, input_port.name, input_port.id)
+            elif graph.links_to_port(port_id):
+                # input ports are listed by pw-link too, without outgoing links
+                elements[port_id] = {}
+
+        return elements
 
     @staticmethod
-    def check_installed(quiet=False) -> bool:
-        try:
-            Pipewire._run(['which', 'pw-cli']).strip() and Pipewire._run(['which', 'pw-link']).strip() and Pipewire._run(['pw-cli', 'info', '0']).strip()
-        except:
-            return False
+    def list_inputs(quiet=False, graph: Optional[PwGraph]=None) -> dict[str, PwLink]:
+        graph = Pipewire.get_graph(quiet=quiet) if graph is None else graph
+        return Pipewire._ports_from_graph(graph, 'input')
 
-        return True
+    @staticmethod
+    def list_outputs(quiet=False, graph: Optional[PwGraph]=None) -> dict[str, PwLink]:
+        graph = Pipewire.get_graph(quiet=quiet) if graph is None else graph
+        return Pipewire._ports_from_graph(graph, 'output')
 
     @staticmethod
-    def list_inputs(quiet=False) -> dict[str, PwLink]:
-        output: list[str] = Pipewire._run(['pw-link', '--input', '--verbose', '--id'], quiet=quiet)
-        inputs = Pipewire._parse_pwlink_return(output)
-        dump = Pipewire.list_objects()
+    def list_inputs_pwlink(quiet=False) -> dict[str, PwLink]:
+        # pw-link based listing, tests/test_pipewire_listings.py checks that the dump based one matches it
+        inputs = Pipewire._parse_pwlink_return(Pipewire.backend.stream_ports('input', quiet=quiet))
+        graph = Pipewire.get_graph(quiet=quiet)
 
         for k, v in inputs.items():
-            v.description = Pipewire._get_node_description(dump, k)
+            v.description = Pipewire._get_node_description(graph, k)
         return inputs
 
     @staticmethod
-    def list_outputs(quiet=False) -> dict[str, PwLink]:
-        output: list[str] = Pipewire._run(['pw-link', '--output', '--verbose', '--id'], quiet=quiet)
-        items = Pipewire._parse_pwlink_return(output)
-        dump = Pipewire.list_objects()
+    def list_outputs_pwlink(quiet=False) -> dict[str, PwLink]:
+        items = Pipewire._parse_pwlink_return(Pipewire.backend.stream_ports('output', quiet=quiet))
+        graph = Pipewire.get_graph(quiet=quiet)
 
         for k, v in items.items():
-            v.description = Pipewire._get_node_description(dump, k)
+            v.description = Pipewire._get_node_description(graph, k)
         return items
 
+    @staticmethod
+    def plan_device_links(output: PwLink, input: PwLink) -> list[PwOperation]:
+        # the links needed to play a mic (output) on a speaker (input)
+        if (len(output.channels) == 1) and ('_MONO' in next(iter(output.channels.values()))):
+            # handle MONO mics
+            mono_port = next(iter(output.channels))
+            return [PwOperation('link', mono_port, ch_id) for ch_id in input.channels]
+
+        return [PwOperation('link', c, ic) for c in output.channels for ic in input.channels]
+
+    @staticmethod
+    def _plan_links_by_name(graph: PwGraph, output_name: str, input_name: str) -> list[PwOperation]:
+        pw_output = Pipewire._ports_from_graph(graph, 'output')[output_name]
+        pw_input = Pipewire._ports_from_graph(graph, 'input')[input_name]
+
+        return Pipewire.plan_device_links(pw_output, pw_input)
+
+    @staticmethod
+    def link_devices(output_name: str, input_name: str) -> list[PwOperationResult]:
+        # see AsyncPipewire.link_devices()
+        monitor = Pipewire._synced_monitor()
+
+        if monitor:
+            operations = monitor.read(lambda g: Pipewire._plan_links_by_name(g, output_name, input_name))
+        else:
+            operations = Pipewire._plan_links_by_name(Pipewire.get_graph(), output_name, input_name)
+
+        return Pipewire.run_batch(operations)
+
     @staticmethod
     def link(inp: str, out: str):
-        Pipewire._run(['pw-link', '--linger', inp, out])
+        Pipewire.backend.link(inp, out)
+        Pipewire._notify_change()
 
     @staticmethod
     def unlink(link_id):
-        Pipewire._run(['pw-link', '--disconnect', link_id])
+        Pipewire.backend.unlink(link_id)
+        Pipewire._notify_change()
+
+    @staticmethod
+    def run_batch(operations: list[PwOperation]) -> list[PwOperationResult]:
+        if not operations:
+            return []
+
+        results = Pipewire.backend.run_batch(operations)
+        Pipewire._notify_change()
+
+        for r in results:
+            if not r.ok:
+                logging.error(f'{r.operation} failed: {r.error}')
+
+        return results
+
+    @staticmethod
+    def list_links(quiet=False, graph: Optional[PwGraph]=None) -> dict[int, dict[int, PwActiveConnectionLink]]:
+        graph = Pipewire.get_graph(quiet=quiet) if graph is None else graph
+        return Pipewire._links_from_graph(graph)
 
     @staticmethod
-    def list_links(quiet=False) -> list[str, dict[str, PwActiveConnectionLink]]:
-        return Pipewire._parse_pwlink_list_return(Pipewire._run(['pw-link', '--links', '--id'], quiet=quiet))
+    def list_links_pwlink(quiet=False) -> dict[int, dict[int, PwActiveConnectionLink]]:
+        return Pipewire._parse_pwlink_list_return(Pipewire.backend.stream_links(quiet=quiet))
 
     @staticmethod
     def get_info_raw() -> str:
-        return Pipewire._run(['pw-cli', 'info', '0'])
+        return Pipewire.backend.info()
 
     @staticmethod
-    def list_objects():
-        output = {}
+    def list_objects(quiet=False, types: Optional[set[str]]=None) -> list[dict]:
+        # Only the objects (and properties) Whisper reads are kept, see dump_reader
+        output = []
         try:
-            output = json.loads(Pipewire._run(['pw-dump', '--no-colors']))
-        except:
+            output = dump_reader.read_dump(Pipewire.backend.stream_dump(quiet=quiet), types)
+        except Exception:
             pass
 
         return output
 
     @staticmethod
-    def get_default_clock_info():
-        objs = Pipewire.list_objects()
+    @tracing.traced('get_graph')
+    def get_graph(quiet=False, types: Optional[set[str]]=None) -> PwGraph:
+        return PwGraph.from_dump(Pipewire.list_objects(quiet=quiet, types=types))
+
+    @staticmethod
+    def get_default_clock_info(graph: Optional[PwGraph]=None):
+        graph = Pipewire.get_graph() if graph is None else graph
 
-        props_0 = objs[0]['info']['props']
+        props_0 = graph.core_props
 
         return {
             "default.clock.max-quantum": props_0.get("default.clock.max-quantum", -1),
@@ -211,85 +330,133 @@ class Pipewire():
         }
 
     @staticmethod
-    def create_low_latency_node() -> PwLowLatencyNode:
-        objs = Pipewire.list_objects()
+    def _synced_monitor():
+        # the graph monitor, if it's running and has read the whole graph
+        monitor = Pipewire.graph_monitor
+        return monitor if (monitor and monitor.is_synced()) else None
 
-        whisper_node_name = 0
-        whisper_objs_names = []
+    @staticmethod
+    def _cache_clock_info(graph: PwGraph) -> dict:
+        # the clock settings of the daemon don't change while it runs, they are read once
+        if graph.core_props:
+            Pipewire.clock_info = Pipewire.get_default_clock_info(graph)
+            return Pipewire.clock_info
 
+        return Pipewire.get_default_clock_info(graph)
 
-        for obj in objs:
-            if obj['type'] == 'PipeWire:Interface:Node' and \
-                'info' in obj and \
-                'props' in obj['info'] and \
-                'node.name' in obj['info']['props'] and \
-                LOW_LATENCY_NODE_NAME in obj['info']['props']['node.name']:
+    @staticmethod
+    def get_clock_info() -> dict:
+        if Pipewire.clock_info is not None:
+            return Pipewire.clock_info
 
-                _, count = obj['info']['props']['node.name'].split(LOW_LATENCY_NODE_NAME, maxsplit=1)
-                count: str = count.replace('-', '')
-                count = int(count)
+        monitor = Pipewire._synced_monitor()
+        if monitor:
+            return monitor.read(Pipewire._cache_clock_info)
 
-                whisper_objs_names.append(count)
+        return Pipewire._cache_clock_info(Pipewire.get_graph(types={PW_TYPE_CORE}))
 
-        while (whisper_node_name in whisper_objs_names):
-            whisper_node_name += 1
+    @staticmethod
+    def _low_latency_node_names(graph: PwGraph) -> list[str]:
+        return [node.name for node in graph.nodes_with_prefix(LOW_LATENCY_NODE_NAME)]
 
-        clock_rate = Pipewire.get_default_clock_info()
+    @staticmethod
+    def low_latency_min_quantum(clock_info: dict) -> int:
+        # the smallest buffer size a low latency node starts with
         buffer_size = LOW_LATENCY_STARTING_BUFF_SIZE
 
-        if clock_rate['default.clock.min-quantum'] > 0:
-            while buffer_size < clock_rate['default.clock.min-quantum']:
+        if clock_info['default.clock.min-quantum'] > 0:
+            while buffer_size < clock_info['default.clock.min-quantum']:
                 buffer_size = buffer_size * 2
 
-        node_name = f"{LOW_LATENCY_NODE_NAME}-{(whisper_node_name)}"
-        node_conf = f"factory.name=support.null-audio-sink node.name={node_name} media.class=Audio/Sink object.linger=true"
-        node_conf += f" audio.position=[FL FR] node.latency={buffer_size}/{clock_rate['default.clock.rate']}"
+        return buffer_size
 
-        Pipewire._run(['pw-cli', 'create-node', 'adapter', ('{' +  node_conf + '}')])
+    @staticmethod
+    def _low_latency_node_props(node_names: Iterable[str], clock_info: dict, quantum: Optional[int]=None) -> tuple[str, dict]:
+        # returns the name of the next low latency node and the props to create it with
+        whisper_node_name = 0
+        whisper_objs_names = []
 
-        objs = Pipewire.list_objects()
-        node = Pipewire.find_node_by_name(objs, node_name)
-        return PwLowLatencyNode(node_id=node['id'], name=node_name)
+        for name in [*node_names, *Pipewire.reserved_node_names]:
+            _, count = name.split(LOW_LATENCY_NODE_NAME, maxsplit=1)
+            count: str = count.replace('-', '')
 
-    @staticmethod
-    def find_node_by_name(objs: list, name: str) -> dict:
-        for obj in objs:
-            if obj['type'] == 'PipeWire:Interface:Node' and \
-                'info' in obj and \
-                'props' in obj['info'] and \
-                'node.name' in obj['info']['props'] and \
-                name == obj['info']['props']['node.name']:
+            if count.isdigit():
+                whisper_objs_names.append(int(count))
 
-                return obj
-        
-        return None
+        while (whisper_node_name in whisper_objs_names):
+            whisper_node_name += 1
 
-    @staticmethod
-    def destroy_node(node: PwLowLatencyNode):
-        Pipewire._run(['pw-cli', 'destroy', node.name])
+        buffer_size = max(quantum or 0, Pipewire.low_latency_min_quantum(clock_info))
+        node_name = f"{LOW_LATENCY_NODE_NAME}-{(whisper_node_name)}"
+        return node_name, {
+            'factory.name': 'support.null-audio-sink',
+            'node.name': node_name,
+            'media.class': 'Audio/Sink',
+            'object.linger': True,
+            'audio.position': ['FL', 'FR'],
+            'node.latency': f"{buffer_size}/{clock_info['default.clock.rate']}",
+        }
 
-# def threaded_sh(command: Union[str, List[str]], callback: Callable[[str], None]=None, return_stderr=False):
-#     to_check = command if isinstance(command, str) else command[0]
+    @staticmethod
+    def _find_created_node(graph: PwGraph, name: str, input_ports: int) -> Optional[PwNode]:
+        # a new node is usable once all of its input ports are in the graph
+        node = graph.node_by_name(name)
+        if node is None:
+            return None
 
-#     def run_command(command: str, callback: Callable[[str], None]=None):
-#         try:
-#             output = sh(command, return_stderr)
+        ports = [p for p in graph.ports_of_node(node.id) if p.direction == 'input']
+        return node if len(ports) >= input_ports else None
 
-#             if callback:
-#                 callback(re.sub(r'\n$', '', output))
+    @staticmethod
+    @tracing.traced('create_low_latency_node')
+    def create_low_latency_node(quantum: Optional[int]=None) -> PwLowLatencyNode:
+        """
+        With the graph monitor running no pw-dump is needed: the names in use come from its graph
+        and the id of the node from the update that adds it.
+        `quantum` is the buffer size, the smallest allowed one by default
+        """
+        monitor = Pipewire._synced_monitor()
+        clock_info = Pipewire.get_clock_info()
+
+        if monitor:
+            node_names = monitor.read(Pipewire._low_latency_node_names)
+        else:
+            node_names = Pipewire._low_latency_node_names(Pipewire.get_graph(types={PW_TYPE_NODE}))
+
+        node_name, props = Pipewire._low_latency_node_props(node_names, clock_info, quantum)
+        Pipewire.reserved_node_names.add(node_name)
 
-#         except subprocess.CalledProcessError as e:
-#             log(e.stderr)
-#             raise e
+        try:
+            node_id = Pipewire.backend.create_node('adapter', props)
+            Pipewire._notify_change()
 
-#     thread = threading.Thread(target=run_command, daemon=True, args=(command, callback, ))
-#     thread.start()
+            if monitor:
+                node = monitor.wait_for(lambda g: Pipewire._find_created_node(g, node_name, len(props['audio.position'])), LOW_LATENCY_NODE_TIMEOUT)
+                node_id = node.id if node else node_id
 
+            if node_id is None:
+                node_id = Pipewire._created_node_id(Pipewire.get_graph(types={PW_TYPE_NODE}), node_name)
+        finally:
+            # from now on the name is in the graph
+            Pipewire.reserved_node_names.discard(node_name)
 
-        
+        return PwLowLatencyNode(node_id=node_id, name=node_name)
 
+    @staticmethod
+    def _created_node_id(graph: PwGraph, node_name: str) -> int:
+        # the id of a node that was just created, when neither pw-cli nor the monitor reported it
+        node = graph.node_by_name(node_name)
 
+        if node is None:
+            raise TimeoutError(f'{node_name} was created but did not appear in the graph')
 
-        
+        return node.id
 
+    @staticmethod
+    def find_node_by_name(graph: PwGraph, name: str) -> Optional[PwNode]:
+        return graph.node_by_name(name)
 
+    @staticmethod
+    def destroy_node(node: PwLowLatencyNode):
+        Pipewire.backend.destroy(node.name)
+        Pipewire._notify_change()
@@ -0,0 +1,91 @@
+import re
+import logging
+from typing import Iterable, Iterator, Optional
+
+# A port header starts with its id, printed with a width of 4 (`%4d`).
+# Verbose lines (object.path, port.alias) are indented further, so they never match
+PORT_HEADER_REGEX = re.compile(r'^\s{0,4}(\d+)\s+(\S.*)$')
+LINK_REGEX = re.compile(r'^\s*(\d+)\s+\|(->|<-)\s*(\d+)\s+(\S.*)$')
+
+
+def split_port_name(full_name: str) -> tuple[str, str]:
+    # "alsa_input.pci-0000_00_1f.3.analog-stereo:capture_FL",
+    # node names don't contain ':' but port names can ("Midi-Bridge:Midi Through:(capture_0) Midi Through Port-0")
+    node_name, _, port_name = full_name.partition(':')
+    return node_name, port_name
+
+
+def iter_ports(lines: Iterable[str]) -> Iterator[tuple[str, str, str, str, str]]:
+    """
+    Reads the output of `pw-link --input|--output --verbose --id` line by line
+    and yields (port id, node name, port name, object path, port alias) for every port
+    """
+    current: Optional[tuple[str, str, list[str]]] = None
+
+    for line in lines:
+        line = line.rstrip('\n')
+
+        # blank lines don't end the listing
+        if not line.strip():
+            continue
+
+        m = PORT_HEADER_REGEX.match(line)
+        if m:
+            if current:
+                yield _port_entry(current)
+
+            current = (m.group(1), m.group(2), [])
+            continue
+
+        if current is None:
+            logging.debug(f'pw-link: skipping line without a port: {line}')
+            continue
+
+        current[2].append(line.strip())
+
+    if current:
+        yield _port_entry(current)
+
+
+def _port_entry(current: tuple[str, str, list[str]]) -> tuple[str, str, str, str, str]:
+    port_id, full_name, details = current
+    node_name, port_name = split_port_name(full_name)
+
+    path = details[0] if details else ''
+    alias = details[1] if len(details) > 1 else ''
+
+    return port_id, node_name, port_name, path, alias
+
+
+def iter_links(lines: Iterable[str]) -> Iterator[tuple[str, Optional[str], Optional[str], str, str]]:
+    """
+    Reads the output of `pw-link --links --id` line by line.
+
+    Yields (port id, None, None, node name, port name) for every port header,
+    then (output port id, link id, input port id, input node name, input port name) for each of its links.
+    Links listed under input ports (|<-) are the same links seen from the other side and are skipped
+    """
+    output_port_id: Optional[str] = None
+
+    for line in lines:
+        line = line.rstrip('\n')
+
+        if not line.strip():
+            continue
+
+        m = LINK_REGEX.match(line)
+        if m:
+            link_id, arrow, peer_id, peer_name = m.groups()
+
+            if arrow == '->' and output_port_id is not None:
+                yield (output_port_id, link_id, peer_id, *split_port_name(peer_name))
+
+            continue
+
+        m = PORT_HEADER_REGEX.match(line)
+        if m:
+            output_port_id = m.group(1)
+            yield (output_port_id, None, None, *split_port_name(m.group(2)))
+            continue
+
+        logging.debug(f'pw-link: skipping unexpected line: {line}')
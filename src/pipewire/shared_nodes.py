@@ -0,0 +1,153 @@
+import logging
+import threading
+from typing import Optional
+from .pipewire import PwLowLatencyNode, PwOperation
+from .async_pipewire import AsyncPipewire
+from .latency_tuner import latency_tuner
+from .node_pool import low_latency_pool
+
+
+class PwSharedLowLatencyNodes():
+    """
+    One low-latency node per mic, shared by every connection from it: the node forces the quantum
+    of the whole graph of the mic, a second one would only add DSP work.
+
+    The users of a node are the speakers of the connections that enabled low-latency mode,
+    the node is destroyed when the last one disables it. The node itself is tracked by the latency tuner,
+    which may replace it with one of a different buffer size
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # {mic: {speaker}}
+        self.users: dict[str, set[str]] = {}
+        # mics that have a node being created
+        self.pending: dict[str, int] = {}
+        # mics whose node was created here and not seen linked in a graph yet: a graph read before its links
+        # existed must not make it look destroyed
+        self.unconfirmed: set[str] = set()
+
+    def node_for(self, output_name: str) -> Optional[PwLowLatencyNode]:
+        return latency_tuner.node_for(output_name)
+
+    def is_user(self, output_name: str, input_name: str) -> bool:
+        with self.lock:
+            return input_name in self.users.get(output_name, ())
+
+    async def acquire(self, output_name: str, input_name: str) -> Optional[PwLowLatencyNode]:
+        # returns the node of the mic, creating it for the first user; None if it was released in the meantime
+        with self.lock:
+            self.users.setdefault(output_name, set()).add(input_name)
+            node = latency_tuner.node_for(output_name)
+
+            if node:
+                return node
+
+            self.pending[output_name] = self.pending.get(output_name, 0) + 1
+
+        try:
+            try:
+                quantum = latency_tuner.quantum_for(output_name)
+                node = low_latency_pool.take(quantum) or await AsyncPipewire.create_low_latency_node(quantum=quantum)
+
+                try:
+                    await AsyncPipewire.link_devices(output_name, node.name)
+                except Exception:
+                    await AsyncPipewire.destroy_node(node)
+                    raise
+            except Exception:
+                with self.lock:
+                    self._discard(output_name, input_name)
+
+                raise
+
+            with self.lock:
+                shared = latency_tuner.node_for(output_name)
+                wanted = input_name in self.users.get(output_name, ())
+
+                if wanted and not shared:
+                    latency_tuner.track(output_name, node)
+                    self.unconfirmed.add(output_name)
+                    return node
+        finally:
+            # lowered only once the node is tracked, so that sync() never sees neither
+            with self.lock:
+                self.pending[output_name] -= 1
+                if not self.pending[output_name]:
+                    del self.pending[output_name]
+
+        # another connection created one first, or low-latency mode was disabled while this one was created
+        await AsyncPipewire.destroy_node(node)
+        return shared if wanted else None
+
+    async def release(self, output_name: str, input_name: str):
+        node = self._release(output_name, input_name)
+
+        if node:
+            await AsyncPipewire.destroy_node(node)
+
+    def release_operations(self, output_name: str, input_name: str) -> list[PwOperation]:
+        # same as release(), for a batch that also removes the links of the connection
+        node = self._release(output_name, input_name)
+        return [PwOperation('destroy', node.name)] if node else []
+
+    def sync(self, output_name: str, nodes: list[PwLowLatencyNode], input_names: list[str]) -> Optional[PwLowLatencyNode]:
+        """
+        Called with the low-latency nodes linked to a mic and the speakers it's connected to, as found in the graph.
+        Returns the shared node of the mic.
+
+        A node nobody enabled from this window (eg. left by a previous run) is used by every connection of the mic
+        """
+        with self.lock:
+            tracked = latency_tuner.node_for(output_name)
+
+            if not nodes:
+                if tracked and not self.pending.get(output_name) and (output_name not in self.unconfirmed):
+                    # destroyed from outside
+                    latency_tuner.untrack(output_name)
+                    self.users.pop(output_name, None)
+
+                return None
+
+            if tracked in nodes:
+                self.unconfirmed.discard(output_name)
+
+            if len(nodes) > 1:
+                logging.debug(f'{output_name} has {len(nodes)} low-latency nodes')
+
+            if tracked:
+                shared = tracked
+            else:
+                shared = nodes[0]
+                latency_tuner.track(output_name, shared)
+
+            users = self.users.get(output_name, set()) & set(input_names)
+            self.users[output_name] = users or set(input_names)
+
+            return shared
+
+    def _release(self, output_name: str, input_name: str) -> Optional[PwLowLatencyNode]:
+        # returns the node to destroy if that was the last user
+        with self.lock:
+            if input_name not in self.users.get(output_name, ()):
+                return None
+
+            self._discard(output_name, input_name)
+            if output_name in self.users or self.pending.get(output_name):
+                return None
+
+            # the tuner may have replaced the node since it was created
+            self.unconfirmed.discard(output_name)
+            return latency_tuner.untrack(output_name)
+
+    def _discard(self, output_name: str, input_name: str):
+        users = self.users.get(output_name)
+
+        if users is not None:
+            users.discard(input_name)
+            if not users:
+                del self.users[output_name]
+
+
+# Shared by the window and the connection boxes
+shared_low_latency_nodes = PwSharedLowLatencyNodes()
@@ -0,0 +1,409 @@
+import copy
+import json
+import queue
+import subprocess
+import threading
+from typing import Optional
+from .backend import PwBackend
+from .graph import PW_TYPE_CORE, PW_TYPE_NODE, PW_TYPE_PORT, PW_TYPE_LINK
+
+SIMULATED_FIRST_ID = 30
+SIMULATED_CLOCK_PROPS = {
+    'default.clock.rate': 48000,
+    'default.clock.quantum': 1024,
+    'default.clock.min-quantum': 32,
+    'default.clock.max-quantum': 2048,
+    'default.clock.quantum-limit': 8192,
+    'default.clock.quantum-floor': 4,
+}
+
+
+class PwSimulatedMonitor():
+    """Popen-like handle returned by PwSimulatedBackend.monitor()"""
+
+    def __init__(self, backend: 'PwSimulatedBackend'):
+        self.backend = backend
+        self.queue: queue.Queue = queue.Queue()
+        self.stdout = self._lines()
+
+    def _lines(self):
+        document = self.queue.get()
+        while document is not None:
+            for line in json.dumps(document, indent=2).splitlines(keepends=True):
+                yield line
+
+            yield '\n'
+            document = self.queue.get()
+
+    def terminate(self):
+        self.backend.monitors.remove(self)
+        self.queue.put(None)
+
+
+class PwSimulatedTop():
+    """Popen-like handle returned by PwSimulatedBackend.top(), prints a frame every `interval` seconds"""
+
+    def __init__(self, backend: 'PwSimulatedBackend', interval: float):
+        self.backend = backend
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.stdout = self._lines()
+
+    def _lines(self):
+        while not self.stopped.is_set():
+            yield 'S   ID  QUANT   RATE    WAIT    BUSY   W/Q   B/Q  ERR FORMAT           NAME\n'
+            for line in self.backend.top_lines():
+                yield line + '\n'
+
+            self.stopped.wait(self.interval)
+
+    def terminate(self):
+        self.stopped.set()
+
+
+class PwSimulatedBackend(PwBackend):
+    """
+    In-process Pipewire graph: assigns ids, exposes ports for the devices and the
+    nodes it creates and honors `object.linger`.
+
+    Objects created without `object.linger` belong to the simulated client
+    and are removed by disconnect_client(), like they would when a pw-cli process exits
+    """
+
+    def __init__(self, clock_props: Optional[dict]=None):
+        self.lock = threading.RLock()
+        self.objects: dict[int, dict] = {}
+        self.client_objects: list[int] = []
+        self.linked_ports: dict[tuple[int, int], int] = {}
+        self.monitors: list[PwSimulatedMonitor] = []
+        self.next_id = SIMULATED_FIRST_ID
+        self.card_count = 0
+        # pw-top: seconds between frames, the DSP load of every node and the error counters by node id.
+        # A graph that runs with a quantum below `stable_quantum` gets an xrun every frame
+        self.top_interval = 1.0
+        self.load = 0.05
+        self.errors: dict[int, int] = {}
+        self.stable_quantum: Optional[int] = None
+
+        self.objects[0] = {
+            'id': 0,
+            'type': PW_TYPE_CORE,
+            'info': {'name': 'pipewire-0', 'props': dict(SIMULATED_CLOCK_PROPS if clock_props is None else clock_props)},
+        }
+
+    @staticmethod
+    def with_demo_devices() -> 'PwSimulatedBackend':
+        backend = PwSimulatedBackend()
+        backend.add_device('alsa_input.pci-0000_00_1f.3.analog-stereo', 'Built-in Audio Analog Stereo', 'Audio/Source', ['FL', 'FR'])
+        backend.add_device('alsa_input.usb-Blue_Yeti-00.mono-fallback', 'Yeti Stereo Microphone Mono', 'Audio/Source', ['MONO'])
+        backend.add_device('alsa_output.pci-0000_00_1f.3.analog-stereo', 'Built-in Audio Analog Stereo', 'Audio/Sink', ['FL', 'FR'])
+        backend.add_device('alsa_output.usb-Generic_USB_Audio-00.analog-stereo', 'USB Audio Headphones', 'Audio/Sink', ['FL', 'FR'])
+        return backend
+
+    def _new_id(self) -> int:
+        obj_id = self.next_id
+        self.next_id += 1
+        return obj_id
+
+    def _publish(self, objects: list[dict]):
+        for monitor in list(self.monitors):
+            monitor.queue.put(copy.deepcopy(objects))
+
+    def _fail(self, command: list[str], message: str):
+        raise subprocess.CalledProcessError(1, command, output='', stderr=message)
+
+    def _add_port(self, node_id: int, node_name: str, alias_prefix: str, direction: str, port_name: str, channel: str, path: str) -> dict:
+        port_id = self._new_id()
+        port = {
+            'id': port_id,
+            'type': PW_TYPE_PORT,
+            'info': {
+                'direction': direction,
+                'props': {
+                    'node.id': node_id,
+                    'object.id': port_id,
+                    'port.name': port_name,
+                    'port.direction': 'in' if direction == 'input' else 'out',
+                    'port.alias': f'{alias_prefix}:{port_name}',
+                    'object.path': path,
+                    'audio.channel': channel,
+                    'format.dsp': '32 bit float mono audio',
+                }
+            }
+        }
+
+        self.objects[port_id] = port
+        return port
+
+    def _add_node(self, props: dict, channels: list[str], path_prefix: str, alias_prefix: str) -> list[dict]:
+        node_id = self._new_id()
+        node_name = props['node.name']
+        node = {
+            'id': node_id,
+            'type': PW_TYPE_NODE,
+            'info': {'state': 'suspended', 'error': None, 'props': {**props, 'object.id': node_id}},
+        }
+
+        self.objects[node_id] = node
+        created = [node]
+
+        for i, ch in enumerate(channels):
+            if props.get('media.class') == 'Audio/Source':
+                created.append(self._add_port(node_id, node_name, alias_prefix, 'output', f'capture_{ch}', ch, f'{path_prefix}capture_{i}'))
+            else:
+                created.append(self._add_port(node_id, node_name, alias_prefix, 'input', f'playback_{ch}', ch, f'{path_prefix}playback_{i}'))
+
+        if props.get('media.class') == 'Audio/Sink':
+            for i, ch in enumerate(channels):
+                created.append(self._add_port(node_id, node_name, alias_prefix, 'output', f'monitor_{ch}', ch, f'{path_prefix}monitor_{i}'))
+
+        return created
+
+    def add_device(self, name: str, description: str, media_class: str, channels: list[str]) -> int:
+        with self.lock:
+            card = self.card_count
+            self.card_count += 1
+
+            direction = 'capture' if media_class == 'Audio/Source' else 'playback'
+            path = f'alsa:pcm:{card}:front:{card}:{direction}'
+            created = self._add_node({
+                'node.name': name,
+                'node.description': description,
+                'media.class': media_class,
+                'object.path': path,
+                'device.api': 'alsa',
+                'api.alsa.period-size': 1024,
+                'api.alsa.headroom': 0,
+            }, channels, f'{path}:', description)
+
+            self._publish(created)
+            return created[0]['id']
+
+    def remove_device(self, name: str):
+        self.destroy(name)
+
+    def _find_node(self, name_or_id: str) -> Optional[dict]:
+        for obj in self.objects.values():
+            if obj['type'] == PW_TYPE_NODE and (str(obj['id']) == str(name_or_id) or obj['info']['props'].get('node.name') == name_or_id):
+                return obj
+
+        return None
+
+    def _find_port(self, port: str) -> Optional[dict]:
+        if str(port).isdigit():
+            obj = self.objects.get(int(port))
+            return obj if (obj and obj['type'] == PW_TYPE_PORT) else None
+
+        node_name, _, port_name = str(port).rpartition(':')
+        node = self._find_node(node_name)
+        if not node:
+            return None
+
+        for obj in self.objects.values():
+            if obj['type'] == PW_TYPE_PORT and obj['info']['props']['node.id'] == node['id'] and obj['info']['props']['port.name'] == port_name:
+                return obj
+
+        return None
+
+    def _node_name(self, node_id: int) -> str:
+        return self.objects[node_id]['info']['props']['node.name']
+
+    def _port_name(self, port: dict) -> str:
+        return self._node_name(port['info']['props']['node.id']) + ':' + port['info']['props']['port.name']
+
+    def _sorted_objects(self, obj_type: str) -> list[dict]:
+        return [o for i, o in sorted(self.objects.items()) if o['type'] == obj_type]
+
+    def is_available(self) -> bool:
+        return True
+
+    def info(self) -> str:
+        with self.lock:
+            props = self.objects[0]['info']['props']
+            return '\n'.join([f'\tid: 0', '\ttype: PipeWire:Interface:Core', *[f'\t\t{k} = "{v}"' for k, v in props.items()]])
+
+    def list_ports(self, direction: str, quiet=False) -> str:
+        lines = []
+        with self.lock:
+            for port in self._sorted_objects(PW_TYPE_PORT):
+                if port['info']['direction'] != direction:
+                    continue
+
+                props = port['info']['props']
+                lines.append(f"{port['id']:>4} {self._port_name(port)}")
+                lines.append(f"       {props['object.path']}")
+                lines.append(f"       {props['port.alias']}")
+
+        return '\n'.join(lines)
+
+    def list_links(self, quiet=False) -> str:
+        lines = []
+        with self.lock:
+            links_by_port: dict[tuple[str, int], list[dict]] = {}
+            for l in self._sorted_objects(PW_TYPE_LINK):
+                links_by_port.setdefault(('output', l['info']['output-port-id']), []).append(l)
+                links_by_port.setdefault(('input', l['info']['input-port-id']), []).append(l)
+
+            for direction, arrow, peer_key in (('output', '|->', 'input-port-id'), ('input', '|<-', 'output-port-id')):
+                for port in self._sorted_objects(PW_TYPE_PORT):
+                    port_links = links_by_port.get((direction, port['id']))
+                    if port['info']['direction'] != direction or not port_links:
+                        continue
+
+                    lines.append(f"{port['id']:>4} {self._port_name(port)}")
+                    for l in port_links:
+                        peer = self.objects[l['info'][peer_key]]
+                        lines.append(f"{l['id']:>4}   {arrow} {peer['id']:>4} {self._port_name(peer)}")
+
+        return '\n'.join(lines)
+
+    def link(self, output_port: str, input_port: str):
+        command = ['pw-link', '--linger', output_port, input_port]
+
+        with self.lock:
+            out_p = self._find_port(output_port)
+            in_p = self._find_port(input_port)
+
+            if (not out_p) or (not in_p) or out_p['info']['direction'] != 'output' or in_p['info']['direction'] != 'input':
+                self._fail(command, 'failed to link ports: No such file or directory')
+
+            if (out_p['id'], in_p['id']) in self.linked_ports:
+                self._fail(command, 'failed to link ports: File exists')
+
+            link_id = self._new_id()
+            out_node = out_p['info']['props']['node.id']
+            in_node = in_p['info']['props']['node.id']
+            link = {
+                'id': link_id,
+                'type': PW_TYPE_LINK,
+                'info': {
+                    'output-node-id': out_node,
+                    'output-port-id': out_p['id'],
+                    'input-node-id': in_node,
+                    'input-port-id': in_p['id'],
+                    'state': 'active',
+                    'error': None,
+                    'props': {
+                        'link.output.node': out_node,
+                        'link.output.port': out_p['id'],
+                        'link.input.node': in_node,
+                        'link.input.port': in_p['id'],
+                        'object.id': link_id,
+                        'object.linger': True,
+                    }
+                }
+            }
+
+            self.objects[link_id] = link
+            self.linked_ports[(out_p['id'], in_p['id'])] = link_id
+            self._publish([link])
+
+    def _remove(self, obj_ids: list[int]):
+        for obj_id in obj_ids:
+            obj = self.objects.pop(obj_id, None)
+            if obj and obj['type'] == PW_TYPE_LINK:
+                self.linked_ports.pop((obj['info']['output-port-id'], obj['info']['input-port-id']), None)
+
+            if obj_id in self.client_objects:
+                self.client_objects.remove(obj_id)
+
+        self._publish([{'id': obj_id, 'info': None} for obj_id in obj_ids])
+
+    def unlink(self, link_id: str):
+        with self.lock:
+            obj = self.objects.get(int(link_id)) if str(link_id).isdigit() else None
+            if (not obj) or obj['type'] != PW_TYPE_LINK:
+                self._fail(['pw-link', '--disconnect', str(link_id)], 'failed to unlink ports: No such file or directory')
+
+            self._remove([obj['id']])
+
+    def create_node(self, factory: str, props: dict) -> Optional[int]:
+        with self.lock:
+            if props.get('factory.name') != 'support.null-audio-sink' or not props.get('node.name'):
+                self._fail(['pw-cli', 'create-node', factory], 'create-node failed: Invalid argument')
+
+            channels = list(props.get('audio.position', ['FL', 'FR']))
+            node_props = {k: v for k, v in props.items() if k != 'audio.position'}
+            node_props['audio.position'] = ','.join(channels)
+            name = props['node.name']
+
+            created = self._add_node(node_props, channels, f'{name}:', name)
+            if not props.get('object.linger'):
+                self.client_objects.extend([o['id'] for o in created])
+
+            self._publish(created)
+            return created[0]['id']
+
+    def destroy(self, name_or_id: str):
+        with self.lock:
+            node = self._find_node(name_or_id)
+            if not node:
+                self._fail(['pw-cli', 'destroy', str(name_or_id)], 'destroy failed: No such file or directory')
+
+            ports = [p['id'] for p in self._sorted_objects(PW_TYPE_PORT) if p['info']['props']['node.id'] == node['id']]
+            links = [l['id'] for l in self._sorted_objects(PW_TYPE_LINK) if l['info']['output-node-id'] == node['id'] or l['info']['input-node-id'] == node['id']]
+
+            self._remove([*links, *ports, node['id']])
+
+    def disconnect_client(self):
+        with self.lock:
+            node_ids = [i for i in self.client_objects if self.objects.get(i, {}).get('type') == PW_TYPE_NODE]
+            for node_id in node_ids:
+                self.destroy(str(node_id))
+
+    def dump(self, quiet=False) -> list:
+        with self.lock:
+            return copy.deepcopy([o for i, o in sorted(self.objects.items())])
+
+    def _latency_quantum(self, node: dict) -> Optional[int]:
+        latency = str(node['info']['props'].get('node.latency', ''))
+        quantum = latency.split('/')[0]
+        return int(quantum) if quantum.isdigit() else None
+
+    def top_lines(self) -> list[str]:
+        # devices drive the graph, the other nodes follow the device linked to them
+        with self.lock:
+            rate = self.objects[0]['info']['props'].get('default.clock.rate', 48000)
+            default_quantum = self.objects[0]['info']['props'].get('default.clock.quantum', 1024)
+            nodes = self._sorted_objects(PW_TYPE_NODE)
+            drivers = [n for n in nodes if 'device.api' in n['info']['props']]
+            followers: dict[int, list[dict]] = {d['id']: [] for d in drivers}
+            linked_from: dict[int, int] = {}
+
+            for l in self._sorted_objects(PW_TYPE_LINK):
+                if l['info']['output-node-id'] in followers:
+                    linked_from.setdefault(l['info']['input-node-id'], l['info']['output-node-id'])
+
+            for node in nodes:
+                if node['id'] not in followers and node['id'] in linked_from:
+                    followers[linked_from[node['id']]].append(node)
+
+            lines = []
+            for driver in drivers:
+                group = followers[driver['id']]
+                quantum = min([q for q in map(self._latency_quantum, group) if q] or [default_quantum])
+
+                if self.stable_quantum and quantum < self.stable_quantum:
+                    self.errors[driver['id']] = self.errors.get(driver['id'], 0) + 1
+
+                for node in [driver, *group]:
+                    node_quantum = quantum if node is driver else (self._latency_quantum(node) or quantum)
+                    cycle = node_quantum / rate
+                    lines.append(' '.join([
+                        'R', f'{node["id"]:>4}', f'{node_quantum:>6}', f'{rate:>6}',
+                        f'{cycle * self.load * 1e6:>6.1f}us', f'{cycle * self.load * 1e6:>6.1f}us',
+                        f'{self.load:>5.2f}', f'{self.load:>5.2f}', f'{self.errors.get(node["id"], 0):>4}',
+                        f'{"F32LE 2 " + str(rate):>16}', ('' if node is driver else ' + ') + node['info']['props']['node.name']
+                    ]))
+
+            return lines
+
+    def top(self) -> PwSimulatedTop:
+        return PwSimulatedTop(self, self.top_interval)
+
+    def monitor(self) -> PwSimulatedMonitor:
+        with self.lock:
+            monitor = PwSimulatedMonitor(self)
+            self.monitors.append(monitor)
+            monitor.queue.put(self.dump())
+            return monitor
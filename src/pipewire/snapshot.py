@@ -0,0 +1,155 @@
+import threading
+import logging
+from time import monotonic
+from typing import Optional
+from .pipewire import Pipewire, PwLink, PwActiveConnectionLink
+from .graph import PwGraph
+
+# How long (in seconds) a snapshot is served before querying Pipewire again
+SNAPSHOT_TTL = 2.0
+
+
+class PwGraphSnapshot():
+    """
+    Caches the Pipewire graph so that a single refresh runs one pw-dump,
+    inputs, outputs and links are all derived from it.
+
+    While the graph monitor is running and synced the graph is a copy of the monitored one and pw-dump is not run,
+    the derived values are kept until the monitor reports a change.
+    Otherwise the snapshot is dropped when its TTL expires, when invalidate() is called
+    or when Pipewire reports a change made by Whisper itself (link, unlink, create, destroy)
+    """
+
+    def __init__(self, ttl: float=SNAPSHOT_TTL):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._taken_at: Optional[float] = None
+        self._dump: Optional[list] = None
+        self._graph: Optional[PwGraph] = None
+        # the graph is a copy of the one of the monitor
+        self._monitored = False
+        self._inputs: Optional[dict[str, PwLink]] = None
+        self._outputs: Optional[dict[str, PwLink]] = None
+        self._links: Optional[dict[int, dict[int, PwActiveConnectionLink]]] = None
+        self._inputs_by_port: Optional[dict[int, PwLink]] = None
+        self._outputs_by_port: Optional[dict[int, PwLink]] = None
+
+        Pipewire.add_change_listener(self.invalidate)
+
+    def invalidate(self):
+        with self._lock:
+            self._taken_at = None
+            self._dump = None
+            self._graph = None
+            self._monitored = False
+            self._inputs = None
+            self._outputs = None
+            self._links = None
+            self._inputs_by_port = None
+            self._outputs_by_port = None
+
+    def _check_expired(self):
+        if (self._taken_at is not None) and (monotonic() - self._taken_at > self.ttl):
+            logging.debug('Pipewire graph snapshot expired')
+            self.invalidate()
+
+        if self._taken_at is None:
+            self._taken_at = monotonic()
+
+    def dump(self, quiet=False) -> list:
+        with self._lock:
+            self._check_expired()
+
+            if self._dump is None:
+                self._dump = Pipewire.list_objects(quiet=quiet)
+
+            return self._dump
+
+    def graph(self, quiet=False) -> PwGraph:
+        with self._lock:
+            monitor = Pipewire._synced_monitor()
+
+            if monitor:
+                graph = monitor.copy_graph()
+
+                if graph is not self._graph:
+                    self.invalidate()
+                    self._graph = graph
+                    self._monitored = True
+
+                return graph
+
+            if self._monitored:
+                # the monitor stopped, its last graph may be out of date
+                self.invalidate()
+
+            self._check_expired()
+
+            if self._graph is None:
+                self._graph = PwGraph.from_dump(self.dump(quiet=quiet))
+
+            return self._graph
+
+    def inputs(self, quiet=False) -> dict[str, PwLink]:
+        with self._lock:
+            graph = self.graph(quiet=quiet)
+
+            if self._inputs is None:
+                self._inputs = Pipewire.list_inputs(quiet=quiet, graph=graph)
+
+            return self._inputs
+
+    def outputs(self, quiet=False) -> dict[str, PwLink]:
+        with self._lock:
+            graph = self.graph(quiet=quiet)
+
+            if self._outputs is None:
+                self._outputs = Pipewire.list_outputs(quiet=quiet, graph=graph)
+
+            return self._outputs
+
+    def links(self, quiet=False) -> dict[int, dict[int, PwActiveConnectionLink]]:
+        with self._lock:
+            graph = self.graph(quiet=quiet)
+
+            if self._links is None:
+                self._links = Pipewire.list_links(quiet=quiet, graph=graph)
+
+            return self._links
+
+    def input_by_port(self, port_id: int) -> Optional[PwLink]:
+        with self._lock:
+            self.graph()
+
+            if self._inputs_by_port is None:
+                self._inputs_by_port = PwGraphSnapshot.index_by_port(self.inputs())
+
+            return self._inputs_by_port.get(port_id)
+
+    def output_by_port(self, port_id: int) -> Optional[PwLink]:
+        with self._lock:
+            self.graph()
+
+            if self._outputs_by_port is None:
+                self._outputs_by_port = PwGraphSnapshot.index_by_port(self.outputs())
+
+            return self._outputs_by_port.get(port_id)
+
+    @staticmethod
+    def index_by_port(devices: dict[str, PwLink]) -> dict[int, PwLink]:
+        index = {}
+        for dev in devices.values():
+            for port_id in dev.channels:
+                index[port_id] = dev
+
+        return index
+
+    def node_description(self, node_name: str) -> str:
+        return Pipewire._get_node_description(self.graph(), node_name)
+
+    def clock_info(self) -> dict:
+        return Pipewire.get_default_clock_info(self.graph())
+
+
+# Shared by the window and every component
+pw_snapshot = PwGraphSnapshot()
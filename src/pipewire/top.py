@@ -0,0 +1,328 @@
+import re
+import logging
+import threading
+from time import sleep
+from typing import Callable, Iterable, Optional
+from .pipewire import Pipewire
+from ..utils.ring_buffer import RingBuffer
+
+TOP_RESTART_DELAY = 1
+TOP_HEADER_REGEX = re.compile(r'^\s*S\s+ID\s+QUANT\b')
+# FORMAT is empty for drivers without a format, followers have a "+" before their name
+TOP_FORMAT_REGEX = re.compile(r'^(?:(\S+ \d+ \d+|\S+ \d+x\d+(?: \S+)?)\s+)?(\+\s+)?(.*)$')
+TOP_TIME_UNITS = {'ns': 1e-9, 'us': 1e-6, 'ms': 1e-3, 's': 1}
+# frames kept for every watched node, pw-top prints one per second
+TOP_HISTORY_SIZE = 60
+
+
+class PwTopRow():
+    """A node as printed by `pw-top --batch-mode`, times are in seconds"""
+
+    __slots__ = ('state', 'id', 'quantum', 'rate', 'wait', 'busy', 'wait_ratio', 'busy_ratio', 'errors', 'format', 'name', 'driver_id')
+
+    def __init__(self, state: str, node_id: int, quantum: int, rate: int, wait: Optional[float], busy: Optional[float],
+            wait_ratio: Optional[float], busy_ratio: Optional[float], errors: int, format: str, name: str, driver_id: Optional[int]=None):
+        self.state = state
+        self.id = node_id
+        self.quantum = quantum
+        self.rate = rate
+        self.wait = wait
+        self.busy = busy
+        self.wait_ratio = wait_ratio
+        self.busy_ratio = busy_ratio
+        self.errors = errors
+        self.format = format
+        self.name = name
+        # the driver of a follower, None for the drivers
+        self.driver_id = driver_id
+
+    def is_driver(self) -> bool:
+        return self.driver_id is None
+
+    def load(self) -> float:
+        # the part of the cycle used before the node was done, near 1 the node misses its deadline
+        return (self.wait_ratio or 0) + (self.busy_ratio or 0)
+
+    def __repr__(self):
+        return f'PwTopRow({self.id}, {self.name}, quantum={self.quantum}, errors={self.errors})'
+
+
+class PwTopFrame():
+    """One refresh of pw-top: every node, followers come after their driver"""
+
+    def __init__(self, rows: list[PwTopRow]):
+        self.rows = rows
+        self.rows_by_id = {r.id: r for r in rows}
+
+    def row(self, node_id: int) -> Optional[PwTopRow]:
+        return self.rows_by_id.get(node_id)
+
+    def group_of(self, node_id: int) -> list[PwTopRow]:
+        # the driver of the node and all of its followers
+        row = self.rows_by_id.get(node_id)
+        if row is None:
+            return []
+
+        driver_id = row.id if row.is_driver() else row.driver_id
+        return [r for r in self.rows if r.id == driver_id or r.driver_id == driver_id]
+
+
+def _parse_time(value: str) -> Optional[float]:
+    for unit in ('ns', 'us', 'ms', 's'):
+        if value.endswith(unit):
+            try:
+                return float(value[:-len(unit)].replace(',', '.')) * TOP_TIME_UNITS[unit]
+            except ValueError:
+                return None
+
+    return None
+
+
+def _parse_ratio(value: str) -> Optional[float]:
+    try:
+        return float(value.replace(',', '.'))
+    except ValueError:
+        return None
+
+
+def parse_top_line(line: str, driver_id: Optional[int]=None) -> Optional[PwTopRow]:
+    """
+    Parses a node line of pw-top, eg.
+    `R   56    256  48000  64.0us  27.4us  0.01  0.01    0    S32LE 2 48000 alsa_output.pci-0000_00_1f.3.analog-stereo`
+
+    `driver_id` is the driver of the lines above: it's assigned to the node if it's a follower.
+    Returns None for headers and malformed lines
+    """
+    fields = line.split(maxsplit=9)
+    if len(fields) < 9 or not (fields[1].isdigit() and fields[2].isdigit() and fields[3].isdigit() and fields[8].isdigit()):
+        return None
+
+    format, follower, name = TOP_FORMAT_REGEX.match(fields[9].strip() if len(fields) > 9 else '').groups()
+
+    return PwTopRow(
+        state=fields[0],
+        node_id=int(fields[1]),
+        quantum=int(fields[2]),
+        rate=int(fields[3]),
+        wait=_parse_time(fields[4]),
+        busy=_parse_time(fields[5]),
+        wait_ratio=_parse_ratio(fields[6]),
+        busy_ratio=_parse_ratio(fields[7]),
+        errors=int(fields[8]),
+        format=format or '',
+        name=name,
+        driver_id=driver_id if follower else None
+    )
+
+
+class PwTopMonitor():
+    """
+    Runs `pw-top --batch-mode` while someone is subscribed and publishes every refresh as a PwTopFrame.
+    Subscribers are called from the monitor thread
+    """
+
+    def __init__(self, stream_factory: Optional[Callable[[], Iterable[str]]]=None):
+        self.stream_factory = stream_factory or self._spawn_backend_top
+        self.subscribers: list[Callable[[PwTopFrame], None]] = []
+        self.lock = threading.Lock()
+        self.process = None
+        self.running = False
+        self.thread: Optional[threading.Thread] = None
+        self.last_frame: Optional[PwTopFrame] = None
+        self._rows: list[PwTopRow] = []
+
+    def subscribe(self, callback: Callable[[PwTopFrame], None]):
+        with self.lock:
+            self.subscribers.append(callback)
+
+        self.start()
+
+    def unsubscribe(self, callback: Callable[[PwTopFrame], None]):
+        with self.lock:
+            if callback in self.subscribers:
+                self.subscribers.remove(callback)
+
+            unused = not self.subscribers
+
+        if unused:
+            self.stop()
+
+    def is_running(self) -> bool:
+        return self.running and (self.thread is not None) and self.thread.is_alive()
+
+    def start(self):
+        if self.is_running():
+            return
+
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+
+        if self.process:
+            self.process.terminate()
+            self.process = None
+
+    def feed_line(self, line: str) -> Optional[PwTopFrame]:
+        # returns the frame that the line completed, if any
+        if TOP_HEADER_REGEX.match(line) or not line.strip():
+            return self._publish()
+
+        driver_id = None
+        if self._rows:
+            last = self._rows[-1]
+            driver_id = last.id if last.is_driver() else last.driver_id
+
+        row = parse_top_line(line, driver_id)
+        if row:
+            self._rows.append(row)
+
+        return None
+
+    def _publish(self) -> Optional[PwTopFrame]:
+        if not self._rows:
+            return None
+
+        frame = PwTopFrame(self._rows)
+        self._rows = []
+        self.last_frame = frame
+
+        with self.lock:
+            subscribers = list(self.subscribers)
+
+        for callback in subscribers:
+            try:
+                callback(frame)
+            except Exception as e:
+                logging.error(f'pw-top subscriber failed: {e}')
+
+        return frame
+
+    def _spawn_backend_top(self) -> Iterable[str]:
+        self.process = Pipewire.backend.top()
+        return self.process.stdout
+
+    def _is_current(self) -> bool:
+        # a monitor stopped and started again quickly may still have its previous thread around
+        return self.running and (self.thread is threading.current_thread())
+
+    def _run(self):
+        while self._is_current():
+            try:
+                for line in self.stream_factory():
+                    if not self._is_current():
+                        break
+
+                    self.feed_line(line)
+            except FileNotFoundError as e:
+                logging.error(f'pw-top is not available: {e}')
+                break
+            except Exception as e:
+                logging.error(f'pw-top failed: {e}')
+
+            if not self._is_current():
+                return
+
+            logging.warning('pw-top stopped, restarting...')
+            self._rows = []
+            sleep(TOP_RESTART_DELAY)
+
+        if self.thread is threading.current_thread():
+            self.running = False
+
+
+class PwNodeStats():
+    """The last TOP_HISTORY_SIZE values pw-top reported for a node"""
+
+    __slots__ = ('node_id', 'last', 'quantum', 'wait', 'busy', 'load', 'errors')
+
+    def __init__(self, node_id: int, size: int=TOP_HISTORY_SIZE):
+        self.node_id = node_id
+        self.last: Optional[PwTopRow] = None
+        self.quantum = RingBuffer(size, 'q')
+        self.wait = RingBuffer(size)
+        self.busy = RingBuffer(size)
+        self.load = RingBuffer(size)
+        self.errors = RingBuffer(size, 'q')
+
+    def add(self, row: PwTopRow):
+        self.last = row
+        self.quantum.append(row.quantum)
+        self.wait.append(row.wait or 0)
+        self.busy.append(row.busy or 0)
+        self.load.append(row.load())
+        self.errors.append(row.errors)
+
+    def latency(self) -> Optional[float]:
+        # seconds of audio in a cycle of the node
+        if not (self.last and self.last.quantum and self.last.rate):
+            return None
+
+        return self.last.quantum / self.last.rate
+
+
+class PwTopHistory():
+    """
+    Keeps the statistics of the nodes someone is watching, pw-top runs while there is a watcher.
+    Watchers are called from the pw-top thread after every frame that has their node
+    """
+
+    def __init__(self, top: PwTopMonitor, size: int=TOP_HISTORY_SIZE):
+        self.top = top
+        self.size = size
+        self.lock = threading.Lock()
+        self.stats: dict[int, PwNodeStats] = {}
+        self.watchers: dict[int, list[Callable[[PwNodeStats], None]]] = {}
+
+    def watch(self, node_id: int, callback: Callable[[PwNodeStats], None]) -> PwNodeStats:
+        with self.lock:
+            first = not self.watchers
+            self.watchers.setdefault(node_id, []).append(callback)
+
+            if node_id not in self.stats:
+                self.stats[node_id] = PwNodeStats(node_id, self.size)
+
+            stats = self.stats[node_id]
+
+        if first:
+            self.top.subscribe(self.on_frame)
+
+        return stats
+
+    def unwatch(self, node_id: int, callback: Callable[[PwNodeStats], None]):
+        with self.lock:
+            callbacks = self.watchers.get(node_id, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+
+            if not callbacks:
+                self.watchers.pop(node_id, None)
+                self.stats.pop(node_id, None)
+
+            last = not self.watchers
+
+        if last:
+            self.top.unsubscribe(self.on_frame)
+
+    def on_frame(self, frame: PwTopFrame):
+        updated = []
+
+        with self.lock:
+            for node_id, callbacks in self.watchers.items():
+                row = frame.row(node_id)
+                if row is None:
+                    continue
+
+                stats = self.stats[node_id]
+                stats.add(row)
+                updated.extend((callback, stats) for callback in callbacks)
+
+        for callback, stats in updated:
+            callback(stats)
+
+
+# Shared by every component that reads the node statistics
+pw_top = PwTopMonitor()
+pw_top_history = PwTopHistory(pw_top)
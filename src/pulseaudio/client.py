@@ -0,0 +1,220 @@
+import logging
+import threading
+from time import monotonic
+from typing import Callable, Optional
+import pulsectl
+
+# volume writes are sent at most this often while a slider is dragged, the last value is always sent
+PULSE_VOLUME_WRITE_INTERVAL = 1 / 30
+# for this many seconds after a write, the events and values of that device are our own write coming back
+PULSE_ECHO_WINDOW = 0.5
+# a volume write that fails is sent again this many times, unless a newer value replaces it
+PULSE_VOLUME_WRITE_RETRIES = 3
+
+
+class PulseDevice():
+    """A sink or a source, `volume` is the average of its channels (0 to 1)"""
+
+    __slots__ = ('facility', 'index', 'name', 'volume', 'info')
+
+    def __init__(self, facility: str, info):
+        self.facility = facility
+        self.index: int = info.index
+        self.name: str = info.name
+        self.volume: float = info.volume.value_flat
+        # the pulsectl object, needed to set the volume of every channel
+        self.info = info
+
+    def __repr__(self):
+        return f'PulseDevice({self.facility}, {self.index}, {self.name}, volume={self.volume:.2f})'
+
+
+class PulseDevices():
+    """Every sink and source by name, as read in one refresh"""
+
+    __slots__ = ('sinks', 'sources')
+
+    def __init__(self, sinks: dict[str, PulseDevice], sources: dict[str, PulseDevice]):
+        self.sinks = sinks
+        self.sources = sources
+
+    def sink(self, name: str) -> Optional[PulseDevice]:
+        return self.sinks.get(name)
+
+    def source(self, name: str) -> Optional[PulseDevice]:
+        return self.sources.get(name)
+
+
+class PulseClient():
+    """
+    One PulseAudio connection shared by the whole app, used from its own thread and opened again if it drops.
+
+    refresh() reads every sink and source with a single sink_list() and source_list(), the refreshes asked
+    while one is queued share it. Volume writes are queued too: the first one is sent right away, then at most
+    once every `write_interval` seconds with the last value of every device. A write that fails is queued again.
+    Callbacks are called from the client thread. After close() refreshes and writes are ignored
+    """
+
+    def __init__(self, client_factory: Optional[Callable[[], pulsectl.Pulse]]=None,
+            write_interval: float=PULSE_VOLUME_WRITE_INTERVAL, echo_window: float=PULSE_ECHO_WINDOW):
+        self.client_factory = client_factory or (lambda: pulsectl.Pulse('whisper'))
+        self.write_interval = write_interval
+        self.echo_window = echo_window
+        self.condition = threading.Condition()
+        self.client: Optional[pulsectl.Pulse] = None
+        self.running = False
+        self.closed = False
+        self.thread: Optional[threading.Thread] = None
+        self.refresh_callbacks: list[Callable[[PulseDevices], None]] = []
+        # {(facility, name): (device, volume, failed attempts)}
+        self.volume_writes: dict[tuple[str, str], tuple[PulseDevice, float, int]] = {}
+        self.last_write_at = float('-inf')
+        # {(facility, index): when it was written last}
+        self.written_at: dict[tuple[str, int], float] = {}
+
+    def refresh(self, callback: Callable[[PulseDevices], None]):
+        with self.condition:
+            if self.closed:
+                return
+
+            self.refresh_callbacks.append(callback)
+            self.condition.notify()
+
+        self.start()
+
+    def set_volume(self, device: PulseDevice, volume: float):
+        with self.condition:
+            if self.closed:
+                return
+
+            self.volume_writes[(device.facility, device.name)] = (device, volume, 0)
+            self.condition.notify()
+
+        self.start()
+
+    def is_echo(self, facility: str, index: int) -> bool:
+        # True while a change of the device is most likely caused by set_volume()
+        with self.condition:
+            if any((d.facility, d.index) == (facility, index) for d, _, _ in self.volume_writes.values()):
+                return True
+
+            written_at = self.written_at.get((facility, index))
+
+        return (written_at is not None) and (monotonic() - written_at < self.echo_window)
+
+    def start(self):
+        with self.condition:
+            if self.running or self.closed:
+                return
+
+            self.running = True
+
+        self.thread = threading.Thread(target=self._run, name='pulse-client', daemon=True)
+        self.thread.start()
+
+    def close(self):
+        with self.condition:
+            self.running = False
+            self.closed = True
+            self.refresh_callbacks = []
+            self.volume_writes = {}
+            self.condition.notify()
+
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=5)
+
+    def _next_work(self) -> tuple[list, list]:
+        # waits for a refresh or for the next volume write slot
+        with self.condition:
+            while self.running:
+                wait = self.last_write_at + self.write_interval - monotonic()
+                writes_ready = bool(self.volume_writes) and wait <= 0
+
+                if self.refresh_callbacks or writes_ready:
+                    break
+
+                self.condition.wait(wait if self.volume_writes else None)
+            else:
+                return [], []
+
+            callbacks, self.refresh_callbacks = self.refresh_callbacks, []
+            writes = []
+
+            if writes_ready:
+                writes, self.volume_writes = list(self.volume_writes.values()), {}
+                self.last_write_at = monotonic()
+
+            return callbacks, writes
+
+    def _connect(self) -> pulsectl.Pulse:
+        if self.client is None:
+            self.client = self.client_factory()
+
+        return self.client
+
+    def _disconnect(self):
+        if self.client:
+            try:
+                self.client.close()
+            except Exception:
+                pass
+
+        self.client = None
+
+    def _read_devices(self, client: pulsectl.Pulse) -> PulseDevices:
+        return PulseDevices(
+            sinks={s.name: PulseDevice('sink', s) for s in client.sink_list()},
+            sources={s.name: PulseDevice('source', s) for s in client.source_list()}
+        )
+
+    def _write_volume(self, client: pulsectl.Pulse, device: PulseDevice, volume: float):
+        with self.condition:
+            self.written_at[(device.facility, device.index)] = monotonic()
+
+        client.volume_set_all_chans(device.info, volume)
+        device.volume = volume
+
+    def _requeue(self, writes: list[tuple[PulseDevice, float, int]]):
+        # the writes that were not sent, a value set in the meantime wins over them
+        with self.condition:
+            for device, volume, failures in writes:
+                if failures >= PULSE_VOLUME_WRITE_RETRIES:
+                    logging.error(f'Could not set the volume of {device.name}, giving up')
+                    continue
+
+                self.volume_writes.setdefault((device.facility, device.name), (device, volume, failures + 1))
+
+    def _run(self):
+        while self.running:
+            callbacks, writes = self._next_work()
+
+            if not self.running:
+                break
+
+            sent = 0
+
+            try:
+                client = self._connect()
+
+                for device, volume, _ in writes:
+                    self._write_volume(client, device, volume)
+                    sent += 1
+
+                devices = self._read_devices(client) if callbacks else None
+            except Exception as e:
+                logging.error(f'PulseAudio request failed: {e}')
+                self._disconnect()
+                self._requeue(writes[sent:])
+                continue
+
+            for callback in callbacks:
+                try:
+                    callback(devices)
+                except Exception as e:
+                    logging.error(f'PulseAudio refresh callback failed: {e}')
+
+        self._disconnect()
+
+
+# Shared by the window and the connection boxes
+pulse_client = PulseClient()
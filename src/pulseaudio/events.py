@@ -0,0 +1,167 @@
+import logging
+import threading
+from time import monotonic, sleep
+from typing import Callable, Optional
+import pulsectl
+
+# seconds the events are collected before the subscribers are called
+PULSE_EVENTS_COALESCE_INTERVAL = 0.1
+PULSE_EVENTS_RECONNECT_DELAY = 1
+PULSE_EVENTS_FACILITIES = ('sink', 'source', 'server')
+
+
+class PulseEventBatch():
+    """The PulseAudio events of a coalescing interval, `sinks` and `sources` are the indices that changed"""
+
+    __slots__ = ('sinks', 'sources', 'server', 'devices')
+
+    def __init__(self, sinks: frozenset[int], sources: frozenset[int], server: bool, devices: bool):
+        self.sinks = sinks
+        self.sources = sources
+        # the server changed, eg. the default sink
+        self.server = server
+        # a sink or a source was added or removed
+        self.devices = devices
+
+    def __repr__(self):
+        return f'PulseEventBatch(sinks={set(self.sinks)}, sources={set(self.sources)}, server={self.server}, devices={self.devices})'
+
+
+class PulseEventBus():
+    """
+    A single PulseAudio connection subscribed to sink, source and server events for as long as it runs,
+    it only connects again if PulseAudio goes away.
+
+    `change` events are dropped unless their sink or source is watched (see watch()), `new` and `remove` always go through.
+    Events are collected for `coalesce_interval` seconds and handed to the subscribers as one PulseEventBatch,
+    from the listener thread
+    """
+
+    def __init__(self, coalesce_interval: float=PULSE_EVENTS_COALESCE_INTERVAL, client_factory: Optional[Callable[[], pulsectl.Pulse]]=None):
+        self.coalesce_interval = coalesce_interval
+        self.client_factory = client_factory or (lambda: pulsectl.Pulse('whisper-event-listen'))
+        self.lock = threading.Lock()
+        self.subscribers: list[Callable[[PulseEventBatch], None]] = []
+        self.watched_sinks: frozenset[int] = frozenset()
+        self.watched_sources: frozenset[int] = frozenset()
+        self.running = False
+        self.thread: Optional[threading.Thread] = None
+        self.client: Optional[pulsectl.Pulse] = None
+        self._reset_pending()
+
+    def subscribe(self, callback: Callable[[PulseEventBatch], None]):
+        with self.lock:
+            self.subscribers.append(callback)
+
+        self.start()
+
+    def unsubscribe(self, callback: Callable[[PulseEventBatch], None]):
+        with self.lock:
+            if callback in self.subscribers:
+                self.subscribers.remove(callback)
+
+    def watch(self, sinks: set[int], sources: set[int]):
+        # the indices behind the active connections
+        with self.lock:
+            self.watched_sinks = frozenset(sinks)
+            self.watched_sources = frozenset(sources)
+
+    def is_running(self) -> bool:
+        return self.running and (self.thread is not None) and self.thread.is_alive()
+
+    def start(self):
+        if self.is_running():
+            return
+
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='pulse-events', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        client = self.client
+
+        if client:
+            # interrupts event_listen(), the thread closes the connection
+            client.event_listen_stop()
+
+    def _reset_pending(self):
+        self.pending_sinks: set[int] = set()
+        self.pending_sources: set[int] = set()
+        self.pending_server = False
+        self.pending_devices = False
+        # when the pending events are handed to the subscribers
+        self.flush_at: Optional[float] = None
+
+    def _on_event(self, ev):
+        # called by pulsectl inside event_listen()
+        with self.lock:
+            if ev.facility == 'server':
+                self.pending_server = True
+            elif ev.t == 'new' or ev.t == 'remove':
+                self.pending_devices = True
+            elif ev.facility == 'sink' and ev.index in self.watched_sinks:
+                self.pending_sinks.add(ev.index)
+            elif ev.facility == 'source' and ev.index in self.watched_sources:
+                self.pending_sources.add(ev.index)
+            else:
+                return
+
+            first = self.flush_at is None
+            if first:
+                self.flush_at = monotonic() + self.coalesce_interval
+
+        if first:
+            # stops event_listen() so that it can be called again with a timeout
+            raise pulsectl.PulseLoopStop()
+
+    def _flush(self):
+        with self.lock:
+            batch = PulseEventBatch(frozenset(self.pending_sinks), frozenset(self.pending_sources), self.pending_server, self.pending_devices)
+            subscribers = list(self.subscribers)
+            self._reset_pending()
+
+        logging.debug(f'PulseAudio events: {batch}')
+
+        for callback in subscribers:
+            try:
+                callback(batch)
+            except Exception as e:
+                logging.error(f'PulseAudio event subscriber failed: {e}')
+
+    def _listen(self, client: pulsectl.Pulse):
+        client.event_mask_set(*PULSE_EVENTS_FACILITIES)
+        client.event_callback_set(self._on_event)
+
+        while self.running:
+            with self.lock:
+                flush_at = self.flush_at
+
+            if flush_at is None:
+                client.event_listen()
+                continue
+
+            timeout = flush_at - monotonic()
+            if timeout > 0:
+                client.event_listen(timeout=timeout)
+            else:
+                self._flush()
+
+    def _run(self):
+        while self.running:
+            try:
+                with self.client_factory() as client:
+                    self.client = client
+                    self._listen(client)
+            except Exception as e:
+                logging.error(f'PulseAudio event listener failed: {e}')
+            finally:
+                self.client = None
+
+            if self.running:
+                logging.warning('PulseAudio event listener disconnected, connecting again...')
+                sleep(PULSE_EVENTS_RECONNECT_DELAY)
+
+
+# Shared by the window and the components that show PulseAudio values
+pulse_events = PulseEventBus()
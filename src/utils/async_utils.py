@@ -1,36 +1,88 @@
-import threading
+import asyncio
+import functools
+import inspect
+import logging
+from typing import Any, Callable, Coroutine, Hashable, Optional
+from .scheduler import scheduler, weak_method, NO_OWNER
 
+# Tasks started with run_task(), asyncio only keeps weak references to them
+_tasks: set = set()
+_glib_event_loop = False
 
-def debounce(wait_time):
-    """
-    Decorator that will debounce a function so that it is called after wait_time seconds
-    If it is called multiple times, will wait for the last call to be debounced and run only this one.
-    See the test_debounce.py file for examples
-    """
 
+def _scheduled(schedule: Callable, seconds: float, key: Optional[Callable[..., Hashable]]):
     def decorator(function):
-        def debounced(*args, **kwargs):
-            def call_function():
-                debounced._timer = None
-                return function(*args, **kwargs)
+        name = function.__qualname__
+        # methods get their own timers for every instance
+        is_method = next(iter(inspect.signature(function).parameters), None) == 'self'
 
-            if debounced._timer is not None:
-                debounced._timer.cancel()
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if is_method:
+                owner, args = args[0], args[1:]
+                func = weak_method(function, owner)
+            else:
+                owner, func = NO_OWNER, function
 
-            debounced._timer = threading.Timer(wait_time, call_function)
-            debounced._timer.start()
+            schedule(owner, (name, key(*args, **kwargs) if key else None), seconds, func, *args, **kwargs)
 
-        debounced._timer = None
-        return debounced
+        return wrapper
 
     return decorator
 
 
-# Used as a decorator to run things in the background
-def _async(func):
-    def wrapper(*args, **kwargs):
-        thread = threading.Thread(target=func, args=args, kwargs=kwargs)
-        thread.daemon = True
-        thread.start()
-        return thread
-    return wrapper
+def debounce(wait_time: float, key: Optional[Callable[..., Hashable]]=None):
+    """
+    Decorator that runs a function on the GLib main loop `wait_time` seconds after its last call, with the arguments of that call.
+    Every instance has its own timer when used on a method, `key` receives the other arguments and
+    splits the timer further, eg. key=lambda device, volume: device.name
+    """
+    return _scheduled(scheduler.debounce, wait_time, key)
+
+
+def setup_event_loop():
+    """
+    Makes asyncio run on the GLib main loop, so coroutines started from GTK callbacks
+    run on the main thread and can touch widgets. Needs PyGObject 3.50
+    """
+    global _glib_event_loop
+
+    try:
+        from gi.events import GLibEventLoopPolicy
+    except ImportError as e:
+        raise RuntimeError('Whisper needs PyGObject 3.50 or later, asyncio can\'t run on the GLib main loop') from e
+
+    asyncio.set_event_loop_policy(GLibEventLoopPolicy())
+    _glib_event_loop = True
+
+
+def run_task(coro: Coroutine, callback: Optional[Callable[[Any], None]]=None) -> asyncio.Task:
+    """
+    Starts a coroutine from a GTK callback, `callback` receives its result on the main thread.
+    Failures are logged, the returned task can be cancelled
+    """
+    if not _glib_event_loop:
+        coro.close()
+        raise RuntimeError('setup_event_loop() has to be called before run_task()')
+
+    task = asyncio.get_event_loop_policy().get_event_loop().create_task(coro)
+    _tasks.add(task)
+
+    def on_done(task: asyncio.Task):
+        _tasks.discard(task)
+
+        if task.cancelled():
+            return
+
+        if task.exception():
+            logging.error(f'Task {coro.__qualname__} failed: {task.exception()!r}')
+        elif callback:
+            callback(task.result())
+
+    task.add_done_callback(on_done)
+    return task
+
+
+def cancel_tasks():
+    for task in list(_tasks):
+        task.cancel()
@@ -0,0 +1,111 @@
+import logging
+import threading
+from typing import Any, Callable, Optional
+
+
+class RefreshWorker():
+    """
+    Runs `build(force)` in a background thread. Requests made while a build is running are coalesced
+    into one more build, `force` is kept if any of them asked for it.
+
+    Results are handed to `on_result` through `dispatch` (eg. GLib.idle_add): if several are waiting
+    for the main loop only the newest one is delivered. `build` returns None when there is nothing to show
+    """
+
+    def __init__(self, build: Callable[[bool], Any], on_result: Callable[[Any], None], dispatch: Callable[[Callable], Any], name='refresh-worker'):
+        self.build = build
+        self.on_result = on_result
+        self.dispatch = dispatch
+        self.name = name
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread: Optional[threading.Thread] = None
+        self.requested = False
+        self.force = False
+        # results are numbered, so that an older one is never delivered after a newer one
+        self.generation = 0
+        self.delivered_generation = 0
+        self.latest: Optional[tuple[int, Any]] = None
+        # the waiting result was built with force, the next build keeps it
+        self.latest_force = False
+
+    def start(self):
+        with self.condition:
+            if self.running:
+                return
+
+            self.running = True
+
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.latest = None
+            self.latest_force = False
+            self.condition.notify()
+
+    def request(self, force=False):
+        # can be called from any thread
+        with self.condition:
+            self.requested = True
+            self.force = self.force or force
+            self.condition.notify()
+
+    def _next_request(self) -> Optional[bool]:
+        # waits for a request, returns its force flag or None when the worker is stopped
+        with self.condition:
+            while self.running and not self.requested:
+                self.condition.wait()
+
+            if not self.running:
+                return None
+
+            # a forced result that did not reach the main loop yet must not be replaced by a plain one
+            force = self.force or self.latest_force
+            self.requested = False
+            self.force = False
+            return force
+
+    def _run(self):
+        while True:
+            force = self._next_request()
+            if force is None:
+                return
+
+            try:
+                result = self.build(force)
+            except Exception as e:
+                logging.error(f'{self.name} failed: {e}')
+                continue
+
+            if result is None:
+                # nothing changed since the last render: a result still waiting for the main loop is out of date
+                with self.condition:
+                    self.latest = None
+                    self.latest_force = False
+
+                continue
+
+            with self.condition:
+                if not self.running:
+                    return
+
+                self.generation += 1
+                self.latest = (self.generation, result)
+                self.latest_force = force
+
+            self.dispatch(self._deliver)
+
+    def _deliver(self):
+        # on the main loop
+        with self.condition:
+            latest, self.latest = self.latest, None
+            self.latest_force = False
+
+        if latest and latest[0] > self.delivered_generation:
+            self.delivered_generation = latest[0]
+            self.on_result(latest[1])
+
+        return False
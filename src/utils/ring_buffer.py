@@ -0,0 +1,50 @@
+from array import array
+from typing import Iterator
+
+
+class RingBuffer():
+    """
+    Keeps the last `size` numbers in a preallocated array: appending never allocates.
+    `typecode` is the one of the array module, 'd' for floats and 'q' for integers
+    """
+
+    __slots__ = ('values', 'size', 'count', 'start')
+
+    def __init__(self, size: int, typecode: str='d'):
+        self.values = array(typecode, [0]) * size
+        self.size = size
+        self.count = 0
+        # index of the oldest value
+        self.start = 0
+
+    def append(self, value):
+        if self.count < self.size:
+            self.values[(self.start + self.count) % self.size] = value
+            self.count += 1
+        else:
+            self.values[self.start] = value
+            self.start = (self.start + 1) % self.size
+
+    def clear(self):
+        self.count = 0
+        self.start = 0
+
+    def last(self, default=None):
+        if not self.count:
+            return default
+
+        return self.values[(self.start + self.count - 1) % self.size]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator:
+        # oldest first
+        end = self.start + self.count
+        if end <= self.size:
+            return iter(self.values[self.start:end])
+
+        return iter(self.values[self.start:] + self.values[:end - self.size])
+
+    def to_list(self) -> list:
+        return list(self)
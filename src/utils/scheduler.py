@@ -0,0 +1,199 @@
+import functools
+import heapq
+import logging
+import weakref
+from typing import Any, Callable, Hashable, Optional
+
+
+class _Timer():
+    __slots__ = ('seconds', 'func', 'args', 'kwargs', 'pending', 'repeat', 'source_id')
+
+    def __init__(self, seconds: float, func: Callable, args: tuple, kwargs: dict, pending=True, repeat=False):
+        self.seconds = seconds
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        # the function has to run when the timer fires
+        self.pending = pending
+        # throttle timers keep going for another period after running
+        self.repeat = repeat
+        self.source_id: Optional[int] = None
+
+
+class _NoOwner():
+    # timers of plain functions, object() can't be weakly referenced
+    pass
+
+
+NO_OWNER = _NoOwner()
+
+
+class TimerScheduler():
+    """
+    Runs functions later on the GLib main loop, it has to be called from the main loop too.
+
+    Every timer belongs to an owner (eg. a widget) and a key: scheduling again with the same owner and key
+    changes the pending timer, different owners never share one. cancel(owner) drops the timers of an owner,
+    eg. when its widget goes away; owners are weakly referenced.
+
+    `timers` provides timeout_add(ms, callback) and source_remove(id): GLib by default, ManualTimers
+    to run them with a fake clock
+    """
+
+    def __init__(self, timers=None):
+        self._timers = timers
+        self.owners: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    def debounce(self, owner, key: Hashable, seconds: float, func: Callable, *args, **kwargs):
+        # runs `seconds` after the last call, with its arguments
+        self.cancel(owner, key)
+        self._start(owner, key, _Timer(seconds, func, args, kwargs))
+
+    def throttle(self, owner, key: Hashable, seconds: float, func: Callable, *args, **kwargs):
+        # runs right away, then at most once every `seconds` with the arguments of the last call
+        timer = self._timers_of(owner).get(key)
+
+        if timer:
+            timer.func, timer.args, timer.kwargs = func, args, kwargs
+            timer.pending = True
+            return
+
+        self._start(owner, key, _Timer(seconds, func, args, kwargs, pending=False, repeat=True))
+        self._call(func, args, kwargs)
+
+    def delay(self, owner, key: Hashable, seconds: float, func: Callable, *args, **kwargs):
+        # runs `seconds` after the first call, with the arguments of the last one
+        timer = self._timers_of(owner).get(key)
+
+        if timer:
+            timer.func, timer.args, timer.kwargs = func, args, kwargs
+            return
+
+        self._start(owner, key, _Timer(seconds, func, args, kwargs))
+
+    def is_pending(self, owner, key: Hashable) -> bool:
+        timers = self.owners.get(owner)
+        timer = timers.get(key) if timers else None
+        return bool(timer and timer.pending)
+
+    def cancel(self, owner, key: Optional[Hashable]=None):
+        # cancels one timer of the owner, or all of them without a key
+        timers = self.owners.get(owner)
+        if not timers:
+            return
+
+        for k in ([key] if key is not None else list(timers)):
+            timer = timers.pop(k, None)
+            if timer and timer.source_id is not None:
+                self._backend().source_remove(timer.source_id)
+
+        if not timers:
+            self.owners.pop(owner, None)
+
+    def _backend(self):
+        if self._timers is None:
+            from gi.repository import GLib
+            self._timers = GLib
+
+        return self._timers
+
+    def _timers_of(self, owner) -> dict[Hashable, _Timer]:
+        timers = self.owners.get(owner)
+
+        if timers is None:
+            timers = self.owners[owner] = {}
+
+        return timers
+
+    def _start(self, owner, key: Hashable, timer: _Timer):
+        self._timers_of(owner)[key] = timer
+        self._add_source(weakref.ref(owner), key, timer)
+
+    def _add_source(self, owner_ref: weakref.ref, key: Hashable, timer: _Timer):
+        timer.source_id = self._backend().timeout_add(max(int(timer.seconds * 1000), 0), lambda: self._fire(owner_ref, key, timer))
+
+    def _fire(self, owner_ref: weakref.ref, key: Hashable, timer: _Timer) -> bool:
+        owner = owner_ref()
+        timers = self.owners.get(owner) if owner is not None else None
+
+        # the owner went away or the timer was cancelled
+        if timers is None or timers.get(key) is not timer:
+            return False
+
+        run = timer.pending
+
+        if timer.repeat and run:
+            timer.pending = False
+            self._add_source(owner_ref, key, timer)
+        else:
+            timer.source_id = None
+            self.cancel(owner, key)
+
+        if run:
+            self._call(timer.func, timer.args, timer.kwargs)
+
+        # GLib removes the source, a new one was added if needed
+        return False
+
+    def _call(self, func: Callable, args: tuple, kwargs: dict):
+        try:
+            func(*args, **kwargs)
+        except Exception as e:
+            logging.error(f'Scheduled {getattr(func, "__qualname__", func)} failed: {e!r}')
+
+
+def weak_method(function: Callable, owner) -> Callable:
+    # calls function(owner, ...) while the owner is alive, so that a pending timer doesn't keep it around
+    owner_ref = weakref.ref(owner)
+
+    @functools.wraps(function)
+    def call(*args, **kwargs):
+        owner = owner_ref()
+        if owner is not None:
+            function(owner, *args, **kwargs)
+
+    return call
+
+
+class ManualTimers():
+    """
+    Stands in for GLib.timeout_add and GLib.source_remove: time only goes on with advance(),
+    timers run in order of expiry, so timing can be checked without a main loop
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.next_id = 1
+        # [(expiry, id, interval, callback)]
+        self.queue: list[tuple[float, int, float, Callable[[], Any]]] = []
+        self.removed: set[int] = set()
+
+    def timeout_add(self, interval_ms: int, callback: Callable[[], Any]) -> int:
+        source_id = self.next_id
+        self.next_id += 1
+        heapq.heappush(self.queue, (self.now + interval_ms / 1000, source_id, interval_ms / 1000, callback))
+        return source_id
+
+    def source_remove(self, source_id: int):
+        self.removed.add(source_id)
+
+    def advance(self, seconds: float):
+        until = self.now + seconds
+
+        while self.queue and self.queue[0][0] <= until:
+            expiry, source_id, interval, callback = heapq.heappop(self.queue)
+            self.now = expiry
+
+            if source_id in self.removed:
+                self.removed.discard(source_id)
+                continue
+
+            # a callback that returns True runs again like in GLib
+            if callback():
+                heapq.heappush(self.queue, (expiry + interval, source_id, interval, callback))
+
+        self.now = until
+
+
+# Shared by the decorators in async_utils and the widgets
+scheduler = TimerScheduler()
@@ -0,0 +1,169 @@
+import os
+import json
+import inspect
+import logging
+import functools
+import itertools
+import threading
+from time import perf_counter_ns
+from typing import Optional
+
+# Set to a file path to record a trace, it is written when the app quits.
+# The file uses the Chrome trace format: open it in https://ui.perfetto.dev or chrome://tracing
+TRACE_ENV = 'WHISPER_TRACE'
+TRACE_MAX_EVENTS = 500_000
+
+_enabled = False
+_trace_path: Optional[str] = None
+_events: list[dict] = []
+_events_lock = threading.Lock()
+_async_ids = itertools.count(1)
+_start_ns = perf_counter_ns()
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def enable(path: str):
+    global _enabled, _trace_path
+
+    _trace_path = path
+    _enabled = True
+    logging.info(f'Tracing enabled, the trace will be written to {path}')
+
+
+def _now_us() -> float:
+    return (perf_counter_ns() - _start_ns) / 1000
+
+
+def _add_event(event: dict):
+    with _events_lock:
+        if len(_events) < TRACE_MAX_EVENTS:
+            _events.append(event)
+
+
+class _Span():
+    __slots__ = ('name', 'cat', 'args', 'is_async', 'start')
+
+    def __init__(self, name: str, cat: str, args: dict, is_async: bool):
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.is_async = is_async
+        self.start = 0.0
+
+    def set(self, **args):
+        # adds arguments once they are known, eg. an exit code
+        self.args.update(args)
+
+    def __enter__(self):
+        self.start = _now_us()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = _now_us()
+
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+
+        event = {'name': self.name, 'cat': self.cat, 'pid': os.getpid(), 'tid': threading.get_ident(), 'args': self.args}
+
+        if self.is_async:
+            # awaited spans overlap each other on the main thread, they get their own track
+            span_id = next(_async_ids)
+            _add_event({**event, 'ph': 'b', 'id': span_id, 'ts': self.start})
+            _add_event({'name': self.name, 'cat': self.cat, 'pid': event['pid'], 'tid': event['tid'], 'ph': 'e', 'id': span_id, 'ts': end})
+        else:
+            _add_event({**event, 'ph': 'X', 'ts': self.start, 'dur': end - self.start})
+
+        return False
+
+
+class _NoopSpan():
+    __slots__ = ()
+
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str, cat: str='whisper', is_async=False, **args):
+    """
+    Times a block: `with tracing.span('pw-dump', command=...) as s: ... s.set(exit_code=0)`.
+    Spans opened inside it are nested under it. Use is_async=True for blocks that await
+    """
+    if not _enabled:
+        return _NOOP_SPAN
+
+    return _Span(name, cat, args, is_async)
+
+
+def traced(name: Optional[str]=None, cat: str='whisper'):
+    # decorator version of span(), coroutines get async spans
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not _enabled:
+                    return await func(*args, **kwargs)
+
+                with _Span(span_name, cat, {}, True):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+
+            with _Span(span_name, cat, {}, False):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def instant(name: str, cat: str='whisper', **args):
+    if _enabled:
+        _add_event({'name': name, 'cat': cat, 'ph': 'i', 's': 't', 'ts': _now_us(), 'pid': os.getpid(), 'tid': threading.get_ident(), 'args': args})
+
+
+def get_trace() -> dict:
+    with _events_lock:
+        events = list(_events)
+
+    pid = os.getpid()
+    thread_names = [
+        {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': t.ident, 'args': {'name': t.name}}
+        for t in threading.enumerate()
+    ]
+
+    return {'traceEvents': thread_names + events, 'displayTimeUnit': 'ms'}
+
+
+def write(path: Optional[str]=None):
+    path = path or _trace_path
+    if not (_enabled and path):
+        return
+
+    with open(path, 'w') as f:
+        json.dump(get_trace(), f)
+
+    logging.info(f'Trace written to {path} ({len(_events)} events)')
+
+
+if os.environ.get(TRACE_ENV):
+    enable(os.environ[TRACE_ENV])
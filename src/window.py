@@ -17,16 +17,27 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from .pipewire.pipewire import Pipewire, PwLink, PwLowLatencyNode, LOW_LATENCY_NODE_NAME
+from .pipewire.pipewire import Pipewire, PwLink, PwLowLatencyNode, PwOperation, LOW_LATENCY_NODE_NAME
+from .pipewire.snapshot import pw_snapshot, PwGraphSnapshot
+from .pipewire.async_pipewire import AsyncPipewire
+from .pipewire.monitor import PwGraphMonitor, PwGraphChange
+from .pipewire.device_links import ActiveConnection, ActiveConnectionsModel, diff_connections, group_device_links
+from .pipewire.graph import PwGraph
+from .pipewire.latency_tuner import latency_tuner
+from .pipewire.node_pool import low_latency_pool
+from .pipewire.shared_nodes import shared_low_latency_nodes
 from .components.PwActiveConnectionBox import PwActiveConnectionBox
 from .components.NoLinksPlaceholder import NoLinksPlaceholder
 from .components.PwConnectionBox import PwConnectionBox
-from .utils import async_utils
-from .utils.utils import link_output_input, array_diff
+from .utils import async_utils, tracing
+from .utils.refresh_worker import RefreshWorker
+from .utils.scheduler import scheduler
+from .pulseaudio.events import pulse_events, PulseEventBatch
+from .pulseaudio.client import pulse_client, PulseDevice, PulseDevices
 from typing import Optional
+import asyncio
 import json
 import pprint
-import threading
 import pulsectl
 import logging
 import json
@@ -40,13 +51,6 @@ gi.require_version('Adw', '1')
 from gi.repository import Adw, Gtk, Gio, GLib  # noqa: E402
 
 
-class DeviceLink:
-    def __init__(self, input_device, output_device, link_id):
-        self.link_id: str = link_id
-        self.input_device: PwLink = input_device
-        self.output_device: PwLink = output_device
-
-
 class WhisperWindow(Gtk.ApplicationWindow):
     __gtype_name__ = 'WhisperWindow'
 
@@ -55,8 +59,7 @@ class WhisperWindow(Gtk.ApplicationWindow):
         self.settings: Gio.Settings = Gio.Settings.new('it.mijorus.whisper')
         self.settings.connect('changed', self.on_settings_changed)
         self.settings.set_boolean('stand-by', False)
-        
-        self.is_changing_volume = False
+
 
         self.titlebar = Adw.HeaderBar()
         self.titlebar_title = Adw.WindowTitle(title='Whisper')
@@ -73,7 +76,7 @@ class WhisperWindow(Gtk.ApplicationWindow):
         self.set_titlebar(self.titlebar)
         self.viewport = Gtk.Box(halign=Gtk.Align.CENTER, orientation=Gtk.Orientation.VERTICAL, spacing=30, margin_top=20, width_request=500)
 
-        self.rendered_links = []
+        self.rendered_links: set[int] = set()
         self.manually_created_links = []
 
         self.auto_refresh = False
@@ -91,8 +94,7 @@ class WhisperWindow(Gtk.ApplicationWindow):
         pw_installed = Pipewire.check_installed()
         logging.info('Pipewire is installed: ' + str(pw_installed))
 
-        # Start a thread to log
-        threading.Thread(target=self._startup_logs, daemon=False).start()
+        async_utils.run_task(self._startup_logs())
 
         if (not pw_installed) or (not pulse_connection_ok):
             box = Gtk.Box(valign=Gtk.Align.CENTER, orientation=Gtk.Orientation.VERTICAL, spacing=5, vexpand=True)
@@ -114,16 +116,29 @@ class WhisperWindow(Gtk.ApplicationWindow):
             self.connection_box_slot.append(self.connection_box)
             self.viewport.append(self.connection_box_slot)
 
+            latency_tuner.load(GLib.get_user_data_dir() + '/low_latency.json')
+            low_latency_pool.set_size(self.settings.get_int('low-latency-pool-size'))
+
             self.active_connections_list = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=30)
             self.active_connection_boxes: list[PwActiveConnectionBox] = []
+            # the same boxes by (mic, speaker), in the order they are shown
+            self.connection_boxes_by_key: dict[tuple[str, str], PwActiveConnectionBox] = {}
             self.viewport.append(self.active_connections_list)
 
             self.nolinks_placeholder = NoLinksPlaceholder(visible=False)
             self.viewport.append(self.nolinks_placeholder)
+
+            # Pipewire is only queried outside of the main loop
+            self.refresh_worker = RefreshWorker(self.build_active_connections, self.on_active_connections_built, GLib.idle_add)
+            self.refresh_worker.start()
             self.refresh_active_connections(force_refresh=True)
 
-            self.pulse_listener: Optional[pulsectl.Pulse] = None
-            threading.Thread(target=self.create_pulse_events_listener).start()
+            self.graph_monitor = PwGraphMonitor()
+            self.graph_monitor.subscribe(self.on_graph_changes)
+            self.graph_monitor.start()
+
+            # on_pulse_events checks the graph monitor, it must exist before the first batch
+            pulse_events.subscribe(self.on_pulse_events)
 
             self.connect('close-request', self.on_close_request)
 
@@ -139,31 +154,24 @@ class WhisperWindow(Gtk.ApplicationWindow):
 
         return None
 
-    def _startup_logs(self):
-        logging.info(Pipewire.get_info_raw())
+    async def _startup_logs(self):
+        info, graph = await asyncio.gather(AsyncPipewire.get_info_raw(), AsyncPipewire.get_graph())
+        logging.info(info)
 
         logging.info('=======Listing outputs=======')
-        for k, v in Pipewire.list_outputs().items():
-            logging.info(f'Pipewire output {k}: ' + pprint.pformat(v.__dict__))
+        for k, v in (await AsyncPipewire.list_outputs(graph=graph)).items():
+            logging.info(f'Pipewire output {k}: ' + pprint.pformat({a: getattr(v, a) for a in v.__slots__}))
 
         logging.info('=======Listing inputs=======')
-        for k, v in Pipewire.list_inputs().items():
-            logging.info(f'Pipewire input {k}: ' + pprint.pformat(v.__dict__))
+        for k, v in (await AsyncPipewire.list_inputs(graph=graph)).items():
+            logging.info(f'Pipewire input {k}: ' + pprint.pformat({a: getattr(v, a) for a in v.__slots__}))
 
         logging.info('=======Listing active links=======')
-        for k, v in Pipewire.list_links().items():
+        for k, v in (await AsyncPipewire.list_links(graph=graph)).items():
             for kk, vv in v.items():
-                logging.info(f'Pipewire link {k}: ' + pprint.pformat(vv.__dict__))
-
-    def _is_supported_device(self, pw_list: dict[str, PwLink], link_id) -> Optional[PwLink]:
-        for d, dev in pw_list.items():
-            if (link_id in dev.channels) and (dev.alsa.startswith('alsa:') \
-                or dev.resource_name.startswith('bluez_output')) or \
-                LOW_LATENCY_NODE_NAME in dev.resource_name:
-                return dev
-
-        return None
+                logging.info(f'Pipewire link {k}: ' + pprint.pformat({a: getattr(vv, a) for a in vv.__slots__}))
 
+    @tracing.traced('create_connection_box')
     def create_connection_box(self):
         pw_connection_box = PwConnectionBox()
         pw_connection_box.connect('new_connection', self.on_new_connection)
@@ -177,171 +185,162 @@ class WhisperWindow(Gtk.ApplicationWindow):
 
             self.connection_box = self.create_connection_box()
             self.connection_box_slot.append(self.connection_box)
+        elif key == 'low-latency-pool-size':
+            self.update_low_latency_pool_size()
 
-    def pulse_event_listener_unsubscribe(self):
-        if self.pulse_listener is not None:
-            logging.debug('Stopping event listener...')
-            self.pulse_listener.event_listen_stop()
-            self.pulse_listener.close()
-            self.pulse_listener = None
+    # every step of the spin button would create or destroy nodes
+    @async_utils.debounce(0.5)
+    def update_low_latency_pool_size(self):
+        low_latency_pool.set_size(self.settings.get_int('low-latency-pool-size'))
 
-            try:
-                raise pulsectl.PulseLoopStop()
-            except pulsectl.PulseLoopStop as e:
-                logging.debug('PulseAudio event listener unsubscribed')
+    def on_pulse_events(self, batch: PulseEventBatch):
+        # called from the PulseAudio event thread, once for all the events of a short interval
+        # Pipewire changes are tracked by the graph monitor, this is only a fallback
+        if (batch.devices or batch.server) and not self.graph_monitor.is_running():
+            pw_snapshot.invalidate()
+            self.refresh_active_connections()
 
-    def pulse_event_listener(self, ev):
-        if self.is_changing_volume:
-            return
+        # our own volume writes come back as events too
+        sinks = [i for i in batch.sinks if not pulse_client.is_echo('sink', i)]
+        sources = [i for i in batch.sources if not pulse_client.is_echo('source', i)]
 
-        if ev.t == 'change':
-            logging.debug(msg=f'PulseAudio event: change')
-            self.pulse_event_listener_unsubscribe()
+        if sinks or sources or batch.devices:
+            self.refresh_active_connections_volumes()
 
-            GLib.idle_add(self.refresh_active_connections)
-            GLib.idle_add(self.refresh_active_connections_volumes)
+    def watch_pulse_devices(self):
+        # only the sinks and sources behind the active connections are worth a refresh
+        pulse_events.watch(
+            sinks={b.pa_sink.index for b in self.active_connection_boxes if b.pa_sink},
+            sources={b.pa_source.index for b in self.active_connection_boxes if b.pa_source}
+        )
+
+    def on_graph_changes(self, changes: list[PwGraphChange]):
+        # called from the monitor thread
+        logging.debug(f'Pipewire graph changes: {changes}')
+        pw_snapshot.invalidate()
+        self.refresh_active_connections()
 
-            self.create_pulse_events_listener()
+    def pulse_change_volume(self, ev, device: PulseDevice, volume):
+        pulse_client.set_volume(device, volume / 100)
 
-    def pulse_change_volume(self, ev, sink, volume):
-        if not self.pulse_listener:
-            return
+    def refresh_active_connections(self, force_refresh=False):
+        # can be called from any thread, the graph is read by the refresh worker
+        self.refresh_worker.request(force_refresh)
 
-        self.is_changing_volume = True
-        with pulsectl.Pulse() as pulse_client:
-            pulse_client.volume_set_all_chans(sink, (volume / 100))
-            self.is_changing_volume = False
+    @tracing.traced('build_active_connections')
+    def build_active_connections(self, force_refresh: bool) -> Optional[ActiveConnectionsModel]:
+        # runs in the refresh worker thread, returns None if the links on screen are still the same
+        if force_refresh:
+            pw_snapshot.invalidate()
 
-    # @async_utils._async
-    # def create_pw_top_listener():
+        # links and devices are all read from this graph, the snapshot may be refreshed in the meantime
+        graph = pw_snapshot.graph(quiet=(not force_refresh))
+        list_links = Pipewire.list_links(graph=graph)
 
-    @async_utils._async
-    def create_pulse_events_listener(self):
-        self.pulse_event_listener_unsubscribe()
+        new_links_to_render = set()
+        for l, link in list_links.items():
+            new_links_to_render.update(link)
 
-        logging.debug(msg=f'Creating PulseAudio event listener')
-        with pulsectl.Pulse('whisper-event-listen') as listener:
-            self.pulse_listener = listener
-            self.pulse_listener.event_mask_set('sink')
-            self.pulse_listener.event_callback_set(self.pulse_event_listener)
-            self.pulse_listener.event_listen(raise_on_disconnect=False)
+        if (not force_refresh) and (self.rendered_links == new_links_to_render):
+            return None
 
-    def refresh_active_connections(self, force_refresh=False):
-        list_links = Pipewire.list_links(quiet=(not force_refresh))
+        outputs_by_port = PwGraphSnapshot.index_by_port(Pipewire.list_outputs(graph=graph))
+        inputs_by_port = PwGraphSnapshot.index_by_port(Pipewire.list_inputs(graph=graph))
+        device_links, new_links_to_render = group_device_links(list_links, outputs_by_port.get, inputs_by_port.get)
 
-        new_links_to_render = []
-        for l, link in list_links.items():
-            for i, link_info in link.items():
-                new_links_to_render.append(i)
-
-        if force_refresh or array_diff(self.rendered_links, new_links_to_render):
-            logging.info('Refreshing active connections')
-
-            # recheck if there are new links
-            inputs = Pipewire.list_inputs()
-            outputs = Pipewire.list_outputs()
-            dump = Pipewire.list_objects()
-
-            j = 1
-            device_links: dict[str, dict] = {}
-
-            # cycle on every active link
-            new_links_to_render = []
-            for l, link in list_links.items():
-                # cycle on every pw output, check if it is an alsa device
-
-                output_device = self._is_supported_device(outputs, l)
-                if output_device:
-                    for i, link_info in link.items():
-                        # cycle on every active link for that output
-                        input_device = self._is_supported_device(inputs, link_info._id)
-                        if input_device:
-                            if not output_device.resource_name in device_links:
-                                device_links[output_device.resource_name] = {}
-
-                            if not input_device.resource_name in device_links[output_device.resource_name]:
-                                
-                                if LOW_LATENCY_NODE_NAME in input_device.resource_name:
-                                    device_links[output_device.resource_name][input_device.resource_name] = {
-                                        'device_link': DeviceLink(None, output_device, -1),
-                                        'low_latency_node': True,
-                                        'link_ids': []
-                                    }
-                                else:
-                                    device_links[output_device.resource_name][input_device.resource_name] = {
-                                        'device_link': DeviceLink(input_device, output_device, 0),
-                                        'low_latency_node': False,
-                                        'link_ids': []
-                                    }
-
-                            device_links[output_device.resource_name][input_device.resource_name]['link_ids'].append(i)
-                            new_links_to_render.append(i)
-
-            if (not force_refresh) and (not array_diff(self.rendered_links, new_links_to_render)):
-                return
+        if (not force_refresh) and (self.rendered_links == new_links_to_render):
+            return None
 
-            for b in self.active_connection_boxes:
-                self.active_connections_list.remove(b)
+        connections = self.get_active_connections(device_links, graph)
+        return ActiveConnectionsModel(tuple(connections), frozenset(new_links_to_render), graph, force=force_refresh)
 
-            self.active_connection_boxes = []
-            self.rendered_links = []
-            
-            for output_device_resource_name, connected_devices in device_links.items():
-
-                low_latency_nodes = {}
-                connected_devices_without_lln = {}
-
-                for d, dev in connected_devices.items():
-                    if dev['low_latency_node']:
-                        low_latency_nodes[d] = dev
-                    else:
-                        connected_devices_without_lln[d] = dev
-
-                for d, dev in connected_devices_without_lln.items():
-                    is_manually_created = False
-
-                    for manually_created_link in self.manually_created_links:
-                        if manually_created_link['output'] == dev['device_link'].output_device.resource_name and \
-                                manually_created_link['input'] == dev['device_link'].input_device.resource_name:
-                            is_manually_created = True
-                            break
-
-                    lln = None
-                    for n, lln in low_latency_nodes.items():
-                        ddev: DeviceLink = lln['device_link']
-                        
-                        if ddev.output_device.resource_name == dev['device_link'].output_device.resource_name:
-                            node = Pipewire.find_node_by_name(dump, n)
-                            lln = PwLowLatencyNode(node['id'], node['info']['props']['node.name'])
-
-                    box = PwActiveConnectionBox(
-                        link_ids=dev['link_ids'],
-                        initial_lln=lln,
-                        connection_name=f'Connection #{j}',
-                        output_link=dev['device_link'].output_device,
-                        input_link=dev['device_link'].input_device,
-                        has_manual_link_indicator=is_manually_created,
-                        show_link_ids=self.settings.get_boolean('show-connection-ids')
-                    )
-
-                    box.connect('disconnect', self.on_disconnect_btn_clicked)
-                    box.connect('change-volume', self.pulse_change_volume)
-
-                    self.rendered_links.extend(dev['link_ids'])
-                    self.active_connection_boxes.append(box)
-                    self.active_connections_list.append(box)
-
-                    j += 1
-
-            active_links = []
-            for l in self.active_connections_list:
-                active_links.append({'input': l.input_link.resource_name, 'output': l.output_link.resource_name})
+    def on_active_connections_built(self, model: ActiveConnectionsModel):
+        logging.info('Refreshing active connections')
+        self.render_active_connections(model)
+        self.rendered_links = model.link_ids
+        self.refresh_active_connections_volumes()
+        self.nolinks_placeholder.set_visible(not self.active_connection_boxes)
+
+    def get_active_connections(self, device_links: dict[str, dict[str, dict]], graph: PwGraph) -> list[ActiveConnection]:
+        connections = []
+        # the list is changed on the main loop
+        manually_created_links = list(self.manually_created_links)
+
+        for output_device_resource_name, connected_devices in device_links.items():
+            low_latency_nodes = []
+            connected_devices_without_lln = {}
+
+            for d, dev in connected_devices.items():
+                node = graph.node_by_name(d) if dev['low_latency_node'] else None
+
+                if node:
+                    low_latency_nodes.append(PwLowLatencyNode(node.id, node.name))
+                elif not dev['low_latency_node']:
+                    connected_devices_without_lln[d] = dev
+
+            # every connection of the mic shares the same node
+            shared_lln = shared_low_latency_nodes.sync(output_device_resource_name, low_latency_nodes, list(connected_devices_without_lln))
+
+            for d, dev in connected_devices_without_lln.items():
+                is_manually_created = False
+
+                for manually_created_link in manually_created_links:
+                    if manually_created_link['output'] == output_device_resource_name and manually_created_link['input'] == d:
+                        is_manually_created = True
+                        break
+
+                connections.append(ActiveConnection(
+                    output_device=dev['device_link'].output_device,
+                    input_device=dev['device_link'].input_device,
+                    link_ids=dev['link_ids'],
+                    low_latency_node=shared_lln if shared_low_latency_nodes.is_user(output_device_resource_name, d) else None,
+                    manually_created=is_manually_created
+                ))
+
+        return connections
+
+    @tracing.traced('render_active_connections')
+    def render_active_connections(self, model: ActiveConnectionsModel):
+        # only the boxes of the connections that appeared or went away are created or removed, the others are patched
+        added, removed, kept = diff_connections(self.connection_boxes_by_key, model.connections)
+        show_link_ids = self.settings.get_boolean('show-connection-ids')
+
+        with tracing.span('remove connection boxes', cat='widgets', count=len(removed)):
+            for key in removed:
+                self.active_connections_list.remove(self.connection_boxes_by_key.pop(key))
+
+        kept_by_key = {c.key: c for c in kept}
+        for j, (key, box) in enumerate(self.connection_boxes_by_key.items(), start=1):
+            box.update(kept_by_key[key], f'Connection #{j}', show_link_ids, model.graph)
+
+        for c in added:
+            with tracing.span('PwActiveConnectionBox', cat='widgets', links=len(c.link_ids)):
+                box = PwActiveConnectionBox(
+                    link_ids=c.link_ids,
+                    initial_lln=c.low_latency_node,
+                    connection_name=f'Connection #{len(self.connection_boxes_by_key) + 1}',
+                    output_link=c.output_device,
+                    input_link=c.input_device,
+                    has_manual_link_indicator=c.manually_created,
+                    show_link_ids=show_link_ids,
+                    graph=model.graph
+                )
+
+            box.connect('disconnect', self.on_disconnect_btn_clicked)
+            box.connect('change-volume', self.pulse_change_volume)
+            box.connect('low-latency-change', lambda *_: self.refresh_active_connections())
+
+            self.connection_boxes_by_key[c.key] = box
+            self.active_connections_list.append(box)
+
+        self.active_connection_boxes = list(self.connection_boxes_by_key.values())
+
+        if model.force or added or removed:
+            active_links = [{'input': b.input_link.resource_name, 'output': b.output_link.resource_name} for b in self.active_connection_boxes]
 
             with open(GLib.get_user_data_dir() + '/last_connections.json', 'w+') as f:
                 f.write(json.dumps(active_links))
 
-        self.nolinks_placeholder.set_visible(not self.active_connection_boxes)
-
     def on_new_connection(self, widget, output_id, input_id):
         self.manually_created_links.append({
             'output': output_id,
@@ -350,14 +349,16 @@ class WhisperWindow(Gtk.ApplicationWindow):
 
         self.refresh_active_connections()
 
-    def on_disconnect_btn_clicked(self, event, link_ids: list[str], output_link: PwLink, input_link: PwLink, low_latency_node: PwLowLatencyNode=None):
-        for l in link_ids:
-            Pipewire.unlink(l)
+    def on_disconnect_btn_clicked(self, event, link_ids: list[int], output_link: PwLink, input_link: PwLink, low_latency_node: PwLowLatencyNode=None):
+        operations = [PwOperation('unlink', l) for l in link_ids]
 
         if low_latency_node:
-            Pipewire.destroy_node(low_latency_node)
+            # only the last connection of the mic destroys the node
+            operations.extend(shared_low_latency_nodes.release_operations(output_link.resource_name, input_link.resource_name))
 
+        async_utils.run_task(AsyncPipewire.run_batch(operations), lambda _: self.on_disconnected(output_link, input_link))
 
+    def on_disconnected(self, output_link: PwLink, input_link: PwLink):
         for i, l in enumerate(self.manually_created_links):
             if l['output'] == output_link.resource_name and l['input'] == input_link.resource_name:
                 del self.manually_created_links[i]
@@ -365,59 +366,63 @@ class WhisperWindow(Gtk.ApplicationWindow):
 
         self.refresh_active_connections()
 
-    @async_utils.debounce(0.5)
     def refresh_active_connections_volumes(self):
+        # can be called from any thread, every box is refreshed with a single read of the sinks and sources
+        pulse_client.refresh(lambda devices: GLib.idle_add(self.on_pulse_devices, devices))
+
+    def on_pulse_devices(self, devices: PulseDevices):
         if self.active_connection_boxes:
             logging.info('Refreshing active connections volumes')
             for b in self.active_connection_boxes:
-                b.refresh_volume_levels()
-                # pass
+                b.refresh_volume_levels(devices)
 
-        if not self.pulse_listener:
-            self.create_pulse_events_listener()
+        self.watch_pulse_devices()
+        return False
 
     def on_refresh_button_clicked(self, _):
+        pw_snapshot.invalidate()
         self.connection_box_slot.remove(self.connection_box)
         self.connection_box = self.create_connection_box()
         self.connection_box_slot.append(self.connection_box)
 
         self.refresh_active_connections(force_refresh=True)
-        self.create_pulse_events_listener()
 
     def start_with_config(self, config: list):
         if not self.settings.get_boolean('load-last-config'):
             return
 
-        def countdown():
+        async def countdown():
             title = self.titlebar_title.get_title()
 
             i = 5
             while i != 0:
                 print('Reloading configuration in ' + str(i) + ' seconds...')
-                GLib.idle_add(lambda: self.titlebar_title.set_title(_('Reloading last connections in {0} seconds...'.format(i))))
+                self.titlebar_title.set_title(_('Reloading last connections in {0} seconds...'.format(i)))
 
-                time.sleep(1)
+                await asyncio.sleep(1)
                 i -= 1
 
-            GLib.idle_add(lambda: self.titlebar_title.set_title(title))
+            self.titlebar_title.set_title(title)
 
             if self.settings.get_boolean('stand-by'):
                 return
 
             self.settings.set_boolean('stand-by', True)
+            graph = await AsyncPipewire.get_graph()
+
             for link in config:
                 try:
                     logging.info('Resuming link ' + str(link))
-                    link_output_input(link['output'], link['input'])
+                    await AsyncPipewire.link_devices(link['output'], link['input'], graph=graph)
                 except Exception as e:
                     logging.warn(str(link) + ' is not linkable (devices might be disconnected)')
 
-            time.sleep(1)
+            await asyncio.sleep(1)
             self.settings.set_boolean('stand-by', False)
             self.refresh_active_connections(force_refresh=True)
             self.refresh_active_connections_volumes()
 
-        t = threading.Thread(target=countdown, daemon=False).start()
+        async_utils.run_task(countdown())
 
         with open(GLib.get_user_data_dir() + '/last_connections.json', 'w+') as f:
             f.write('[]')
@@ -425,30 +430,41 @@ class WhisperWindow(Gtk.ApplicationWindow):
     def on_close_request(self, event):
         print('Closing...')
 
+        operations = []
+
         if self.settings.get_boolean('release-links-on-quit'):
-            try:
-                for connection_box in self.active_connection_boxes:
-                    for manually_created_link in self.manually_created_links:
-                        if manually_created_link['output'] == connection_box.output_link.resource_name and \
-                                manually_created_link['input'] == connection_box.input_link.resource_name:
-                            connection_box.on_disconnect_btn_clicked(None)
-            except:
-                pass
-
-        dump = Pipewire.list_objects()
-
-        for obj in dump:
-            if obj['type'] == 'PipeWire:Interface:Node' and \
-                'info' in obj and \
-                'props' in obj['info'] and \
-                'node.name' in obj['info']['props'] and \
-                LOW_LATENCY_NODE_NAME in obj['info']['props']['node.name']:
-
-                node = PwLowLatencyNode(obj['id'], obj['info']['props']['node.name'])
-                Pipewire.destroy_node(node)
+            for connection_box in self.active_connection_boxes:
+                for manually_created_link in self.manually_created_links:
+                    if manually_created_link['output'] == connection_box.output_link.resource_name and \
+                            manually_created_link['input'] == connection_box.input_link.resource_name:
+                        operations.extend([PwOperation('unlink', l) for l in connection_box.link_ids])
+                        break
+
+        # nothing started from the window should outlive it
+        scheduler.cancel(self)
+        self.refresh_worker.stop()
+        async_utils.cancel_tasks()
+        latency_tuner.stop()
+        # the pool destroys its idle nodes itself
+        pooled = set(low_latency_pool.close())
+
+        # the other low-latency nodes are always released, their links go away with them
+        for node in pw_snapshot.graph().nodes_with_prefix(LOW_LATENCY_NODE_NAME):
+            if node.name not in pooled:
+                operations.append(PwOperation('destroy', node.name))
+
+        try:
+            Pipewire.run_batch(operations)
+        except Exception as e:
+            logging.error(e)
+
+        self.graph_monitor.stop()
+        Pipewire.backend.close()
 
         try:
-            self.pulse_event_listener_unsubscribe()
+            pulse_events.unsubscribe(self.on_pulse_events)
+            pulse_events.stop()
+            pulse_client.close()
         except:
             logging.warn(msg='Error while unsubscribing from pulse events')
         finally:
@@ -0,0 +1,126 @@
+from benchmarks.fixtures import build_backend
+from src.pipewire.device_links import ActiveConnection, diff_connections, group_device_links
+from src.pipewire.pipewire import Pipewire, PwLink, LOW_LATENCY_NODE_NAME
+from src.pipewire.snapshot import PwGraphSnapshot
+
+
+def device(name: str) -> PwLink:
+    dev = PwLink(name)
+    dev.alsa = 'alsa:pcm:0'
+    return dev
+
+
+def connection(output_name: str, input_name: str, link_ids: list[int]) -> ActiveConnection:
+    return ActiveConnection(device(output_name), device(input_name), link_ids)
+
+
+def read_connections(monkeypatch, backend) -> list[ActiveConnection]:
+    # what the refresh worker builds, without the low-latency nodes
+    monkeypatch.setattr(Pipewire, 'backend', backend)
+    monkeypatch.setattr(Pipewire, 'graph_monitor', None)
+
+    graph = Pipewire.get_graph()
+    outputs_by_port = PwGraphSnapshot.index_by_port(Pipewire.list_outputs(graph=graph))
+    inputs_by_port = PwGraphSnapshot.index_by_port(Pipewire.list_inputs(graph=graph))
+    device_links, _ = group_device_links(Pipewire.list_links(graph=graph), outputs_by_port.get, inputs_by_port.get)
+
+    return [
+        ActiveConnection(dev['device_link'].output_device, dev['device_link'].input_device, dev['link_ids'])
+        for connected_devices in device_links.values() for dev in connected_devices.values()
+    ]
+
+
+def test_key():
+    assert connection('mic', 'speaker', [1]).key == ('mic', 'speaker')
+
+
+def test_diff_added_removed_and_kept():
+    old_keys = [('mic-a', 'speaker-a'), ('mic-b', 'speaker-b'), ('mic-c', 'speaker-c')]
+    connections = [
+        connection('mic-b', 'speaker-b', [7, 8]),
+        connection('mic-d', 'speaker-d', [9]),
+        connection('mic-a', 'speaker-a', [1]),
+    ]
+
+    added, removed, kept = diff_connections(old_keys, connections)
+
+    assert [c.key for c in added] == [('mic-d', 'speaker-d')]
+    assert removed == [('mic-c', 'speaker-c')]
+    # in the new order, with the new links
+    assert [c.key for c in kept] == [('mic-b', 'speaker-b'), ('mic-a', 'speaker-a')]
+    assert kept[0].link_ids == [7, 8]
+
+
+def test_diff_same_connections():
+    connections = [connection('mic-a', 'speaker-a', [1]), connection('mic-b', 'speaker-b', [2])]
+    added, removed, kept = diff_connections([c.key for c in connections], connections)
+
+    assert (added, removed) == ([], [])
+    assert kept == connections
+
+
+def test_diff_reads_keys_from_a_dict():
+    # the window passes the boxes on screen, keyed by connection
+    on_screen = {('mic-a', 'speaker-a'): object(), ('mic-b', 'speaker-b'): object()}
+    added, removed, kept = diff_connections(on_screen, [connection('mic-b', 'speaker-b', [2])])
+
+    assert added == []
+    assert removed == [('mic-a', 'speaker-a')]
+    assert [c.key for c in kept] == [('mic-b', 'speaker-b')]
+
+
+def test_keys_are_stable_across_refreshes(monkeypatch):
+    backend = build_backend(20)
+
+    first = read_connections(monkeypatch, backend)
+    second = read_connections(monkeypatch, backend)
+
+    assert first
+    assert [c.key for c in first] == [c.key for c in second]
+
+    added, removed, kept = diff_connections([c.key for c in first], second)
+    assert (added, removed, len(kept)) == ([], [], len(first))
+
+
+def test_diff_of_a_changed_graph(monkeypatch):
+    backend = build_backend(20)
+    old = read_connections(monkeypatch, backend)
+
+    # the first mic is disconnected, the second one is connected to the first speaker too
+    for link_id in old[0].link_ids:
+        backend.unlink(str(link_id))
+
+    Pipewire.link_devices('alsa_input.bench-1.analog-stereo', 'alsa_output.bench-0.analog-stereo')
+    new = read_connections(monkeypatch, backend)
+
+    added, removed, kept = diff_connections([c.key for c in old], new)
+
+    assert [c.key for c in added] == [('alsa_input.bench-1.analog-stereo', 'alsa_output.bench-0.analog-stereo')]
+    assert removed == [('alsa_input.bench-0.analog-stereo', 'alsa_output.bench-0.analog-stereo')]
+    assert [c.key for c in kept] == [c.key for c in old[1:]]
+
+
+def test_low_latency_node_links_are_grouped_apart(monkeypatch):
+    backend = build_backend(4)
+    backend.create_node('adapter', {
+        'factory.name': 'support.null-audio-sink',
+        'node.name': f'{LOW_LATENCY_NODE_NAME}-1',
+        'media.class': 'Audio/Sink',
+        'audio.position': ['FL', 'FR'],
+    })
+    monkeypatch.setattr(Pipewire, 'backend', backend)
+    monkeypatch.setattr(Pipewire, 'graph_monitor', None)
+    Pipewire.link_devices('alsa_input.bench-0.analog-stereo', f'{LOW_LATENCY_NODE_NAME}-1')
+
+    graph = Pipewire.get_graph()
+    outputs_by_port = PwGraphSnapshot.index_by_port(Pipewire.list_outputs(graph=graph))
+    inputs_by_port = PwGraphSnapshot.index_by_port(Pipewire.list_inputs(graph=graph))
+    links = Pipewire.list_links(graph=graph)
+    device_links, grouped = group_device_links(links, outputs_by_port.get, inputs_by_port.get)
+
+    mic = device_links['alsa_input.bench-0.analog-stereo']
+    assert mic[f'{LOW_LATENCY_NODE_NAME}-1']['low_latency_node']
+    assert mic[f'{LOW_LATENCY_NODE_NAME}-1']['device_link'].input_device is None
+    assert not mic['alsa_output.bench-0.analog-stereo']['low_latency_node']
+    assert grouped == {i for port in links.values() for i in port}
+
@@ -0,0 +1,153 @@
+import json
+import pytest
+from benchmarks.fixtures import build_backend
+from src.pipewire import dump_reader
+from src.pipewire.dump_reader import DUMP_READ_SIZE, iter_dump_objects, prune_object, read_dump
+from src.pipewire.graph import PW_TYPE_CORE, PW_TYPE_NODE, PW_TYPE_PORT, PW_TYPE_LINK
+
+PW_TYPE_CLIENT = 'PipeWire:Interface:Client'
+
+
+def expected(document: list[dict], types=None) -> list[dict]:
+    # what decoding the whole dump with json.loads gives
+    return [p for p in (prune_object(o, types) for o in document) if p is not None]
+
+
+def chunked(text: str, size: int) -> list[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def big_dump() -> list[dict]:
+    # objects much bigger than a read block, wanted and unwanted ones, with strings that look like JSON
+    document = build_backend(10).dump()
+    tricky = 'a {"quoted"} \\ string }\n  } {\n  { with "\\"escaped\\" quotes" and ] braces ['
+
+    document.insert(1, {
+        'id': 500,
+        'type': PW_TYPE_CLIENT,
+        'info': {'props': {'application.name': 'x' * (DUMP_READ_SIZE * 2), 'note': tricky}},
+    })
+    document.append({
+        'id': 501,
+        'type': PW_TYPE_NODE,
+        'info': {
+            'state': 'idle',
+            'props': {'node.name': 'big-node', 'node.description': tricky + 'y' * (DUMP_READ_SIZE + 7), 'skipped': 'z' * DUMP_READ_SIZE},
+            'params': {'EnumFormat': [{'x': i} for i in range(3000)]},
+        },
+    })
+    document.append({'id': 502, 'info': None})
+    document.append({'id': 503, 'type': PW_TYPE_CLIENT, 'info': {'props': {'note': tricky}}})
+
+    return document
+
+
+@pytest.mark.parametrize('chunk_size', [None, 1, 7, 4096, DUMP_READ_SIZE - 1, DUMP_READ_SIZE + 1])
+def test_matches_json_loads(chunk_size):
+    document = big_dump()
+    text = json.dumps(document, indent=2)
+    chunks = text.splitlines(keepends=True) if chunk_size is None else chunked(text, chunk_size)
+
+    objects = read_dump(chunks)
+
+    assert objects == expected(json.loads(text))
+    big_node = next(o for o in objects if o['id'] == 501)
+    assert big_node['info']['props']['node.description'].startswith('a {"quoted"}')
+
+
+@pytest.mark.parametrize('types', [{PW_TYPE_NODE}, {PW_TYPE_PORT, PW_TYPE_LINK}, set()])
+def test_types(types):
+    document = big_dump()
+    lines = json.dumps(document, indent=2).splitlines(keepends=True)
+
+    assert read_dump(lines, types) == expected(document, types)
+
+
+def test_block_boundaries_inside_markers():
+    # every cut of the "\n  {" and "\n  }" markers between two blocks,
+    # a first chunk of DUMP_READ_SIZE or more is a block on its own
+    document = big_dump()
+    text = json.dumps(document, indent=2)
+    skipped_end = text.index('\n  }', text.index('"id": 500'))
+    big_node_start = text.rindex('\n  {', 0, text.index('"id": 501'))
+    markers = [text.index('\n  {', DUMP_READ_SIZE), text.index('\n  }', DUMP_READ_SIZE), skipped_end, big_node_start]
+
+    for at in markers:
+        assert at >= DUMP_READ_SIZE
+
+        for cut in range(at, at + 5):
+            assert read_dump([text[:cut], text[cut:]]) == expected(document)
+
+
+def test_regroup():
+    lines = ['x' * 1000] * 150
+    blocks = list(dump_reader._regroup(lines))
+
+    assert ''.join(blocks) == ''.join(lines)
+    assert all(len(b) >= DUMP_READ_SIZE for b in blocks[:-1])
+
+
+def test_unexpected_format():
+    document = build_backend(4).dump()
+
+    assert read_dump([json.dumps(document)]) == expected(document)
+
+
+@pytest.mark.parametrize('text', ['', '[]', '[\n]\n', '  [ ]'])
+def test_empty(text):
+    assert read_dump([text]) == []
+
+
+def test_prune_object():
+    node = {
+        'id': 40,
+        'type': PW_TYPE_NODE,
+        'version': 3,
+        'info': {
+            'state': 'running',
+            'n-input-ports': 2,
+            'props': {'node.name': 'mic', 'media.class': 'Audio/Source', 'client.id': 33},
+            'params': {'Props': []},
+        },
+    }
+
+    assert prune_object(node) == {
+        'id': 40,
+        'type': PW_TYPE_NODE,
+        'info': {'state': 'running', 'props': {'node.name': 'mic', 'media.class': 'Audio/Source'}},
+    }
+    assert prune_object(node, {PW_TYPE_LINK}) is None
+    assert prune_object({'id': 33, 'type': PW_TYPE_CLIENT, 'info': {}}) is None
+
+
+def test_prune_core_props_by_prefix():
+    core = {
+        'id': 0,
+        'type': PW_TYPE_CORE,
+        'info': {'name': 'pipewire-0', 'props': {'default.clock.rate': 48000, 'default.clock.quantum': 1024, 'core.name': 'pipewire-0'}},
+    }
+
+    assert prune_object(core)['info'] == {'props': {'default.clock.rate': 48000, 'default.clock.quantum': 1024}}
+
+
+def test_prune_keeps_removed_objects():
+    removed = {'id': 41, 'info': None}
+
+    assert prune_object(removed) is removed
+    assert prune_object(removed, {PW_TYPE_PORT}) is removed
+
+
+def test_objects_are_yielded_while_reading():
+    document = big_dump()
+    lines = json.dumps(document, indent=2).splitlines(keepends=True)
+    read = []
+
+    def reader():
+        for line in lines:
+            read.append(line)
+            yield line
+
+    first = next(iter_dump_objects(reader()))
+
+    assert first == prune_object(document[0])
+    assert len(read) < len(lines)
@@ -0,0 +1,113 @@
+import pytest
+from src.pipewire.graph import PwGraph, PW_TYPE_CORE, PW_TYPE_NODE, PW_TYPE_PORT, PW_TYPE_LINK
+from src.pipewire.latency import estimate_latency, RESAMPLE_DELAY_SAMPLES
+from src.pipewire.pipewire import LOW_LATENCY_NODE_NAME
+
+MIC = 'alsa_input.usb-mic.analog-stereo'
+SPEAKER = 'alsa_output.pci-speaker.analog-stereo'
+CORE = {'default.clock.rate': 48000, 'default.clock.quantum': 1024, 'default.clock.min-quantum': 32, 'default.clock.max-quantum': 2048}
+
+
+def make_graph(mic: dict, speaker: dict, low_latency: dict=None, core: dict=CORE) -> PwGraph:
+    dump = [
+        {'id': 0, 'type': PW_TYPE_CORE, 'info': {'props': core}},
+        {'id': 10, 'type': PW_TYPE_NODE, 'info': {'props': {'node.name': MIC, 'media.class': 'Audio/Source', **mic}}},
+        {'id': 11, 'type': PW_TYPE_PORT, 'info': {'direction': 'output', 'props': {'node.id': 10, 'port.name': 'capture_FL'}}},
+        {'id': 20, 'type': PW_TYPE_NODE, 'info': {'props': {'node.name': SPEAKER, 'media.class': 'Audio/Sink', **speaker}}},
+        {'id': 21, 'type': PW_TYPE_PORT, 'info': {'direction': 'input', 'props': {'node.id': 20, 'port.name': 'playback_FL'}}},
+    ]
+
+    if low_latency is not None:
+        dump += [
+            {'id': 30, 'type': PW_TYPE_NODE, 'info': {'props': {'node.name': f'{LOW_LATENCY_NODE_NAME}-1', **low_latency}}},
+            {'id': 31, 'type': PW_TYPE_PORT, 'info': {'direction': 'input', 'props': {'node.id': 30, 'port.name': 'input_FL'}}},
+            {'id': 40, 'type': PW_TYPE_LINK, 'info': {'output-node-id': 10, 'output-port-id': 11, 'input-node-id': 30, 'input-port-id': 31, 'props': {}}},
+        ]
+
+    return PwGraph.from_dump(dump)
+
+
+# (mic props, speaker props, low-latency node props, estimate_latency kwargs, quantum, rate, [(hop, samples)])
+CASES = {
+    'core quantum without requests': (
+        {}, {}, None, {},
+        1024, 48000, [('capture', 1024), ('playback', 1024)],
+    ),
+    'smallest request wins': (
+        {'node.latency': '256/48000'}, {'node.latency': '512/48000'}, None, {},
+        256, 48000, [('capture', 256), ('playback', 256)],
+    ),
+    'request at another rate is scaled': (
+        {'node.latency': '128/96000'}, {}, None, {},
+        64, 48000, [('capture', 64), ('playback', 64)],
+    ),
+    'request is clamped to the min quantum': (
+        {'node.latency': '16/48000'}, {}, None, {},
+        32, 48000, [('capture', 32), ('playback', 32)],
+    ),
+    'request is clamped to the max quantum': (
+        {'node.latency': '4096/48000'}, {}, None, {},
+        2048, 48000, [('capture', 2048), ('playback', 2048)],
+    ),
+    'force-quantum wins over requests': (
+        {'node.latency': '64/48000'}, {'node.force-quantum': 512}, None, {},
+        512, 48000, [('capture', 512), ('playback', 512)],
+    ),
+    'force-rate changes the graph rate': (
+        {'node.force-rate': 44100, 'audio.rate': 44100}, {'audio.rate': 44100}, None, {},
+        1024, 44100, [('capture', 1024), ('playback', 1024)],
+    ),
+    'headroom is buffered': (
+        {}, {'api.alsa.headroom': 256}, None, {},
+        1024, 48000, [('capture', 1024), ('playback', 1280)],
+    ),
+    'period without timer scheduling': (
+        {'node.latency': '256/48000', 'api.alsa.disable-tsched': 'true', 'api.alsa.period-size': 1024}, {}, None, {},
+        256, 48000, [('capture', 1024), ('playback', 256)],
+    ),
+    'audio.rate of the mic adds resampling': (
+        {'audio.rate': 44100}, {}, None, {},
+        1024, 48000, [('capture', 1024), ('capture resampling', RESAMPLE_DELAY_SAMPLES), ('playback', 1024)],
+    ),
+    'node.rate fraction of the speaker adds resampling': (
+        {}, {'node.rate': '1/44100'}, None, {},
+        1024, 48000, [('capture', 1024), ('playback resampling', RESAMPLE_DELAY_SAMPLES), ('playback', 1024)],
+    ),
+    'node.rate at the graph rate': (
+        {'node.rate': '1/48000'}, {'node.rate': '1/48000'}, None, {},
+        1024, 48000, [('capture', 1024), ('playback', 1024)],
+    ),
+    'low-latency node of the mic': (
+        {}, {}, {'node.latency': '64/48000'}, {},
+        64, 48000, [('capture', 64), ('playback', 64)],
+    ),
+    'without the low-latency node': (
+        {}, {}, {'node.latency': '64/48000'}, {'include_low_latency_nodes': False},
+        1024, 48000, [('capture', 1024), ('playback', 1024)],
+    ),
+    'with a low-latency node of another quantum': (
+        {}, {}, None, {'low_latency_quantum': 128},
+        128, 48000, [('capture', 128), ('playback', 128)],
+    ),
+}
+
+
+@pytest.mark.parametrize('mic, speaker, low_latency, kwargs, quantum, rate, hops', CASES.values(), ids=CASES.keys())
+def test_estimate_latency(mic, speaker, low_latency, kwargs, quantum, rate, hops):
+    estimate = estimate_latency(make_graph(mic, speaker, low_latency), MIC, SPEAKER, **kwargs)
+
+    assert (estimate.quantum, estimate.rate) == (quantum, rate)
+    assert estimate.hops == [(name, pytest.approx(samples / rate)) for name, samples in hops]
+    assert estimate.total() == pytest.approx(sum(samples for _, samples in hops) / rate)
+
+
+def test_core_defaults_without_clock_settings():
+    estimate = estimate_latency(make_graph({}, {}, core={}), MIC, SPEAKER)
+    assert (estimate.quantum, estimate.rate) == (1024, 48000)
+
+
+def test_missing_device():
+    graph = make_graph({}, {})
+
+    assert estimate_latency(graph, MIC, 'alsa_output.missing') is None
+    assert estimate_latency(graph, 'alsa_input.missing', SPEAKER) is None
@@ -0,0 +1,112 @@
+import threading
+from time import monotonic, sleep
+import pytest
+from src.pipewire.latency_tuner import PwLatencyTuner, PwQuantumController
+from src.pipewire.pipewire import Pipewire, PwLowLatencyNode
+from src.pipewire.top import PwTopMonitor
+
+MIC = 'alsa_input.usb-mic.analog-stereo'
+CLOCK_INFO = {'default.clock.quantum': 1024, 'default.clock.min-quantum': 32, 'default.clock.max-quantum': 2048}
+
+
+class FakeTop():
+    def subscribe(self, callback):
+        pass
+
+    def unsubscribe(self, callback):
+        pass
+
+
+def frame(*rows: tuple[int, int, int, bool]):
+    # rows of (node id, quantum, errors, follower)
+    monitor = PwTopMonitor(stream_factory=lambda: [])
+
+    for node_id, quantum, errors, follower in rows:
+        name = ('+ ' if follower else '') + f'node-{node_id}'
+        monitor.feed_line(f'R {node_id:>4} {quantum:>6}  48000  10.0us  10.0us  0.10  0.10 {errors:>4}    F32LE 2 48000 {name}\n')
+
+    return monitor.feed_line('\n')
+
+
+@pytest.fixture
+def tuner(monkeypatch):
+    monkeypatch.setattr(Pipewire, 'clock_info', CLOCK_INFO)
+    tuner = PwLatencyTuner(FakeTop())
+    tuner.retunes = []
+    monkeypatch.setattr(tuner, 'retune', lambda tuned, quantum, now: tuner.retunes.append(quantum))
+    tuner.track(MIC, PwLowLatencyNode(90, 'whisper-low-latency-node-0'))
+    return tuner
+
+
+def wait_for_retunes(tuner: PwLatencyTuner):
+    deadline = monotonic() + 5
+
+    for tuned in tuner.nodes.values():
+        while tuned.retuning and monotonic() < deadline:
+            sleep(0.01)
+
+
+def test_follower_with_old_errors_joining_the_group(tuner):
+    tuner.on_frame(frame((57, 64, 3, False), (90, 64, 0, True)))
+    # a follower that had errors somewhere else joins the group
+    tuner.on_frame(frame((57, 64, 3, False), (90, 64, 0, True), (91, 64, 250, True)))
+    tuner.on_frame(frame((57, 64, 3, False), (90, 64, 0, True), (91, 64, 250, True)))
+    wait_for_retunes(tuner)
+
+    assert tuner.retunes == []
+
+
+def test_new_errors_in_the_group(tuner):
+    tuner.on_frame(frame((57, 64, 3, False), (90, 64, 0, True), (91, 64, 250, True)))
+    tuner.on_frame(frame((57, 64, 3, False), (90, 64, 0, True), (91, 64, 251, True)))
+    wait_for_retunes(tuner)
+
+    assert tuner.retunes == [128]
+
+
+def test_counter_going_back_is_not_an_error(tuner):
+    tuner.on_frame(frame((57, 64, 30, False), (90, 64, 0, True)))
+    tuner.on_frame(frame((57, 64, 0, False), (90, 64, 0, True)))
+    wait_for_retunes(tuner)
+
+    assert tuner.retunes == []
+
+
+def test_retune_runs_off_the_top_thread(monkeypatch):
+    monkeypatch.setattr(Pipewire, 'clock_info', CLOCK_INFO)
+    tuner = PwLatencyTuner(FakeTop())
+    started, release = threading.Event(), threading.Event()
+    retunes = []
+
+    def retune(tuned, quantum, now):
+        retunes.append((quantum, threading.current_thread()))
+        started.set()
+        release.wait(5)
+
+    monkeypatch.setattr(tuner, 'retune', retune)
+    tuner.track(MIC, PwLowLatencyNode(90, 'whisper-low-latency-node-0'))
+
+    tuner.on_frame(frame((57, 64, 0, False), (90, 64, 0, True)))
+    tuner.on_frame(frame((57, 64, 1, False), (90, 64, 0, True)))
+    assert started.wait(5)
+
+    # on_frame returned while the node is being replaced, frames of the node are skipped meanwhile
+    tuner.on_frame(frame((57, 64, 9, False), (90, 64, 0, True)))
+    release.set()
+    wait_for_retunes(tuner)
+
+    assert [q for q, _ in retunes] == [128]
+    assert retunes[0][1] is not threading.current_thread()
+
+
+def test_controller_steps():
+    controller = PwQuantumController(quantum=64, min_quantum=64, max_quantum=256, stable_period=10)
+
+    assert controller.update(0, 0.1, now=0) is None
+    assert controller.update(2, 0.1, now=1) == 128
+    assert controller.update(0, 0.9, now=2) == 256
+    assert controller.update(1, 0.1, now=3) is None
+
+    # the stable period doubled on every step up
+    assert controller.update(0, 0.1, now=40) is None
+    assert controller.update(0, 0.1, now=43) == 128
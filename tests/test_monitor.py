@@ -0,0 +1,207 @@
+import json
+import queue
+import pytest
+from src.pipewire.graph import PW_TYPE_CORE, PW_TYPE_NODE, PW_TYPE_PORT, PW_TYPE_LINK
+from src.pipewire.monitor import PwGraphMonitor, PwDumpStreamParser
+from src.pipewire.pipewire import Pipewire
+from src.pipewire.simulated_backend import PwSimulatedBackend
+from src.pipewire.snapshot import PwGraphSnapshot
+
+MIC = 'alsa_input.usb-mic.analog-stereo'
+SPEAKER = 'alsa_output.pci-speaker.analog-stereo'
+
+
+def node(obj_id: int, name: str, media_class: str, **props) -> dict:
+    return {'id': obj_id, 'type': PW_TYPE_NODE, 'info': {'state': 'running', 'props': {'node.name': name, 'media.class': media_class, **props}}}
+
+
+def port(obj_id: int, node_id: int, direction: str, name: str, alias: str) -> dict:
+    props = {'node.id': node_id, 'port.name': name, 'port.alias': alias, 'audio.channel': name[-2:]}
+    return {'id': obj_id, 'type': PW_TYPE_PORT, 'info': {'direction': direction, 'props': props}}
+
+
+def link(obj_id: int, output_node: int, output_port: int, input_node: int, input_port: int) -> dict:
+    return {'id': obj_id, 'type': PW_TYPE_LINK, 'info': {
+        'output-node-id': output_node, 'output-port-id': output_port,
+        'input-node-id': input_node, 'input-port-id': input_port, 'state': 'active', 'props': {},
+    }}
+
+
+def removed(obj_id: int) -> dict:
+    return {'id': obj_id, 'info': None}
+
+
+INITIAL = [
+    {'id': 0, 'type': PW_TYPE_CORE, 'info': {'props': {'default.clock.rate': 48000, 'default.clock.quantum': 1024}}},
+    node(10, MIC, 'Audio/Source', **{'node.description': 'USB Mic'}),
+    port(11, 10, 'output', 'capture_FL', 'USB Mic:capture_FL'),
+    node(20, SPEAKER, 'Audio/Sink', **{'node.description': 'Speakers'}),
+    port(21, 20, 'input', 'playback_FL', 'Speakers:playback_FL'),
+]
+
+
+def pw_dump_text(document: list) -> str:
+    # the way pw-dump --monitor prints every update
+    return json.dumps(document, indent=2) + '\n'
+
+
+def changes_of(changes) -> list[tuple[str, str, int]]:
+    return [(c.kind, c.action, c.obj_id) for c in changes]
+
+
+@pytest.fixture(autouse=True)
+def pipewire_state(monkeypatch):
+    monkeypatch.setattr(Pipewire, 'graph_monitor', None)
+    monkeypatch.setattr(Pipewire, 'clock_info', None)
+    monkeypatch.setattr(Pipewire, 'change_listeners', [])
+
+
+def test_parser_splits_documents():
+    parser = PwDumpStreamParser()
+    text = pw_dump_text(INITIAL) + '[]\n' + pw_dump_text([removed(21)])
+    documents = [d for d in (parser.feed_line(l) for l in text.splitlines(keepends=True)) if d is not None]
+
+    assert documents == [INITIAL, [], [removed(21)]]
+
+
+def test_parser_skips_invalid_documents():
+    parser = PwDumpStreamParser()
+
+    assert parser.feed_line('[\n') is None
+    assert parser.feed_line('  {"id": \n') is None
+    assert parser.feed_line(']\n') is None
+    assert parser.feed_line('[]\n') == []
+
+
+def test_changes_are_applied_and_published():
+    monitor = PwGraphMonitor(stream_factory=lambda: [])
+    published = []
+    monitor.subscribe(lambda changes: published.append(changes_of(changes)))
+
+    assert changes_of(monitor.feed(pw_dump_text(INITIAL))) == [
+        ('node', 'added', 10), ('port', 'added', 11), ('node', 'added', 20), ('port', 'added', 21),
+    ]
+
+    # the same objects again
+    assert monitor.feed(pw_dump_text(INITIAL)) == []
+
+    assert changes_of(monitor.feed(pw_dump_text([link(30, 10, 11, 20, 21)]))) == [('link', 'added', 30)]
+    assert monitor.graph.links_from_port(11)[0].input_port_id == 21
+
+    renamed = node(20, SPEAKER, 'Audio/Sink', **{'node.description': 'Headphones'})
+    assert changes_of(monitor.feed(pw_dump_text([renamed]))) == [('node', 'changed', 20)]
+    assert monitor.graph.node_by_name(SPEAKER).description == 'Headphones'
+
+    assert changes_of(monitor.feed(pw_dump_text([removed(30), removed(99)]))) == [('link', 'removed', 30)]
+    assert monitor.graph.links_from_port(11) == []
+
+    assert published == [
+        [('node', 'added', 10), ('port', 'added', 11), ('node', 'added', 20), ('port', 'added', 21)],
+        [('link', 'added', 30)],
+        [('node', 'changed', 20)],
+        [('link', 'removed', 30)],
+    ]
+
+
+def test_copy_graph_is_kept_until_a_change():
+    monitor = PwGraphMonitor(stream_factory=lambda: [])
+    monitor.feed(pw_dump_text(INITIAL + [link(30, 10, 11, 20, 21)]))
+
+    copy = monitor.copy_graph()
+    assert monitor.copy_graph() is copy
+
+    monitor.feed(pw_dump_text(INITIAL))
+    assert monitor.copy_graph() is copy
+
+    monitor.feed(pw_dump_text([removed(30)]))
+    assert monitor.copy_graph() is not copy
+    assert monitor.copy_graph().links_by_id == {}
+
+    # the old copy doesn't see the changes
+    assert list(copy.links_by_id) == [30]
+    assert [l.id for l in copy.links_from_port(11)] == [30]
+
+    monitor.feed(pw_dump_text([{'id': 0, 'type': PW_TYPE_CORE, 'info': {'props': {'default.clock.quantum': 256}}}]))
+    assert monitor.copy_graph().core_props == {'default.clock.quantum': 256}
+
+
+class ScriptedStream():
+    # lines pushed by the test, the stream ends with close()
+    def __init__(self):
+        self.lines = queue.Queue()
+
+    def push(self, document: list):
+        for line in pw_dump_text(document).splitlines(keepends=True):
+            self.lines.put(line)
+
+    def close(self):
+        self.lines.put(None)
+
+    def __iter__(self):
+        return iter(self.lines.get, None)
+
+
+@pytest.fixture
+def running_monitor():
+    stream = ScriptedStream()
+    monitor = PwGraphMonitor(stream_factory=lambda: stream)
+    stream.push(INITIAL)
+    monitor.start()
+
+    assert monitor.wait_for(lambda g: g.node_by_name(SPEAKER), timeout=5)
+    yield monitor, stream
+
+    monitor.stop()
+    stream.close()
+    monitor.thread.join(timeout=5)
+
+
+def test_running_monitor_is_registered(running_monitor):
+    monitor, stream = running_monitor
+
+    assert monitor.is_synced()
+    assert Pipewire.graph_monitor is monitor
+    assert Pipewire._synced_monitor() is monitor
+
+    monitor.stop()
+    assert Pipewire.graph_monitor is None
+    assert not monitor.is_synced()
+
+
+def test_snapshot_serves_the_monitored_graph(running_monitor, monkeypatch):
+    monitor, stream = running_monitor
+
+    def no_pw_dump(*args, **kwargs):
+        raise AssertionError('pw-dump must not run while the monitor is synced')
+
+    monkeypatch.setattr(Pipewire, 'list_objects', no_pw_dump)
+    snapshot = PwGraphSnapshot()
+
+    graph = snapshot.graph()
+    assert graph is monitor.copy_graph()
+    assert snapshot.links() == {}
+    assert list(snapshot.outputs()) == [MIC]
+
+    stream.push([link(30, 10, 11, 20, 21)])
+    monitor.wait_for(lambda g: g.links_by_id or None, timeout=5)
+
+    # no invalidate() needed, the change of the monitor is enough
+    assert snapshot.graph() is not graph
+    assert [l.connected_tag for l in snapshot.links()[11].values()] == [SPEAKER]
+    assert snapshot.output_by_port(11).resource_name == MIC
+    assert snapshot.input_by_port(21).resource_name == SPEAKER
+
+
+def test_snapshot_falls_back_to_pw_dump(running_monitor, monkeypatch):
+    monitor, stream = running_monitor
+    monkeypatch.setattr(Pipewire, 'backend', PwSimulatedBackend.with_demo_devices())
+    snapshot = PwGraphSnapshot()
+
+    assert snapshot.graph() is monitor.copy_graph()
+
+    monitor.stop()
+    graph = snapshot.graph()
+
+    assert graph.node_by_name(MIC) is None
+    assert graph.node_by_name('alsa_input.pci-0000_00_1f.3.analog-stereo')
+    assert snapshot.graph() is graph
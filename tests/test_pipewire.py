@@ -0,0 +1,53 @@
+import asyncio
+import pytest
+from src.pipewire.async_pipewire import AsyncPipewire
+from src.pipewire.pipewire import Pipewire, LOW_LATENCY_NODE_NAME
+from src.pipewire.simulated_backend import PwSimulatedBackend
+
+
+class SilentBackend(PwSimulatedBackend):
+    # pw-cli doesn't always print the id of the node it created
+    def __init__(self, create=True):
+        super().__init__()
+        self.create = create
+
+    def create_node(self, factory: str, props: dict):
+        if self.create:
+            super().create_node(factory, props)
+
+        return None
+
+
+@pytest.fixture
+def use_backend(monkeypatch):
+    monkeypatch.setattr(Pipewire, 'graph_monitor', None)
+    monkeypatch.setattr(Pipewire, 'clock_info', None)
+    monkeypatch.setattr(Pipewire, 'reserved_node_names', set())
+
+    def use(backend):
+        monkeypatch.setattr(Pipewire, 'backend', backend)
+        return backend
+
+    return use
+
+
+def test_created_node_id_is_read_from_the_graph(use_backend):
+    backend = use_backend(SilentBackend())
+
+    node = Pipewire.create_low_latency_node(quantum=64)
+
+    assert node.name.startswith(LOW_LATENCY_NODE_NAME)
+    assert node.node_id == backend._find_node(node.name)['id']
+
+
+@pytest.mark.parametrize('create', [
+    lambda: Pipewire.create_low_latency_node(quantum=64),
+    lambda: asyncio.run(AsyncPipewire.create_low_latency_node(quantum=64)),
+], ids=['sync', 'async'])
+def test_created_node_missing_from_the_graph(use_backend, create):
+    use_backend(SilentBackend(create=False))
+
+    with pytest.raises(TimeoutError, match=LOW_LATENCY_NODE_NAME):
+        create()
+
+    assert Pipewire.reserved_node_names == set()
@@ -0,0 +1,136 @@
+import pytest
+from benchmarks.fixtures import build_backend
+from src.pipewire import pwlink_parser
+from src.pipewire.pipewire import Pipewire, LOW_LATENCY_NODE_NAME
+from src.pipewire.simulated_backend import PwSimulatedBackend
+
+
+def demo_graph() -> PwSimulatedBackend:
+    return PwSimulatedBackend.with_demo_devices()
+
+
+def linked_graph() -> PwSimulatedBackend:
+    return build_backend(40)
+
+
+def partly_unlinked_graph() -> PwSimulatedBackend:
+    backend = build_backend(40)
+    links = sorted(i for i, o in backend.objects.items() if o['type'] == 'PipeWire:Interface:Link')
+
+    for link_id in links[::3]:
+        backend.unlink(str(link_id))
+
+    return backend
+
+
+def low_latency_graph() -> PwSimulatedBackend:
+    backend = build_backend(20)
+    backend.create_node('adapter', {
+        'factory.name': 'support.null-audio-sink',
+        'node.name': f'{LOW_LATENCY_NODE_NAME}-1',
+        'media.class': 'Audio/Sink',
+        'audio.position': ['FL', 'FR'],
+    })
+
+    return backend
+
+
+GRAPHS = [demo_graph, linked_graph, partly_unlinked_graph, low_latency_graph]
+
+
+def use_backend(monkeypatch, backend: PwSimulatedBackend):
+    monkeypatch.setattr(Pipewire, 'backend', backend)
+    monkeypatch.setattr(Pipewire, 'graph_monitor', None)
+
+
+@pytest.fixture(params=GRAPHS, ids=[g.__name__ for g in GRAPHS])
+def backend(request, monkeypatch):
+    backend = request.param()
+    use_backend(monkeypatch, backend)
+    return backend
+
+
+def test_inputs_match_pwlink(backend):
+    inputs = Pipewire.list_inputs()
+
+    assert inputs
+    assert inputs == Pipewire.list_inputs_pwlink()
+    assert [l.description for l in inputs.values()] == [l.description for l in Pipewire.list_inputs_pwlink().values()]
+
+
+def test_outputs_match_pwlink(backend):
+    outputs = Pipewire.list_outputs()
+
+    assert outputs
+    assert outputs == Pipewire.list_outputs_pwlink()
+
+
+def test_links_match_pwlink(backend):
+    assert Pipewire.list_links() == Pipewire.list_links_pwlink()
+
+
+def test_low_latency_node_links_match_pwlink(monkeypatch):
+    use_backend(monkeypatch, low_latency_graph())
+
+    Pipewire.link_devices('alsa_input.bench-0.analog-stereo', f'{LOW_LATENCY_NODE_NAME}-1')
+    links = Pipewire.list_links()
+
+    assert any(l.connected_tag.startswith(LOW_LATENCY_NODE_NAME) for port in links.values() for l in port.values())
+    assert links == Pipewire.list_links_pwlink()
+
+
+# `pw-link --output --verbose --id`
+PWLINK_PORTS = """\
+  58 alsa_input.pci-0000_00_1f.3.analog-stereo:capture_FL
+      alsa:pcm:0:front:0:capture:capture_0
+      Built-in Audio Analog Stereo:capture_FL
+  59 alsa_input.pci-0000_00_1f.3.analog-stereo:capture_FR
+      alsa:pcm:0:front:0:capture:capture_1
+      Built-in Audio Analog Stereo:capture_FR
+
+  33 Midi-Bridge:Midi Through:(capture_0) Midi Through Port-0
+      alsa:seq:default:client_14:capture_0
+      Midi Through:(capture_0) Midi Through Port-0
+ 104 v4l2_input.pci-0000_00_14.0-usb-0_6_1.0:out_0
+"""
+
+# `pw-link --links --id`
+PWLINK_LINKS = """\
+  58 alsa_input.pci-0000_00_1f.3.analog-stereo:capture_FL
+ 120   |->   80 whisper-low-latency-node-1:playback_FL
+ 121   |->   90 Midi-Bridge:Midi Through:(playback_0) Midi Through Port-0
+  80 whisper-low-latency-node-1:playback_FL
+ 120   |<-   58 alsa_input.pci-0000_00_1f.3.analog-stereo:capture_FL
+"""
+
+
+def test_pwlink_ports():
+    assert list(pwlink_parser.iter_ports(PWLINK_PORTS.splitlines(keepends=True))) == [
+        ('58', 'alsa_input.pci-0000_00_1f.3.analog-stereo', 'capture_FL', 'alsa:pcm:0:front:0:capture:capture_0', 'Built-in Audio Analog Stereo:capture_FL'),
+        ('59', 'alsa_input.pci-0000_00_1f.3.analog-stereo', 'capture_FR', 'alsa:pcm:0:front:0:capture:capture_1', 'Built-in Audio Analog Stereo:capture_FR'),
+        ('33', 'Midi-Bridge', 'Midi Through:(capture_0) Midi Through Port-0', 'alsa:seq:default:client_14:capture_0', 'Midi Through:(capture_0) Midi Through Port-0'),
+        ('104', 'v4l2_input.pci-0000_00_14.0-usb-0_6_1.0', 'out_0', '', ''),
+    ]
+
+
+def test_pwlink_ports_skip_lines_before_the_first_port():
+    lines = ['      alsa:pcm:0:front:0:capture:capture_0\n'] + PWLINK_PORTS.splitlines(keepends=True)[:3]
+
+    assert list(pwlink_parser.iter_ports(lines)) == [
+        ('58', 'alsa_input.pci-0000_00_1f.3.analog-stereo', 'capture_FL', 'alsa:pcm:0:front:0:capture:capture_0', 'Built-in Audio Analog Stereo:capture_FL'),
+    ]
+
+
+def test_pwlink_links():
+    assert list(pwlink_parser.iter_links(PWLINK_LINKS.splitlines(keepends=True))) == [
+        ('58', None, None, 'alsa_input.pci-0000_00_1f.3.analog-stereo', 'capture_FL'),
+        ('58', '120', '80', 'whisper-low-latency-node-1', 'playback_FL'),
+        ('58', '121', '90', 'Midi-Bridge', 'Midi Through:(playback_0) Midi Through Port-0'),
+        # the input side only repeats link 120
+        ('80', None, None, 'whisper-low-latency-node-1', 'playback_FL'),
+    ]
+
+
+def test_pwlink_split_at_the_first_colon():
+    assert pwlink_parser.split_port_name('alsa_output.usb-0d8c_USB_Sound_Device-00.analog-stereo:playback_FL') == ('alsa_output.usb-0d8c_USB_Sound_Device-00.analog-stereo', 'playback_FL')
+    assert pwlink_parser.split_port_name('Midi-Bridge:Midi Through:(capture_0) Midi Through Port-0') == ('Midi-Bridge', 'Midi Through:(capture_0) Midi Through Port-0')
@@ -0,0 +1,217 @@
+import pytest
+
+pytest.importorskip('pulsectl')
+
+from src.pulseaudio import client as pulse_client_module  # noqa: E402
+from src.pulseaudio.client import PulseClient, PulseDevice, PULSE_VOLUME_WRITE_INTERVAL, PULSE_VOLUME_WRITE_RETRIES  # noqa: E402
+
+
+class FakeVolume():
+    def __init__(self, value: float):
+        self.value_flat = value
+
+
+class FakeInfo():
+    def __init__(self, index: int, name: str, volume: float=1.0):
+        self.index = index
+        self.name = name
+        self.volume = FakeVolume(volume)
+
+
+class FakePulse():
+    """Records the volume writes, the first `failures` ones raise after calling `on_failure`"""
+
+    def __init__(self, clock: 'FakeClock', failures=0):
+        self.clock = clock
+        self.failures = failures
+        self.on_failure = None
+        self.writes: list[tuple[float, str, float]] = []
+        self.sinks = [FakeInfo(1, 'speaker'), FakeInfo(2, 'headphones')]
+        self.sources = [FakeInfo(3, 'mic')]
+
+    def volume_set_all_chans(self, info, volume: float):
+        if self.failures:
+            self.failures -= 1
+
+            if self.on_failure:
+                self.on_failure()
+
+            raise OSError('connection lost')
+
+        self.writes.append((round(self.clock.now, 4), info.name, round(volume, 4)))
+
+    def sink_list(self):
+        return self.sinks
+
+    def source_list(self):
+        return self.sources
+
+    def close(self):
+        pass
+
+
+class FakeClock():
+    """
+    Replaces monotonic() and the waits of the client thread: a wait moves the clock forward,
+    running the calls scheduled with at() on the way. When nothing is left to do the client stops
+    """
+
+    def __init__(self, client: PulseClient):
+        self.client = client
+        self.now = 0.0
+        self.events: list[tuple[float, callable]] = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def at(self, when: float, function, *args):
+        self.events.append((when, lambda: function(*args)))
+        self.events.sort(key=lambda e: e[0])
+
+    def wait(self, timeout=None):
+        deadline = float('inf') if timeout is None else self.now + timeout
+
+        if self.events and self.events[0][0] <= deadline:
+            when, function = self.events.pop(0)
+            self.now = max(self.now, when)
+            function()
+        elif timeout is None:
+            self.client.running = False
+        else:
+            self.now = deadline
+
+        return True
+
+
+def make_client(monkeypatch, failures=0) -> tuple[PulseClient, FakePulse, FakeClock]:
+    client = PulseClient(write_interval=PULSE_VOLUME_WRITE_INTERVAL, echo_window=0.5)
+    clock = FakeClock(client)
+    pulse = FakePulse(clock, failures=failures)
+
+    client.client_factory = lambda: pulse
+    monkeypatch.setattr(pulse_client_module, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(client.condition, 'wait', clock.wait)
+    # the client loop runs in the test, start() must not open a thread
+    client.running = True
+
+    return client, pulse, clock
+
+
+def device(facility: str, info: FakeInfo) -> PulseDevice:
+    return PulseDevice(facility, info)
+
+
+def test_first_write_is_sent_right_away(monkeypatch):
+    client, pulse, clock = make_client(monkeypatch)
+    speaker = device('sink', pulse.sinks[0])
+
+    client.set_volume(speaker, 0.4)
+    client._run()
+
+    assert pulse.writes == [(0.0, 'speaker', 0.4)]
+    assert speaker.volume == 0.4
+
+
+def test_writes_are_throttled_to_the_last_value(monkeypatch):
+    client, pulse, clock = make_client(monkeypatch)
+    speaker = device('sink', pulse.sinks[0])
+
+    client.set_volume(speaker, 0.1)
+    # a slider dragged every 5 ms
+    for i in range(1, 10):
+        clock.at(i * 0.005, client.set_volume, speaker, 0.1 + i / 100)
+
+    client._run()
+
+    # the values set until 30 ms go in the first slot, the last one in the next
+    assert pulse.writes == [
+        (0.0, 'speaker', 0.1),
+        (round(PULSE_VOLUME_WRITE_INTERVAL, 4), 'speaker', 0.16),
+        (round(2 * PULSE_VOLUME_WRITE_INTERVAL, 4), 'speaker', 0.19),
+    ]
+
+
+def test_writes_of_different_devices_share_the_slot(monkeypatch):
+    client, pulse, clock = make_client(monkeypatch)
+    speaker = device('sink', pulse.sinks[0])
+    headphones = device('sink', pulse.sinks[1])
+
+    client.set_volume(speaker, 0.5)
+    clock.at(0.01, client.set_volume, speaker, 0.6)
+    clock.at(0.02, client.set_volume, headphones, 0.7)
+    client._run()
+
+    slot = round(PULSE_VOLUME_WRITE_INTERVAL, 4)
+    assert pulse.writes == [(0.0, 'speaker', 0.5), (slot, 'speaker', 0.6), (slot, 'headphones', 0.7)]
+
+
+def test_is_echo(monkeypatch):
+    client, pulse, clock = make_client(monkeypatch)
+    speaker = device('sink', pulse.sinks[0])
+    echoes = []
+
+    def check(at: float):
+        echoes.append((at, client.is_echo('sink', 1), client.is_echo('sink', 2), client.is_echo('source', 1)))
+
+    client.set_volume(speaker, 0.4)
+    # queued but not sent yet
+    check('queued')
+
+    clock.at(0.2, check, 0.2)
+    clock.at(0.6, check, 0.6)
+    client._run()
+
+    assert echoes == [
+        ('queued', True, False, False),
+        # within the echo window of the write at 0
+        (0.2, True, False, False),
+        (0.6, False, False, False),
+    ]
+
+
+def test_failed_write_is_sent_again(monkeypatch):
+    client, pulse, clock = make_client(monkeypatch, failures=1)
+    speaker = device('sink', pulse.sinks[0])
+
+    client.set_volume(speaker, 0.3)
+    client._run()
+
+    assert pulse.writes == [(round(PULSE_VOLUME_WRITE_INTERVAL, 4), 'speaker', 0.3)]
+
+
+def test_newer_value_wins_over_a_failed_write(monkeypatch):
+    client, pulse, clock = make_client(monkeypatch, failures=1)
+    speaker = device('sink', pulse.sinks[0])
+    # the slider moves while the first write is failing
+    pulse.on_failure = lambda: client.set_volume(speaker, 0.9)
+
+    client.set_volume(speaker, 0.1)
+    client._run()
+
+    assert pulse.writes == [(round(PULSE_VOLUME_WRITE_INTERVAL, 4), 'speaker', 0.9)]
+
+
+def test_failed_write_is_dropped_after_the_retries(monkeypatch):
+    client, pulse, clock = make_client(monkeypatch, failures=PULSE_VOLUME_WRITE_RETRIES + 1)
+    speaker = device('sink', pulse.sinks[0])
+
+    client.set_volume(speaker, 0.3)
+    client._run()
+
+    assert pulse.writes == []
+    assert pulse.failures == 0
+    assert client.volume_writes == {}
+
+
+def test_refresh_reads_every_device_once(monkeypatch):
+    client, pulse, clock = make_client(monkeypatch)
+    results = []
+
+    client.refresh(results.append)
+    client.refresh(results.append)
+    client._run()
+
+    assert len(results) == 2
+    assert results[0] is results[1]
+    assert list(results[0].sinks) == ['speaker', 'headphones']
+    assert results[0].source('mic').index == 3
@@ -0,0 +1,180 @@
+import gc
+from src.utils import async_utils
+from src.utils.scheduler import TimerScheduler, ManualTimers, scheduler as shared_scheduler, weak_method
+
+
+class Owner():
+    def __init__(self):
+        self.calls = []
+
+    def record(self, *args):
+        self.calls.append(args)
+
+
+def make_scheduler():
+    timers = ManualTimers()
+    return TimerScheduler(timers), timers
+
+
+def test_debounce_runs_once_with_the_last_arguments():
+    scheduler, timers = make_scheduler()
+    owner = Owner()
+
+    for i in range(5):
+        scheduler.debounce(owner, 'key', 0.5, owner.record, i)
+        timers.advance(0.2)
+
+    assert owner.calls == []
+
+    timers.advance(0.3)
+    assert owner.calls == [(4,)]
+
+    timers.advance(5)
+    assert owner.calls == [(4,)]
+    assert owner not in scheduler.owners
+
+
+def test_debounce_timers_are_per_owner_and_key():
+    scheduler, timers = make_scheduler()
+    first, second = Owner(), Owner()
+
+    scheduler.debounce(first, 'key', 0.5, first.record, 'a')
+    scheduler.debounce(second, 'key', 0.5, second.record, 'b')
+    scheduler.debounce(first, 'other', 0.5, first.record, 'c')
+    timers.advance(0.5)
+
+    assert sorted(first.calls) == [('a',), ('c',)]
+    assert second.calls == [('b',)]
+
+
+def test_throttle_runs_leading_and_trailing_edge():
+    scheduler, timers = make_scheduler()
+    owner = Owner()
+
+    scheduler.throttle(owner, 'key', 1, owner.record, 1)
+    assert owner.calls == [(1,)]
+
+    scheduler.throttle(owner, 'key', 1, owner.record, 2)
+    scheduler.throttle(owner, 'key', 1, owner.record, 3)
+    timers.advance(0.9)
+    assert owner.calls == [(1,)]
+
+    # the last call of the period runs when it ends
+    timers.advance(0.1)
+    assert owner.calls == [(1,), (3,)]
+
+    # nothing was called during the second period, the timer stops
+    timers.advance(1)
+    assert owner.calls == [(1,), (3,)]
+    assert owner not in scheduler.owners
+
+    scheduler.throttle(owner, 'key', 1, owner.record, 4)
+    assert owner.calls == [(1,), (3,), (4,)]
+
+
+def test_delay_runs_after_the_first_call_with_the_last_arguments():
+    scheduler, timers = make_scheduler()
+    owner = Owner()
+
+    scheduler.delay(owner, 'key', 1, owner.record, 1)
+    timers.advance(0.6)
+    scheduler.delay(owner, 'key', 1, owner.record, 2)
+    assert scheduler.is_pending(owner, 'key')
+
+    # a debounce would wait until 1.6
+    timers.advance(0.4)
+    assert owner.calls == [(2,)]
+    assert not scheduler.is_pending(owner, 'key')
+
+    scheduler.delay(owner, 'key', 1, owner.record, 3)
+    timers.advance(1)
+    assert owner.calls == [(2,), (3,)]
+
+
+def test_is_pending():
+    scheduler, timers = make_scheduler()
+    owner = Owner()
+
+    assert not scheduler.is_pending(owner, 'key')
+
+    scheduler.throttle(owner, 'key', 1, owner.record, 1)
+    # the leading call already ran
+    assert not scheduler.is_pending(owner, 'key')
+
+    scheduler.throttle(owner, 'key', 1, owner.record, 2)
+    assert scheduler.is_pending(owner, 'key')
+
+    timers.advance(1)
+    assert not scheduler.is_pending(owner, 'key')
+
+
+def test_cancel_drops_pending_timers():
+    scheduler, timers = make_scheduler()
+    owner = Owner()
+
+    scheduler.debounce(owner, 'a', 0.5, owner.record, 'a')
+    scheduler.debounce(owner, 'b', 0.5, owner.record, 'b')
+    scheduler.cancel(owner, 'a')
+    timers.advance(1)
+    assert owner.calls == [('b',)]
+
+    scheduler.debounce(owner, 'a', 0.5, owner.record, 'a')
+    scheduler.debounce(owner, 'b', 0.5, owner.record, 'b')
+    scheduler.cancel(owner)
+    timers.advance(1)
+    assert owner.calls == [('b',)]
+
+
+def test_pending_timers_dont_keep_the_owner_alive():
+    scheduler, timers = make_scheduler()
+    calls = []
+    owner = Owner()
+    owner.calls = calls
+
+    scheduler.debounce(owner, 'key', 0.5, weak_method(Owner.record, owner), 'late')
+    scheduler.throttle(owner, 'other', 0.5, weak_method(Owner.record, owner), 'first')
+    scheduler.throttle(owner, 'other', 0.5, weak_method(Owner.record, owner), 'trailing')
+
+    del owner
+    gc.collect()
+
+    assert len(scheduler.owners) == 0
+
+    timers.advance(1)
+    assert calls == [('first',)]
+
+
+def test_debounced_method_doesnt_keep_the_instance_alive(monkeypatch):
+    timers = ManualTimers()
+    monkeypatch.setattr(shared_scheduler, '_timers', timers)
+    calls = []
+
+    class Widget():
+        @async_utils.debounce(0.5)
+        def update(self, value):
+            calls.append(value)
+
+    kept, dropped = Widget(), Widget()
+    kept.update(1)
+    dropped.update(2)
+
+    del dropped
+    gc.collect()
+    timers.advance(1)
+
+    assert calls == [1]
+    assert len(shared_scheduler.owners) == 0
+
+
+def test_failing_function_doesnt_stop_the_timers():
+    scheduler, timers = make_scheduler()
+    owner = Owner()
+
+    def fail():
+        raise ValueError()
+
+    scheduler.debounce(owner, 'fail', 0.1, fail)
+    scheduler.debounce(owner, 'key', 0.2, owner.record, 'ok')
+    timers.advance(1)
+
+    assert owner.calls == [('ok',)]
@@ -0,0 +1,121 @@
+import asyncio
+import pytest
+from src.pipewire import shared_nodes
+from src.pipewire.async_pipewire import AsyncPipewire
+from src.pipewire.latency_tuner import PwLatencyTuner
+from src.pipewire.node_pool import PwLowLatencyNodePool
+from src.pipewire.pipewire import PwLowLatencyNode, PwOperation, LOW_LATENCY_NODE_NAME
+from src.pipewire.shared_nodes import PwSharedLowLatencyNodes
+
+MIC = 'alsa_input.usb-mic.analog-stereo'
+SPEAKER = 'alsa_output.pci-speaker.analog-stereo'
+HEADPHONES = 'alsa_output.usb-headphones.analog-stereo'
+
+
+class FakeTop():
+    def subscribe(self, callback):
+        pass
+
+    def unsubscribe(self, callback):
+        pass
+
+
+class FakePipewire():
+    def __init__(self):
+        self.created: list[PwLowLatencyNode] = []
+        self.destroyed: list[str] = []
+        # called while the node is being linked
+        self.on_link = None
+
+    async def create_low_latency_node(self, quantum=None) -> PwLowLatencyNode:
+        node = PwLowLatencyNode(100 + len(self.created), f'{LOW_LATENCY_NODE_NAME}-{len(self.created)}')
+        self.created.append(node)
+        return node
+
+    async def link_devices(self, output_name: str, input_name: str, graph=None):
+        if self.on_link:
+            self.on_link()
+
+        return []
+
+    async def destroy_node(self, node: PwLowLatencyNode):
+        self.destroyed.append(node.name)
+
+
+def destroys(operations: list[PwOperation]) -> list[str]:
+    assert all(op.action == 'destroy' for op in operations)
+    return [name for op in operations for name in op.args]
+
+
+@pytest.fixture
+def pipewire(monkeypatch):
+    fake = FakePipewire()
+    monkeypatch.setattr(shared_nodes, 'latency_tuner', PwLatencyTuner(FakeTop()))
+    monkeypatch.setattr(shared_nodes, 'low_latency_pool', PwLowLatencyNodePool())
+
+    for name in ('create_low_latency_node', 'link_devices', 'destroy_node'):
+        monkeypatch.setattr(AsyncPipewire, name, getattr(fake, name))
+
+    return fake
+
+
+def test_stale_sync_during_and_after_acquire_keeps_the_node(pipewire):
+    registry = PwSharedLowLatencyNodes()
+    # the refresh worker reads a graph made before the links of the new node exist
+    pipewire.on_link = lambda: registry.sync(MIC, [], [SPEAKER])
+
+    node = asyncio.run(registry.acquire(MIC, SPEAKER))
+    assert registry.sync(MIC, [], [SPEAKER]) is None
+
+    assert registry.node_for(MIC) == node
+    assert registry.is_user(MIC, SPEAKER)
+    assert destroys(registry.release_operations(MIC, SPEAKER)) == [node.name]
+    assert registry.node_for(MIC) is None
+
+
+def test_node_destroyed_from_outside_once_seen_linked(pipewire):
+    registry = PwSharedLowLatencyNodes()
+    node = asyncio.run(registry.acquire(MIC, SPEAKER))
+
+    assert registry.sync(MIC, [node], [SPEAKER, HEADPHONES]) == node
+    assert registry.is_user(MIC, SPEAKER) and not registry.is_user(MIC, HEADPHONES)
+
+    assert registry.sync(MIC, [], [SPEAKER]) is None
+    assert registry.node_for(MIC) is None
+    assert not registry.is_user(MIC, SPEAKER)
+    assert pipewire.destroyed == []
+
+
+def test_second_user_shares_the_node(pipewire):
+    registry = PwSharedLowLatencyNodes()
+    node = asyncio.run(registry.acquire(MIC, SPEAKER))
+
+    assert asyncio.run(registry.acquire(MIC, HEADPHONES)) == node
+    assert registry.release_operations(MIC, SPEAKER) == []
+    assert destroys(registry.release_operations(MIC, HEADPHONES)) == [node.name]
+    assert len(pipewire.created) == 1
+
+
+def test_released_while_acquiring(pipewire):
+    registry = PwSharedLowLatencyNodes()
+    pipewire.on_link = lambda: registry.release_operations(MIC, SPEAKER)
+
+    assert asyncio.run(registry.acquire(MIC, SPEAKER)) is None
+    assert registry.node_for(MIC) is None
+    assert pipewire.destroyed == [pipewire.created[0].name]
+
+
+def test_failed_link_drops_the_user(pipewire):
+    registry = PwSharedLowLatencyNodes()
+
+    def fail():
+        raise RuntimeError('link failed')
+
+    pipewire.on_link = fail
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(registry.acquire(MIC, SPEAKER))
+
+    assert not registry.is_user(MIC, SPEAKER)
+    assert registry.pending == {}
+    assert pipewire.destroyed == [pipewire.created[0].name]
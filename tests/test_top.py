@@ -0,0 +1,130 @@
+import pytest
+from src.pipewire.top import PwTopMonitor, parse_top_line
+
+# recorded with `pw-top --batch-mode`, one refresh per header
+RECORDED = '''S   ID  QUANT   RATE    WAIT    BUSY   W/Q   B/Q  ERR FORMAT           NAME
+S   30      0      0    ---     ---   ---   ---     0                  Dummy-Driver
+S   31      0      0    ---     ---   ---   ---     0                  Freewheel-Driver
+R   56    256  48000  64.0us  27.4us  0.01  0.01    0    S32LE 2 48000 alsa_output.pci-0000_00_1f.3.analog-stereo
+R   75    256  48000  20.1us  12.3us  0.00  0.00    0    F32LE 2 48000  + Firefox
+R   57   1024  48000  35.6us  18.2us  0.02  0.01    3    S16LE 2 48000 alsa_input.usb-Blue_Yeti.analog-stereo
+R   90     64  48000  11.0us   5.1us  0.01  0.00    0    F32LE 2 48000  + whisper-low-latency-node-0
+R   91     64  48000  10.2us   4.8us  0.01  0.00   12    F32LE 2 48000  + alsa_output.usb-headphones.analog-stereo
+I   58      0      0   0.0us   0.0us  0.00  0.00    0    S16LE 2 44100 alsa_output.usb-headset.analog-stereo
+S   ID  QUANT   RATE    WAIT    BUSY   W/Q   B/Q  ERR FORMAT           NAME
+R   56    256  48000   1.2ms  27.4us  0.24  0.01    1    S32LE 2 48000 alsa_output.pci-0000_00_1f.3.analog-stereo
+R   75    256  48000  20.1us  12.3us  0.00  0.00    0    F32LE 2 48000  + Firefox
+S   ID  QUANT   RATE    WAIT    BUSY   W/Q   B/Q  ERR FORMAT           NAME
+'''
+
+
+def feed(monitor: PwTopMonitor, text: str) -> list:
+    frames = [monitor.feed_line(line) for line in text.splitlines(keepends=True)]
+    return [f for f in frames if f is not None]
+
+
+def test_parse_driver_line():
+    row = parse_top_line('R   56    256  48000  64.0us  27.4us  0.01  0.02    4    S32LE 2 48000 alsa_output.pci-0000_00_1f.3.analog-stereo\n', driver_id=10)
+
+    assert (row.state, row.id, row.quantum, row.rate, row.errors) == ('R', 56, 256, 48000, 4)
+    assert row.wait == pytest.approx(64e-6)
+    assert row.busy == pytest.approx(27.4e-6)
+    assert (row.wait_ratio, row.busy_ratio) == (0.01, 0.02)
+    assert row.load() == pytest.approx(0.03)
+    assert row.format == 'S32LE 2 48000'
+    assert row.name == 'alsa_output.pci-0000_00_1f.3.analog-stereo'
+    # without a "+" the line is a driver, whatever came before it
+    assert row.is_driver()
+
+
+def test_parse_follower_line():
+    row = parse_top_line('R   75    256  48000  20.1us  12.3us  0.00  0.00    0    F32LE 2 48000  + Firefox', driver_id=56)
+
+    assert (row.id, row.name, row.format, row.driver_id) == (75, 'Firefox', 'F32LE 2 48000', 56)
+    assert not row.is_driver()
+
+
+@pytest.mark.parametrize('line, wait, format, name', [
+    ('S   30      0      0    ---     ---   ---   ---     0                  Dummy-Driver', None, '', 'Dummy-Driver'),
+    ('R   60   1024  48000   1,5ms   0,2ms  0,03  0,00    0    F32LE 2 48000 Built-in Audio', 1.5e-3, 'F32LE 2 48000', 'Built-in Audio'),
+    ('R   61   1024  48000   2s      0.5s   0.03  0.00    0    I420 1920x1080 v4l2_input.webcam', 2, 'I420 1920x1080', 'v4l2_input.webcam'),
+])
+def test_parse_columns(line, wait, format, name):
+    row = parse_top_line(line)
+
+    assert row.wait == (pytest.approx(wait) if wait else None)
+    assert (row.format, row.name) == (format, name)
+
+
+@pytest.mark.parametrize('line', [
+    'S   ID  QUANT   RATE    WAIT    BUSY   W/Q   B/Q  ERR FORMAT           NAME',
+    '',
+    'R   56    256  48000  64.0us',
+    'R   xx    256  48000  64.0us  27.4us  0.01  0.01    0    S32LE 2 48000 alsa_output',
+    'R   56    256  48000  64.0us  27.4us  0.01  0.01    ?    S32LE 2 48000 alsa_output',
+    'pw-top: could not connect to the PipeWire daemon',
+])
+def test_parse_garbage(line):
+    assert parse_top_line(line) is None
+
+
+def test_frames_and_groups():
+    monitor = PwTopMonitor(stream_factory=lambda: [])
+    published = []
+    monitor.subscribers.append(published.append)
+
+    frames = feed(monitor, RECORDED)
+
+    # a frame is complete when the next header comes
+    assert len(frames) == 2
+    assert published == frames
+    assert monitor.last_frame is frames[1]
+
+    first, second = frames
+    assert [r.id for r in first.rows] == [30, 31, 56, 75, 57, 90, 91, 58]
+    assert [r.id for r in second.rows] == [56, 75]
+
+    assert [r.driver_id for r in first.rows] == [None, None, None, 56, None, 57, 57, None]
+    assert [r.id for r in first.group_of(90)] == [57, 90, 91]
+    assert [r.id for r in first.group_of(57)] == [57, 90, 91]
+    assert [r.id for r in first.group_of(75)] == [56, 75]
+    assert first.group_of(999) == []
+
+    assert [r.errors for r in first.group_of(57)] == [3, 0, 12]
+    assert second.row(56).errors == 1
+    assert second.row(56).wait == pytest.approx(1.2e-3)
+    assert second.row(57) is None
+
+
+def test_garbage_lines_are_skipped():
+    monitor = PwTopMonitor(stream_factory=lambda: [])
+    text = RECORDED.replace('R   75 ', 'garbage\nR   75 ', 1)
+
+    frames = feed(monitor, text)
+
+    # the follower after the garbage line still belongs to the driver above it
+    assert [r.id for r in frames[0].rows] == [30, 31, 56, 75, 57, 90, 91, 58]
+    assert frames[0].row(75).driver_id == 56
+
+
+def test_blank_line_ends_a_frame():
+    monitor = PwTopMonitor(stream_factory=lambda: [])
+
+    assert feed(monitor, 'R   56    256  48000  64.0us  27.4us  0.01  0.01    0    S32LE 2 48000 speaker\n') == []
+    frames = feed(monitor, '\n\n')
+
+    assert len(frames) == 1
+    assert [r.id for r in frames[0].rows] == [56]
+
+
+def test_failing_subscriber_doesnt_stop_the_others():
+    monitor = PwTopMonitor(stream_factory=lambda: [])
+    published = []
+
+    def fail(frame):
+        raise ValueError()
+
+    monitor.subscribers.extend([fail, published.append])
+    feed(monitor, RECORDED)
+
+    assert len(published) == 2